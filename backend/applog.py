@@ -0,0 +1,152 @@
+# applog.py
+"""Structured, non-blocking logging for the API.
+
+``configure_logging`` routes every record through a ``QueueHandler``; a
+``QueueListener`` thread does the formatting and the actual stream write, so
+request handlers never wait on stdout.
+
+``get_logger`` returns a thin wrapper that logs an event name plus keyword
+fields::
+
+    log = get_logger("orders")
+    log.info("order.created", order_id=oid, total=total)
+    log.debug("order.payload", sample=0.01, payload=lambda: payload)
+
+Nothing is formatted at the call site. A disabled level costs one
+``isEnabledFor`` check, callable field values are only evaluated when the
+record is written, and ``sample`` keeps a fraction of high-volume events.
+"""
+import atexit
+import json
+import logging
+import logging.handlers
+import queue
+import random
+from typing import Any, Optional
+
+_listener: Optional[logging.handlers.QueueListener] = None
+
+
+def _render(value: Any) -> Any:
+    return value() if callable(value) else value
+
+
+class StructuredFormatter(logging.Formatter):
+    """``time level logger event key=value ...`` or one JSON object per line."""
+
+    def __init__(self, json_lines: bool = False):
+        super().__init__()
+        self.json_lines = json_lines
+
+    def format(self, record: logging.LogRecord) -> str:
+        fields = {k: _render(v) for k, v in getattr(record, "fields", {}).items()}
+        if self.json_lines:
+            entry = {
+                "ts": self.formatTime(record),
+                "level": record.levelname,
+                "logger": record.name,
+                "event": record.getMessage(),
+                **fields,
+            }
+            if record.exc_info:
+                entry["exc"] = self.formatException(record.exc_info)
+            return json.dumps(entry, default=str)
+
+        line = f"{self.formatTime(record)} {record.levelname} {record.name} {record.getMessage()}"
+        if fields:
+            line += " " + " ".join(f"{k}={v}" for k, v in fields.items())
+        if record.exc_info:
+            line += "\n" + self.formatException(record.exc_info)
+        return line
+
+
+class _LazyQueueHandler(logging.handlers.QueueHandler):
+    """QueueHandler that leaves formatting to the listener thread.
+
+    The stock ``prepare`` formats the message on the calling thread, which is
+    exactly the work this setup is meant to move off the event loop.
+    """
+
+    dropped = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        return record
+
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            # Shed log records rather than block a request on a stalled stream
+            self.dropped += 1
+
+
+class StructLogger:
+    __slots__ = ("_logger",)
+
+    def __init__(self, logger: logging.Logger):
+        self._logger = logger
+
+    def _log(self, level: int, event: str, sample: Optional[float], exc_info, fields: dict):
+        if not self._logger.isEnabledFor(level):
+            return
+        if sample is not None and random.random() >= sample:
+            return
+        if sample is not None:
+            fields["sample"] = sample
+        self._logger.log(level, event, exc_info=exc_info, extra={"fields": fields}, stacklevel=3)
+
+    def debug(self, event: str, sample: Optional[float] = None, **fields):
+        self._log(logging.DEBUG, event, sample, None, fields)
+
+    def info(self, event: str, sample: Optional[float] = None, **fields):
+        self._log(logging.INFO, event, sample, None, fields)
+
+    def warning(self, event: str, sample: Optional[float] = None, **fields):
+        self._log(logging.WARNING, event, sample, None, fields)
+
+    def error(self, event: str, sample: Optional[float] = None, exc_info=None, **fields):
+        self._log(logging.ERROR, event, sample, exc_info, fields)
+
+    def exception(self, event: str, **fields):
+        self._log(logging.ERROR, event, None, True, fields)
+
+    def is_enabled(self, level: int) -> bool:
+        return self._logger.isEnabledFor(level)
+
+
+def get_logger(name: str) -> StructLogger:
+    return StructLogger(logging.getLogger(name))
+
+
+def configure_logging(level: str = "INFO", json_lines: bool = False, stream=None, queue_size: int = 10000):
+    """Install the queue handler on the root logger and start the listener.
+
+    Calling it again replaces the previous setup.
+    """
+    global _listener
+    stop_logging()
+
+    target = logging.StreamHandler(stream)
+    target.setFormatter(StructuredFormatter(json_lines=json_lines))
+
+    # Bounded so a stalled stdout cannot grow memory without limit
+    log_queue: "queue.Queue" = queue.Queue(queue_size)
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    root.addHandler(_LazyQueueHandler(log_queue))
+    root.setLevel(getattr(logging, str(level).upper(), logging.INFO))
+
+    _listener = logging.handlers.QueueListener(log_queue, target, respect_handler_level=True)
+    _listener.start()
+
+
+def stop_logging():
+    """Flush queued records and stop the listener thread."""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+
+atexit.register(stop_logging)
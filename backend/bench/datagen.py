@@ -0,0 +1,388 @@
+# bench/datagen.py
+"""Generate a large, referentially consistent LiveMART dataset.
+
+Writes customers, retailers and wholesalers spread over a range of pincodes,
+wholesale products, retailer mirror products linked to them by
+``original_wh_product_id``, carts, orders, wholesale purchases and feedback.
+Documents have the same shape the API writes. They are streamed in
+fixed-size unordered ``insert_many`` batches, with a few batches in flight
+at once, so memory stays bounded by the id tables the references need.
+
+Popularity is skewed: sellers, products and customers are picked with
+Zipf-like weights (``--skew``, 0 = uniform), so a few products take most
+orders, as in real traffic.
+
+    python -m bench.datagen --mongo-url mongodb://localhost:27017 --db-name livemart_scale \\
+        --customers 1000000 --wholesale-products 200000 --orders 2000000 --drop
+
+Afterwards ``--rollups`` (on by default) rebuilds seller_stats and product
+rating aggregates with the same code as ``manage.py``.
+"""
+import argparse
+import asyncio
+import bisect
+import itertools
+import json
+import os
+import random
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Iterable, Iterator, List
+
+os.environ.setdefault("LOG_LEVEL", "WARNING")
+
+import server
+
+WORDS = (
+    "fresh organic red green apple banana mango milk curd paneer butter bread "
+    "bun cookie biscuit rice wheat atta dal sugar salt tea coffee juice soap "
+    "shampoo oil ghee honey jam chips namkeen premium family pack value"
+).split()
+COMMENTS = ["Great quality", "Value for money", "Fresh and well packed", "Average", "Not as described", ""]
+PAYMENT_METHODS = ["online", "cod", "card"]
+
+
+class Skewed:
+    """Draw indexes in ``range(n)`` with weight ``1 / (rank + 1) ** s``."""
+
+    def __init__(self, n: int, s: float, rnd: random.Random):
+        self.n = n
+        self.rnd = rnd
+        self.uniform = s <= 0
+        if not self.uniform:
+            self.cum = list(itertools.accumulate(1.0 / (i + 1) ** s for i in range(n)))
+            self.total = self.cum[-1]
+
+    def __call__(self) -> int:
+        if self.uniform:
+            return self.rnd.randrange(self.n)
+        return min(self.n - 1, bisect.bisect_left(self.cum, self.rnd.random() * self.total))
+
+    def distinct(self, k: int) -> List[int]:
+        k = min(k, self.n)
+        picked = set()
+        # Rejection sampling is fine while k is small next to n; top up uniformly otherwise
+        for _ in range(k * 4):
+            picked.add(self())
+            if len(picked) >= k:
+                break
+        while len(picked) < k:
+            picked.add(self.rnd.randrange(self.n))
+        return list(picked)
+
+
+def batched(docs: Iterable[dict], size: int) -> Iterator[List[dict]]:
+    batch = []
+    for doc in docs:
+        batch.append(doc)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+class Generator:
+    def __init__(self, args):
+        self.args = args
+        self.rnd = random.Random(args.seed)
+        self.now = datetime.now(timezone.utc)
+        self.password = server._hash_pw_sync("livemart-test")
+        self.pincodes = [str(110001 + i * 7) for i in range(args.pincodes)]
+        self.pick_pincode = Skewed(len(self.pincodes), args.skew / 2, self.rnd)
+
+    def timestamp(self) -> str:
+        return (self.now - timedelta(seconds=self.rnd.randrange(self.args.days * 86400))).isoformat()
+
+    def text(self, k: int) -> str:
+        return " ".join(self.rnd.choices(WORDS, k=k))
+
+    # -- users ---------------------------------------------------------
+    def user(self, role: str, i: int, pincode: str) -> dict:
+        return {
+            "id": f"{role[0]}-{i:08d}",
+            "email": f"{role}{i}@scale.livemart.test",
+            "name": f"{role.title()} {i}",
+            "role": role,
+            "password": self.password,
+            "phone": f"9{i:09d}"[-10:],
+            "address": f"{i} Market Road",
+            "pincode": pincode,
+            "created_at": self.timestamp(),
+        }
+
+    def sellers(self, role: str, n: int) -> Iterator[dict]:
+        for i in range(n):
+            yield self.user(role, i, self.pincodes[self.pick_pincode()])
+
+    def customers(self, retailer_index) -> Iterator[dict]:
+        for i in range(self.args.customers):
+            doc = self.user("customer", i, self.pincodes[self.pick_pincode()])
+            preferred = retailer_index.nearest(doc["pincode"])
+            if preferred:
+                doc["preferred_retailer_id"] = preferred
+            yield doc
+
+    # -- products ------------------------------------------------------
+    def wholesale_products(self) -> Iterator[dict]:
+        pick_seller = Skewed(self.args.wholesalers, self.args.skew, self.rnd)
+        self.wp_names = []
+        self.wp_prices = []
+        self.wp_sellers = []
+        for i in range(self.args.wholesale_products):
+            name = self.text(3).title()
+            price = round(self.rnd.uniform(5, 400), 2)
+            seller = pick_seller()
+            self.wp_names.append(name)
+            self.wp_prices.append(price)
+            self.wp_sellers.append(seller)
+            yield {
+                "id": f"wp-{i:09d}",
+                "name": name,
+                "description": self.text(12),
+                "price": price,
+                "stock": self.rnd.randint(1000, 100000),
+                "category_id": f"cat-{self.rnd.randrange(self.args.categories)}",
+                "seller_id": f"w-{seller:08d}",
+                "image_url": "",
+                "rating": 0,
+                "review_count": 0,
+                "created_at": self.timestamp(),
+            }
+
+    def mirror_products(self) -> Iterator[dict]:
+        """Each retailer resells a skewed selection of wholesale products at a markup."""
+        pick_wp = Skewed(self.args.wholesale_products, self.args.skew, self.rnd)
+        self.rp_ids = []
+        self.rp_names = []
+        self.rp_prices = []
+        self.rp_sellers = []
+        for r in range(self.args.retailers):
+            for wp in pick_wp.distinct(self.args.mirrors_per_retailer):
+                pid = f"rp-{len(self.rp_ids):09d}"
+                price = round(self.wp_prices[wp] * (1 + self.rnd.choice((10, 15, 20, 25)) / 100), 2)
+                self.rp_ids.append(pid)
+                self.rp_names.append(self.wp_names[wp])
+                self.rp_prices.append(price)
+                self.rp_sellers.append(r)
+                yield {
+                    "id": pid,
+                    "name": self.wp_names[wp],
+                    "description": self.text(12),
+                    "price": price,
+                    "stock": self.rnd.randint(10, 5000),
+                    "category_id": f"cat-{self.rnd.randrange(self.args.categories)}",
+                    "seller_id": f"r-{r:08d}",
+                    "original_wh_product_id": f"wp-{wp:09d}",
+                    "image_url": "",
+                    "rating": 0,
+                    "review_count": 0,
+                    "created_at": self.timestamp(),
+                }
+
+    # -- activity ------------------------------------------------------
+    def orders(self) -> Iterator[dict]:
+        pick_customer = Skewed(self.args.customers, self.args.skew / 2, self.rnd)
+        pick_product = Skewed(len(self.rp_ids), self.args.skew, self.rnd)
+        for i in range(self.args.orders):
+            items = []
+            total = 0.0
+            for p in pick_product.distinct(self.rnd.randint(1, self.args.max_lines)):
+                qty = self.rnd.randint(1, 4)
+                price = self.rp_prices[p]
+                items.append({
+                    "product_id": self.rp_ids[p],
+                    "product_name": self.rp_names[p],
+                    "quantity": qty,
+                    "price": price,
+                    "total": price * qty,
+                    "seller_id": f"r-{self.rp_sellers[p]:08d}",
+                })
+                total += price * qty
+            method = self.rnd.choice(PAYMENT_METHODS)
+            yield {
+                "id": f"o-{i:010d}",
+                "user_id": f"c-{pick_customer():08d}",
+                "items": items,
+                "total_amount": total,
+                "delivery_address": f"{i % 997} Market Road",
+                "payment_method": method,
+                "payment_status": "paid" if method == "card" else "pending",
+                "order_status": self.rnd.choice(("placed", "placed", "shipped", "delivered")),
+                "created_at": self.timestamp(),
+            }
+
+    def purchases(self) -> Iterator[dict]:
+        by_seller = {}
+        for wp, seller in enumerate(self.wp_sellers):
+            by_seller.setdefault(seller, []).append(wp)
+        sellers = list(by_seller)
+        pick_retailer = Skewed(self.args.retailers, self.args.skew / 2, self.rnd)
+        for i in range(self.args.purchases):
+            seller = sellers[self.rnd.randrange(len(sellers))]
+            stock = by_seller[seller]
+            items = []
+            total = 0.0
+            for wp in self.rnd.sample(stock, k=min(len(stock), self.rnd.randint(1, self.args.max_lines))):
+                qty = self.rnd.randint(5, 100)
+                unit = self.wp_prices[wp]
+                items.append({
+                    "product_id": f"wp-{wp:09d}",
+                    "product_name": self.wp_names[wp],
+                    "quantity": qty,
+                    "unit_price": unit,
+                    "total": unit * qty,
+                })
+                total += unit * qty
+            yield {
+                "id": f"pu-{i:010d}",
+                "retailer_id": f"r-{pick_retailer():08d}",
+                "wholesaler_id": server.normalize_id(f"w-{seller:08d}"),
+                "items": items,
+                "total_amount": total,
+                "status": "completed",
+                "created_at": self.timestamp(),
+            }
+
+    def feedback(self) -> Iterator[dict]:
+        pick_product = Skewed(len(self.rp_ids), self.args.skew, self.rnd)
+        seen = set()
+        for i in range(self.args.feedback * 2):
+            if len(seen) >= self.args.feedback:
+                break
+            user = self.rnd.randrange(self.args.customers)
+            product = pick_product()
+            if (user, product) in seen:  # one review per user and product
+                continue
+            seen.add((user, product))
+            yield {
+                "id": f"f-{len(seen):010d}",
+                "user_id": f"c-{user:08d}",
+                "user_name": f"Customer {user}",
+                "product_id": self.rp_ids[product],
+                "rating": self.rnd.choices((1, 2, 3, 4, 5), weights=(1, 1, 3, 6, 6))[0],
+                "comment": self.rnd.choice(COMMENTS),
+                "created_at": self.timestamp(),
+            }
+
+    def carts(self) -> Iterator[dict]:
+        pick_product = Skewed(len(self.rp_ids), self.args.skew, self.rnd)
+        for user in self.rnd.sample(range(self.args.customers), k=min(self.args.carts, self.args.customers)):
+            yield {
+                "user_id": f"c-{user:08d}",
+                "items": [
+                    {"product_id": self.rp_ids[p], "quantity": self.rnd.randint(1, 3)}
+                    for p in pick_product.distinct(self.rnd.randint(1, 5))
+                ],
+            }
+
+
+async def write(collection, docs: Iterable[dict], batch_size: int, parallel: int) -> dict:
+    """Insert ``docs`` in unordered batches with up to ``parallel`` in flight."""
+    start = time.perf_counter()
+    count = 0
+    pending = set()
+    for batch in batched(docs, batch_size):
+        if len(pending) >= parallel:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                task.result()
+        pending.add(asyncio.ensure_future(collection.insert_many(batch, ordered=False)))
+        count += len(batch)
+    await asyncio.gather(*pending)
+    elapsed = time.perf_counter() - start
+    return {"documents": count, "seconds": round(elapsed, 2), "docs_per_s": round(count / elapsed) if elapsed else count}
+
+
+async def generate(args) -> dict:
+    server.open_db(args.mongo_url, args.db_name, tls=args.tls)
+    db = server.db
+    if args.drop:
+        await server.client.drop_database(args.db_name)
+    if args.indexes:
+        await server.ensure_indexes()
+
+    gen = Generator(args)
+    report = {"collections": {}}
+
+    def w(collection, docs):
+        return write(collection, docs, args.batch_size, args.parallel)
+
+    start = time.perf_counter()
+
+    retailers = list(gen.sellers("retailer", args.retailers))
+    retailer_index = server.RetailerIndex.from_rows((r["id"], r["pincode"]) for r in retailers)
+
+    report["collections"]["categories"] = await w(db.categories, (
+        {"id": f"cat-{i}", "name": f"Category {i}", "description": gen.text(6)} for i in range(args.categories)
+    ))
+    report["collections"]["users"] = await w(db.users, itertools.chain(
+        retailers, gen.sellers("wholesaler", args.wholesalers), gen.customers(retailer_index)
+    ))
+    wholesale = await w(db.products, gen.wholesale_products())
+    mirrors = await w(db.products, gen.mirror_products())
+    report["collections"]["products"] = {
+        "documents": wholesale["documents"] + mirrors["documents"],
+        "wholesale": wholesale["documents"],
+        "mirrors": mirrors["documents"],
+        "seconds": round(wholesale["seconds"] + mirrors["seconds"], 2),
+    }
+    report["collections"]["orders"] = await w(db.orders, gen.orders())
+    report["collections"]["purchases"] = await w(db.purchases, gen.purchases())
+    report["collections"]["feedback"] = await w(db.feedback, gen.feedback())
+    report["collections"]["cart"] = await w(db.cart, gen.carts())
+
+    elapsed = time.perf_counter() - start
+    total = sum(c["documents"] for c in report["collections"].values())
+    report["documents"] = total
+    report["seconds"] = round(elapsed, 2)
+    report["docs_per_minute"] = round(total / elapsed * 60) if elapsed else total
+
+    if args.rollups:
+        rollup_start = time.perf_counter()
+        report["seller_stats"] = await server.rebuild_seller_stats(batch_size=args.batch_size)
+        report["rated_products"] = await server.rebuild_rating_aggregates(batch_size=args.batch_size)
+        report["rollup_seconds"] = round(time.perf_counter() - rollup_start, 2)
+
+    server.client.close()
+    return report
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Generate a large LiveMART dataset")
+    parser.add_argument("--mongo-url", default=os.getenv("BENCH_MONGO_URL", "mongodb://localhost:27017"))
+    parser.add_argument("--tls", action="store_true", help="connect to --mongo-url over TLS")
+    parser.add_argument("--db-name", default="livemart_scale")
+    parser.add_argument("--drop", action="store_true", help="drop the database first")
+    parser.add_argument("--customers", type=int, default=100000)
+    parser.add_argument("--retailers", type=int, default=2000)
+    parser.add_argument("--wholesalers", type=int, default=200)
+    parser.add_argument("--categories", type=int, default=50)
+    parser.add_argument("--pincodes", type=int, default=500, help="distinct pincodes users are spread over")
+    parser.add_argument("--wholesale-products", type=int, default=50000)
+    parser.add_argument("--mirrors-per-retailer", type=int, default=100)
+    parser.add_argument("--orders", type=int, default=200000)
+    parser.add_argument("--max-lines", type=int, default=5, help="most line items per order/purchase")
+    parser.add_argument("--purchases", type=int, default=20000)
+    parser.add_argument("--feedback", type=int, default=100000)
+    parser.add_argument("--carts", type=int, default=20000)
+    parser.add_argument("--days", type=int, default=365, help="spread created_at over this many past days")
+    parser.add_argument("--skew", type=float, default=1.0, help="Zipf exponent for popularity; 0 is uniform")
+    parser.add_argument("--batch-size", type=int, default=5000)
+    parser.add_argument("--parallel", type=int, default=4, help="insert batches in flight")
+    parser.add_argument("--no-indexes", dest="indexes", action="store_false", help="skip ensure_indexes()")
+    parser.add_argument("--no-rollups", dest="rollups", action="store_false",
+                        help="skip rebuilding seller_stats and rating aggregates")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args(argv)
+
+    for name in ("customers", "retailers", "wholesalers", "wholesale_products", "mirrors_per_retailer",
+                 "categories", "pincodes"):
+        if getattr(args, name) < 1:
+            parser.error(f"--{name.replace('_', '-')} must be at least 1")
+
+    print(json.dumps(asyncio.run(generate(args)), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,392 @@
+# bench/load.py
+"""Mixed-workload load test for the API.
+
+Boots ``server.app`` in-process and drives it through httpx's ASGI transport
+with ``--concurrency`` async clients. The mix covers browsing, search, cart
+add/update, checkout, wholesale purchases, both dashboards and feedback. The
+database is a throwaway one on a local MongoDB (``--mongo-url``, dropped
+first) or, with ``--fake``, an in-memory mongomock_motor client. The fake
+has no text index, so search runs on the in-process engine there, and it
+does not support arrayFilters, so cart_update reports errors; use it for
+quick relative comparisons only.
+
+    python -m bench.load --mongo-url mongodb://localhost:27017 --duration 30
+    python -m bench.load --fake --requests 5000 --out run.json
+    python -m bench.load --fake --compare run.json
+
+The report has p50/p95/p99/mean latency in milliseconds and requests/second
+per operation, plus the run configuration; ``--compare`` prints the p95 and
+throughput change against an earlier report.
+"""
+import argparse
+import asyncio
+import json
+import math
+import os
+import random
+import statistics
+import time
+from collections import defaultdict
+from datetime import datetime, timezone
+
+os.environ.setdefault("LOG_LEVEL", "WARNING")
+
+import httpx
+
+import indexes
+import server
+
+WORDS = (
+    "fresh organic red green apple banana mango milk curd paneer butter bread "
+    "bun cookie biscuit rice wheat atta dal sugar salt tea coffee juice soap "
+    "shampoo oil ghee honey jam chips namkeen premium family pack value"
+).split()
+
+# Relative weights of each operation in the default mix
+DEFAULT_MIX = {
+    "browse": 30,
+    "search": 15,
+    "product": 15,
+    "cart_add": 10,
+    "cart_update": 5,
+    "place_order": 8,
+    "purchase": 3,
+    "dashboard_retailer": 5,
+    "dashboard_wholesaler": 4,
+    "feedback": 5,
+}
+
+
+def percentile(sorted_samples, q):
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_samples:
+        return 0.0
+    rank = max(0, min(len(sorted_samples) - 1, math.ceil(q / 100 * len(sorted_samples)) - 1))
+    return sorted_samples[rank]
+
+
+def parse_mix(text):
+    if not text:
+        return dict(DEFAULT_MIX)
+    mix = {}
+    for part in text.split(","):
+        name, _, weight = part.partition("=")
+        if name not in DEFAULT_MIX:
+            raise SystemExit(f"unknown operation {name!r}; choose from {', '.join(DEFAULT_MIX)}")
+        mix[name] = float(weight or 1)
+    return mix
+
+
+# ----------------------------------------------------------------------
+async def seed(db, args, rnd):
+    """Insert a self-consistent catalog and return the ids the workload needs."""
+    now = datetime.now(timezone.utc).isoformat()
+    password = server._hash_pw_sync("bench-password")
+
+    def user(role, i):
+        return {
+            "id": f"{role[:1]}-{i:07d}",
+            "email": f"{role}{i}@bench.local",
+            "name": f"{role.title()} {i}",
+            "role": role,
+            "password": password,
+            "phone": "9000000000",
+            "address": f"{i} Bench Street",
+            "pincode": str(560001 + rnd.randrange(200)),
+            "created_at": now,
+        }
+
+    customers = [user("customer", i) for i in range(args.customers)]
+    retailers = [user("retailer", i) for i in range(args.retailers)]
+    wholesalers = [user("wholesaler", i) for i in range(args.wholesalers)]
+    categories = [{"id": f"cat-{i}", "name": f"Category {i}"} for i in range(10)]
+
+    def product(i, seller, prefix):
+        return {
+            "id": f"{prefix}-{i:08d}",
+            "name": " ".join(rnd.choices(WORDS, k=3)).title(),
+            "description": " ".join(rnd.choices(WORDS, k=12)),
+            "price": round(rnd.uniform(10, 500), 2),
+            "stock": 10 ** 7,
+            "category_id": rnd.choice(categories)["id"],
+            "seller_id": seller["id"],
+            "image_url": "",
+            "rating": 0.0,
+            "review_count": 0,
+            "created_at": now,
+        }
+
+    retail_products = [product(i, rnd.choice(retailers), "rp") for i in range(args.products)]
+    wholesale_products = [product(i, rnd.choice(wholesalers), "wp") for i in range(max(1, args.products // 10))]
+
+    await db.users.insert_many(customers + retailers + wholesalers, ordered=False)
+    await db.categories.insert_many(categories, ordered=False)
+    for start in range(0, len(retail_products), 10000):
+        await db.products.insert_many(retail_products[start:start + 10000], ordered=False)
+    await db.products.insert_many(wholesale_products, ordered=False)
+
+    by_wholesaler = defaultdict(list)
+    for p in wholesale_products:
+        by_wholesaler[p["seller_id"]].append(p["id"])
+
+    return {
+        "customers": [c["id"] for c in customers],
+        "tokens": {c["id"]: server.create_token({"sub": c["email"], "user_id": c["id"]}) for c in customers},
+        "retailers": [r["id"] for r in retailers],
+        "wholesalers": [w for w in by_wholesaler],
+        "wholesale_by_seller": dict(by_wholesaler),
+        "products": [p["id"] for p in retail_products],
+        "categories": [c["id"] for c in categories],
+    }
+
+
+async def boot(args, rnd):
+    if args.fake:
+        try:
+            from mongomock_motor import AsyncMongoMockClient
+        except ImportError:
+            raise SystemExit("--fake needs the mongomock-motor package")
+        server.client = AsyncMongoMockClient()
+        server.db = server.client[args.db_name]
+        server.SEARCH_ENGINE = "memory"
+    else:
+        server.open_db(args.mongo_url, args.db_name, tls=args.tls)
+        await server.client.drop_database(args.db_name)
+        await server.ensure_indexes()
+
+    start = time.perf_counter()
+    fixtures = await seed(server.db, args, rnd)
+    seed_s = time.perf_counter() - start
+
+    await server.load_retailer_index()
+    await server.load_search_index()
+    return fixtures, seed_s
+
+
+# ----------------------------------------------------------------------
+class Workload:
+    def __init__(self, client, fixtures, rnd):
+        self.client = client
+        self.f = fixtures
+        self.rnd = rnd
+        self.carts = defaultdict(set)  # customer -> product ids believed to be in their cart
+
+    def _customer(self):
+        uid = self.rnd.choice(self.f["customers"])
+        return uid, {"Authorization": f"Bearer {self.f['tokens'][uid]}"}
+
+    async def browse(self):
+        params = {"limit": 50}
+        if self.rnd.random() < 0.5:
+            params["category_id"] = self.rnd.choice(self.f["categories"])
+        return await self.client.get("/api/products", params=params)
+
+    async def search(self):
+        query = " ".join(self.rnd.sample(WORDS, k=self.rnd.choice((1, 1, 2))))
+        return await self.client.get("/api/products", params={"search": query, "limit": 50})
+
+    async def product(self):
+        return await self.client.get(f"/api/products/{self.rnd.choice(self.f['products'])}")
+
+    async def cart_add(self):
+        uid, headers = self._customer()
+        pid = self.rnd.choice(self.f["products"])
+        self.carts[uid].add(pid)
+        return await self.client.post(f"/api/cart/{uid}", json={"product_id": pid, "quantity": 1}, headers=headers)
+
+    async def cart_update(self):
+        uid, headers = self._customer()
+        if not self.carts[uid]:
+            return await self.cart_add()
+        pid = self.rnd.choice(sorted(self.carts[uid]))
+        return await self.client.put(
+            f"/api/cart/{uid}/{pid}", params={"quantity": self.rnd.randint(1, 5)}, headers=headers
+        )
+
+    async def place_order(self):
+        uid, headers = self._customer()
+        items = [
+            {"product_id": pid, "quantity": self.rnd.randint(1, 3)}
+            for pid in self.rnd.sample(self.f["products"], k=min(3, len(self.f["products"])))
+        ]
+        self.carts.pop(uid, None)
+        return await self.client.post(
+            f"/api/orders/{uid}",
+            json={"items": items, "delivery_address": "1 Bench Street", "payment_method": "cod"},
+            headers=headers,
+        )
+
+    async def purchase(self):
+        wholesaler = self.rnd.choice(self.f["wholesalers"])
+        pids = self.f["wholesale_by_seller"][wholesaler]
+        items = [
+            {"product_id": pid, "quantity": self.rnd.randint(1, 10), "markup_percent": 20}
+            for pid in self.rnd.sample(pids, k=min(2, len(pids)))
+        ]
+        return await self.client.post("/api/purchase/from-wholesaler", json={
+            "retailer_id": self.rnd.choice(self.f["retailers"]),
+            "wholesaler_id": wholesaler,
+            "items": items,
+            "total_amount": 0,
+        })
+
+    async def dashboard_retailer(self):
+        return await self.client.get("/api/dashboard/retailer", params={"user_id": self.rnd.choice(self.f["retailers"])})
+
+    async def dashboard_wholesaler(self):
+        return await self.client.get("/api/dashboard/wholesaler", params={"user_id": self.rnd.choice(self.f["wholesalers"])})
+
+    async def feedback(self):
+        uid, headers = self._customer()
+        return await self.client.post(f"/api/feedback/{uid}", json={
+            "product_id": self.rnd.choice(self.f["products"]),
+            "rating": self.rnd.randint(1, 5),
+            "comment": "bench",
+        }, headers=headers)
+
+
+async def run_load(args, fixtures, mix, rnd):
+    samples = defaultdict(list)
+    errors = defaultdict(int)
+    names = list(mix)
+    weights = [mix[n] for n in names]
+
+    transport = httpx.ASGITransport(app=server.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=60) as client:
+
+        async def worker(seed, take):
+            work = Workload(client, fixtures, random.Random(seed))
+            while take():
+                op = work.rnd.choices(names, weights)[0]
+                start = time.perf_counter()
+                try:
+                    resp = await getattr(work, op)()
+                    ok = resp.status_code < 400
+                except Exception:
+                    ok = False
+                samples[op].append((time.perf_counter() - start) * 1000)
+                if not ok:
+                    errors[op] += 1
+
+        def budget(n):
+            left = [n]
+
+            def take():
+                left[0] -= 1
+                return left[0] >= 0
+            return take
+
+        # Warm caches and indexes so the measured window is steady-state
+        warm = budget(args.warmup)
+        await asyncio.gather(*(worker(rnd.random(), warm) for _ in range(min(args.concurrency, 8))))
+        samples.clear()
+        errors.clear()
+
+        if args.requests:
+            take = budget(args.requests)
+        else:
+            deadline = time.perf_counter() + args.duration
+
+            def take():
+                return time.perf_counter() < deadline
+
+        start = time.perf_counter()
+        await asyncio.gather(*(worker(rnd.random(), take) for _ in range(args.concurrency)))
+        elapsed = time.perf_counter() - start
+
+    return samples, errors, elapsed
+
+
+def summarize(samples, errors, elapsed):
+    ops = {}
+    total = 0
+    for op in sorted(samples):
+        values = sorted(samples[op])
+        total += len(values)
+        ops[op] = {
+            "requests": len(values),
+            "errors": errors.get(op, 0),
+            "rps": round(len(values) / elapsed, 1),
+            "p50_ms": round(percentile(values, 50), 3),
+            "p95_ms": round(percentile(values, 95), 3),
+            "p99_ms": round(percentile(values, 99), 3),
+            "mean_ms": round(statistics.fmean(values), 3),
+        }
+    return {"elapsed_s": round(elapsed, 2), "requests": total, "rps": round(total / elapsed, 1), "operations": ops}
+
+
+def compare(report, baseline):
+    print(f"{'operation':<22}{'p95 ms':>12}{'base':>10}{'change':>9}{'rps':>10}{'base':>10}")
+    base_ops = baseline.get("operations", {})
+    for op, row in report["operations"].items():
+        base = base_ops.get(op)
+        if not base:
+            continue
+        change = (row["p95_ms"] - base["p95_ms"]) / base["p95_ms"] * 100 if base["p95_ms"] else 0.0
+        print(f"{op:<22}{row['p95_ms']:>12.2f}{base['p95_ms']:>10.2f}{change:>+8.1f}%{row['rps']:>10.1f}{base['rps']:>10.1f}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Mixed-workload API load test")
+    parser.add_argument("--mongo-url", default=os.getenv("BENCH_MONGO_URL", "mongodb://localhost:27017"))
+    parser.add_argument("--tls", action="store_true", help="connect to --mongo-url over TLS")
+    parser.add_argument("--db-name", default="livemart_bench", help="scratch database, dropped before seeding")
+    parser.add_argument("--fake", action="store_true", help="use an in-memory mongomock_motor database")
+    parser.add_argument("--customers", type=int, default=1000)
+    parser.add_argument("--retailers", type=int, default=50)
+    parser.add_argument("--wholesalers", type=int, default=10)
+    parser.add_argument("--products", type=int, default=10000)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--duration", type=float, default=20.0, help="seconds to run (ignored with --requests)")
+    parser.add_argument("--requests", type=int, default=0, help="stop after this many requests")
+    parser.add_argument("--warmup", type=int, default=200, help="unmeasured requests before the run")
+    parser.add_argument("--mix", default="", help="e.g. browse=5,search=2,place_order=1 (default: built-in mix)")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--out", help="write the JSON report here")
+    parser.add_argument("--compare", help="earlier JSON report to compare against")
+    args = parser.parse_args(argv)
+
+    rnd = random.Random(args.seed)
+    mix = parse_mix(args.mix)
+
+    async def run():
+        fixtures, seed_s = await boot(args, rnd)
+        samples, errors, elapsed = await run_load(args, fixtures, mix, rnd)
+        collscans = []
+        if not args.fake:
+            # Query shapes from indexes.py that the seeded database answers without an index
+            collscans = [r for r in await indexes.verify(server.db) if r["status"] != "ok"]
+            await server.client.drop_database(args.db_name)
+            server.client.close()
+        return seed_s, collscans, summarize(samples, errors, elapsed)
+
+    seed_s, collscans, results = asyncio.run(run())
+    report = {
+        "config": {
+            "backend": "fake" if args.fake else "mongo",
+            "customers": args.customers,
+            "retailers": args.retailers,
+            "wholesalers": args.wholesalers,
+            "products": args.products,
+            "concurrency": args.concurrency,
+            "mix": mix,
+            "seed": args.seed,
+            "search_engine": server.SEARCH_ENGINE,
+        },
+        "seed_s": round(seed_s, 2),
+        "collscans": collscans,
+        **results,
+    }
+
+    text = json.dumps(report, indent=2)
+    if args.out:
+        with open(args.out, "w") as fh:
+            fh.write(text + "\n")
+    print(text)
+    if args.compare:
+        with open(args.compare) as fh:
+            compare(report, json.load(fh))
+
+
+if __name__ == "__main__":
+    main()
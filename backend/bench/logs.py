@@ -0,0 +1,73 @@
+# bench/logs.py
+"""Per-call cost of request logging.
+
+Compares the old ``print`` + ``json.dumps(payload, indent=2)`` debug output
+with the structured logger from applog.py, with debug off, debug on with
+sampling, and info records going through the queue listener. Output goes to
+/dev/null so only the logging work is measured.
+
+    python -m bench.logs --calls 20000
+"""
+import argparse
+import contextlib
+import json
+import logging
+import os
+import time
+
+import applog
+
+PAYLOAD = {
+    "items": [{"product_id": f"p{i}", "quantity": i % 5 + 1, "price": 49.5} for i in range(8)],
+    "delivery_address": "12 MG Road, Bengaluru 560001",
+    "payment_method": "cod",
+}
+
+
+def per_call_us(fn, calls):
+    start = time.perf_counter()
+    for _ in range(calls):
+        fn()
+    return round((time.perf_counter() - start) / calls * 1e6, 3)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark logging overhead per call")
+    parser.add_argument("--calls", type=int, default=20000)
+    parser.add_argument("--sample", type=float, default=0.01)
+    args = parser.parse_args(argv)
+
+    report = {"calls": args.calls, "per_call_us": {}}
+    timings = report["per_call_us"]
+
+    with open(os.devnull, "w") as devnull:
+        with contextlib.redirect_stdout(devnull):
+            timings["print_json_indent"] = per_call_us(
+                lambda: (print("🎯 Creating order for user: u1"), print(f"📦 Payload received: {json.dumps(PAYLOAD, indent=2)}")),
+                args.calls,
+            )
+
+        log = applog.get_logger("bench")
+        applog.configure_logging("INFO", stream=devnull)
+        timings["debug_disabled"] = per_call_us(
+            lambda: log.debug("order.payload", user_id="u1", payload=lambda: json.dumps(PAYLOAD)),
+            args.calls,
+        )
+        timings["info_queued"] = per_call_us(
+            lambda: log.info("order.created", order_id="o1", user_id="u1", total=123.5, lines=8),
+            args.calls,
+        )
+
+        applog.configure_logging("DEBUG", stream=devnull)
+        timings["debug_sampled"] = per_call_us(
+            lambda: log.debug("order.payload", sample=args.sample, user_id="u1", payload=lambda: json.dumps(PAYLOAD)),
+            args.calls,
+        )
+        applog.stop_logging()
+
+    logging.getLogger().handlers.clear()
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,126 @@
+# bench/search.py
+"""Compare the product search engines.
+
+Offline (default): builds a synthetic catalog in memory and times the
+in-process inverted index against an equivalent case-insensitive regex
+scan, which is what the legacy ``$regex`` path makes MongoDB do.
+
+    python -m bench.search --products 100000
+
+With ``--mongo`` the same queries run against the configured database
+through the regex, text and memory engines.
+"""
+import argparse
+import asyncio
+import json
+import random
+import re
+import statistics
+import time
+
+from search import InvertedIndex
+
+WORDS = (
+    "fresh organic red green apple banana mango milk curd paneer butter bread "
+    "bun cookie biscuit rice wheat atta dal sugar salt tea coffee juice soap "
+    "shampoo oil ghee honey jam chips namkeen premium family pack value"
+).split()
+
+QUERIES = ["apple", "milk", "fresh bread", "org", "premium family pack", "cof", "nonexistent"]
+
+
+def make_catalog(n, seed=7):
+    rnd = random.Random(seed)
+    return [
+        {
+            "id": f"p{i:08d}",
+            "name": " ".join(rnd.choices(WORDS, k=3)).title(),
+            "description": " ".join(rnd.choices(WORDS, k=12)),
+        }
+        for i in range(n)
+    ]
+
+
+def timed(fn, repeat):
+    samples = []
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        samples.append((time.perf_counter() - start) * 1000)
+    return statistics.median(samples), result
+
+
+def bench_offline(args):
+    catalog = make_catalog(args.products)
+
+    start = time.perf_counter()
+    index = InvertedIndex()
+    for p in catalog:
+        index.add(p["id"], p)
+    build_ms = (time.perf_counter() - start) * 1000
+
+    report = {"products": args.products, "index_build_ms": round(build_ms, 1), "queries": {}}
+    for query in QUERIES:
+        pattern = re.compile(re.escape(query), re.IGNORECASE)
+        regex_ms, regex_hits = timed(
+            lambda: [p["id"] for p in catalog if pattern.search(p["name"]) or pattern.search(p["description"])],
+            args.repeat,
+        )
+        memory_ms, memory_hits = timed(lambda: index.search(query, limit=args.limit), args.repeat)
+        report["queries"][query] = {
+            "regex_ms": round(regex_ms, 3),
+            "regex_hits": len(regex_hits),
+            "memory_ms": round(memory_ms, 3),
+            "memory_hits": len(memory_hits),
+        }
+    return report
+
+
+async def bench_mongo(args):
+    import server
+
+    server.open_db()
+    db = server.db
+    index = InvertedIndex()
+    async for p in db.products.find({}, {"_id": 0, "id": 1, "name": 1, "description": 1}):
+        index.add(p["id"], p)
+
+    async def run(engine, query):
+        if engine == "memory":
+            ids = index.search(query, limit=args.limit)
+            return await db.products.find({"id": {"$in": ids}}, {"_id": 0, "id": 1}).to_list(None)
+        server.SEARCH_ENGINE = engine
+        return await db.products.find(server.product_search_filter(query), {"_id": 0, "id": 1}).to_list(args.limit)
+
+    report = {"products": len(index), "queries": {}}
+    for query in QUERIES:
+        row = {}
+        for engine in ("regex", "text", "memory"):
+            samples = []
+            hits = []
+            for _ in range(args.repeat):
+                start = time.perf_counter()
+                hits = await run(engine, query)
+                samples.append((time.perf_counter() - start) * 1000)
+            row[f"{engine}_ms"] = round(statistics.median(samples), 3)
+            row[f"{engine}_hits"] = len(hits)
+        report["queries"][query] = row
+    server.client.close()
+    return report
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark product search engines")
+    parser.add_argument("--products", type=int, default=50000, help="synthetic catalog size (offline mode)")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--limit", type=int, default=1000)
+    parser.add_argument("--mongo", action="store_true", help="run against the configured MongoDB instead")
+    args = parser.parse_args(argv)
+
+    report = asyncio.run(bench_mongo(args)) if args.mongo else bench_offline(args)
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
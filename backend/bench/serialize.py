@@ -0,0 +1,129 @@
+# bench/serialize.py
+"""Cost of turning a list of Mongo documents into a JSON response body.
+
+Compares, for one list payload (1000 products by default):
+
+* ``legacy``: the old read path: per-item ``safe_float``/``safe_int``, then
+  FastAPI's ``jsonable_encoder`` and ``JSONResponse`` (stdlib json)
+* ``response_model``: validating and serializing through ``List[ProductOut]``
+  as a ``response_model`` would
+* ``orjson_default``: ``jsonable_encoder`` followed by ORJSONResponse
+  (``default_response_class`` for routes returning plain values)
+* ``orjson_direct``: the hot routes now, where write-time coercion lets
+  documents go straight to ORJSONResponse
+
+Orders and feedback lists are measured on the same two extremes.
+
+    python -m bench.serialize --items 1000 --rounds 200
+"""
+import argparse
+import copy
+import json
+import random
+import time
+from typing import List
+
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse, ORJSONResponse
+from pydantic import TypeAdapter
+
+import server
+
+
+def products(n: int, rnd: random.Random) -> List[dict]:
+    return [
+        {
+            "id": f"p{i:06d}",
+            "name": f"Product {i}",
+            "description": "Fresh produce sourced from local farms " * 2,
+            "price": round(rnd.uniform(5, 500), 2),
+            "stock": rnd.randint(0, 500),
+            "rating": round(rnd.uniform(1, 5), 1),
+            "review_count": rnd.randint(0, 200),
+            "rating_hist": {str(s): rnd.randint(0, 40) for s in range(1, 6)},
+            "category_id": f"c{i % 12}",
+            "seller_id": f"s{i % 50}",
+            "image_url": f"https://cdn.example.com/p/{i}.jpg",
+            "unit": "kg",
+            "created_at": "2025-01-01T00:00:00+00:00",
+        }
+        for i in range(n)
+    ]
+
+
+def orders(n: int, rnd: random.Random) -> List[dict]:
+    result = []
+    for i in range(n):
+        items = [
+            {"product_id": f"p{j}", "product_name": f"Product {j}", "quantity": 2, "price": 49.5, "total": 99.0, "seller_id": "s1"}
+            for j in range(rnd.randint(1, 5))
+        ]
+        result.append({
+            "id": f"o{i:06d}", "user_id": "u1", "items": items, "total_amount": 99.0 * len(items),
+            "delivery_address": "12 MG Road, Bengaluru 560001", "payment_method": "cod",
+            "payment_status": "pending", "order_status": "placed", "created_at": "2025-01-01T00:00:00+00:00",
+        })
+    return result
+
+
+def feedback(n: int, rnd: random.Random) -> List[dict]:
+    return [
+        {"id": f"f{i}", "user_id": f"u{i}", "user_name": "Asha", "product_id": "p1", "rating": rnd.randint(1, 5),
+         "comment": "Good quality, would buy again", "created_at": "2025-01-01T00:00:00+00:00"}
+        for i in range(n)
+    ]
+
+
+def legacy_coerce(items):
+    for it in items:
+        it["price"] = server.safe_float(it.get("price", 0))
+        it["stock"] = server.safe_int(it.get("stock", 0))
+        it["rating"] = server.safe_float(it.get("rating", 0))
+    return items
+
+
+def per_call_ms(fn, docs, rounds) -> float:
+    # Every round gets fresh documents, as it would from Mongo
+    copies = [copy.deepcopy(docs) for _ in range(rounds)]
+    start = time.perf_counter()
+    for batch in copies:
+        fn(batch)
+    return round((time.perf_counter() - start) / rounds * 1e3, 3)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark list response serialization")
+    parser.add_argument("--items", type=int, default=1000)
+    parser.add_argument("--rounds", type=int, default=200)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args(argv)
+
+    rnd = random.Random(args.seed)
+    product_docs = products(args.items, rnd)
+    product_list = TypeAdapter(List[server.ProductOut])
+
+    report = {"items": args.items, "rounds": args.rounds, "per_response_ms": {}}
+    timings = report["per_response_ms"]
+    timings["products"] = {
+        "legacy": per_call_ms(lambda d: JSONResponse(jsonable_encoder(legacy_coerce(d))), product_docs, args.rounds),
+        "response_model": per_call_ms(
+            lambda d: JSONResponse(product_list.dump_python(product_list.validate_python(d), mode="json")),
+            product_docs, args.rounds,
+        ),
+        "orjson_default": per_call_ms(lambda d: ORJSONResponse(jsonable_encoder(d)), product_docs, args.rounds),
+        "orjson_direct": per_call_ms(lambda d: ORJSONResponse(d), product_docs, args.rounds),
+    }
+    for name, docs in (("orders", orders(args.items, rnd)), ("feedback", feedback(args.items, rnd))):
+        timings[name] = {
+            "legacy": per_call_ms(lambda d: JSONResponse(jsonable_encoder(d)), docs, args.rounds),
+            "orjson_direct": per_call_ms(lambda d: ORJSONResponse(d), docs, args.rounds),
+        }
+
+    body = ORJSONResponse(product_docs).body
+    assert json.loads(body) == json.loads(JSONResponse(jsonable_encoder(product_docs)).body)
+    report["products_body_bytes"] = len(body)
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
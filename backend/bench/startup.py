@@ -0,0 +1,177 @@
+# bench/startup.py
+"""Startup time: per-module import cost and time-to-ready, with a budget.
+
+Each run boots the server in a fresh interpreter, starting the clock just
+before the process is spawned. The child runs the startup hook against the
+database, waits for warm-up to finish, and reports the ``/api/ready``
+startup report plus the wall time since spawn. A separate
+``python -X importtime`` run attributes import time to the top-level modules
+``server`` pulls in.
+
+The command exits with status 1 when the median import or time-to-ready
+exceeds its budget, or regresses by more than ``--max-regression`` against
+a saved ``--baseline`` report, so it can gate CI:
+
+    python -m bench.startup --fake --runs 5 --out startup.json
+    python -m bench.startup --fake --baseline startup.json
+"""
+import argparse
+import asyncio
+import contextlib
+import io
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def child(args):
+    """Boot once and print the startup report as the last line of stdout."""
+    os.environ.setdefault("LOG_LEVEL", "WARNING")
+    with contextlib.redirect_stdout(io.StringIO()):
+        import server
+
+    if args.fake:
+        from mongomock_motor import AsyncMongoMockClient
+
+        server.client = AsyncMongoMockClient()
+        server.db = server.client[args.db_name]
+    else:
+        server.open_db(args.mongo_url, args.db_name, tls=args.tls)
+
+    async def boot():
+        await server.connect_db()
+        await server.startup_report.wait(args.timeout)
+        report = server.startup_report.as_dict()
+        report["process_to_ready_s"] = round(time.time() - float(os.environ["BENCH_SPAWNED_AT"]), 4)
+        await server.close_db()
+        return report
+
+    print(json.dumps(asyncio.run(boot())))
+
+
+def spawn(args) -> dict:
+    cmd = [sys.executable, "-m", "bench.startup", "--child", "--db-name", args.db_name, "--timeout", str(args.timeout)]
+    if args.fake:
+        cmd.append("--fake")
+    else:
+        cmd += ["--mongo-url", args.mongo_url] + (["--tls"] if args.tls else [])
+    env = dict(os.environ, BENCH_SPAWNED_AT=repr(time.time()))
+    out = subprocess.run(cmd, cwd=BACKEND_DIR, env=env, capture_output=True, text=True, check=True).stdout
+    return json.loads(out.strip().splitlines()[-1])
+
+
+def module_import_ms(top: int) -> dict:
+    """Cumulative import time of each module imported directly by server.py (one run)."""
+    err = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import server"],
+        cwd=BACKEND_DIR, env=dict(os.environ, LOG_LEVEL="WARNING"), capture_output=True, text=True, check=True,
+    ).stderr
+    modules = {}
+    in_server = False
+    for line in reversed(err.splitlines()):
+        # "import time: self [us] | cumulative | imported package"; children are
+        # printed before their parent, so walk backwards from server
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cumulative, name = line.split("|", 2)
+        depth = (len(name) - len(name.lstrip())) // 2
+        if name.strip() == "server" and depth == 0:
+            in_server = True
+            modules["server (total)"] = round(int(cumulative) / 1000, 2)
+            continue
+        if not in_server:
+            continue
+        if depth == 0:
+            break
+        if depth == 1:
+            modules[name.strip()] = round(int(cumulative) / 1000, 2)
+    ranked = sorted(modules.items(), key=lambda kv: kv[1], reverse=True)
+    return dict(ranked[: top + 1])
+
+
+def check(report: dict, args, baseline: dict = None) -> list:
+    failures = []
+    medians = report["median_ms"]
+    for metric, budget in (("import", args.budget_import_ms), ("time_to_ready", args.budget_ready_ms)):
+        if budget and medians[metric] > budget:
+            failures.append(f"{metric} {medians[metric]:.1f} ms exceeds budget {budget:.1f} ms")
+        if baseline:
+            before = baseline["median_ms"].get(metric)
+            if before and medians[metric] > before * (1 + args.max_regression):
+                failures.append(
+                    f"{metric} {medians[metric]:.1f} ms regressed more than {args.max_regression:.0%} "
+                    f"from baseline {before:.1f} ms"
+                )
+    return failures
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Measure server startup time against a budget")
+    parser.add_argument("--mongo-url", default=os.getenv("BENCH_MONGO_URL", "mongodb://localhost:27017"))
+    parser.add_argument("--tls", action="store_true", help="connect to --mongo-url over TLS")
+    parser.add_argument("--db-name", default="livemart_bench")
+    parser.add_argument("--fake", action="store_true", help="use an in-memory mongomock_motor database")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--timeout", type=float, default=60.0, help="seconds to wait for warm-up")
+    parser.add_argument("--top", type=int, default=12, help="modules to list in the import breakdown")
+    parser.add_argument("--budget-import-ms", type=float, default=1000.0)
+    parser.add_argument("--budget-ready-ms", type=float, default=3000.0, help="import plus warm-up")
+    parser.add_argument("--baseline", help="earlier JSON report to compare against")
+    parser.add_argument("--max-regression", type=float, default=0.2, help="allowed slowdown vs --baseline (0.2 = 20%%)")
+    parser.add_argument("--out", help="write the JSON report here")
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.child:
+        child(args)
+        return
+
+    runs = [spawn(args) for _ in range(args.runs)]
+    failed_steps = {name for r in runs for name, step in r["steps"].items() if step["status"] != "ok"}
+    if failed_steps or not all(r["ready"] for r in runs):
+        raise SystemExit(f"server did not become ready (failed steps: {', '.join(sorted(failed_steps)) or 'none'})")
+
+    def median_ms(key):
+        return round(statistics.median(r[key] for r in runs) * 1000, 2)
+
+    report = {
+        "config": {"backend": "fake" if args.fake else "mongo", "runs": args.runs},
+        "median_ms": {
+            "import": median_ms("import_s"),
+            "warmup": median_ms("warmup_s"),
+            "time_to_ready": median_ms("time_to_ready_s"),
+            "process_to_ready": median_ms("process_to_ready_s"),
+        },
+        "steps_ms": {
+            name: round(statistics.median(r["steps"][name]["seconds"] for r in runs) * 1000, 2)
+            for name in runs[0]["steps"]
+        },
+        "import_ms_by_module": module_import_ms(args.top),
+        "budget_ms": {"import": args.budget_import_ms, "time_to_ready": args.budget_ready_ms},
+    }
+
+    baseline = None
+    if args.baseline:
+        with open(args.baseline) as fh:
+            baseline = json.load(fh)
+    failures = check(report, args, baseline)
+    report["failures"] = failures
+
+    text = json.dumps(report, indent=2)
+    if args.out:
+        with open(args.out, "w") as fh:
+            fh.write(text + "\n")
+    print(text)
+    if failures:
+        for failure in failures:
+            print(f"FAIL {failure}", file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
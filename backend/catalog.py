@@ -0,0 +1,140 @@
+# catalog.py
+"""Row parsing and encoding for bulk catalog import/export.
+
+Import bodies are NDJSON (one product object per line) or CSV with a header
+row, read incrementally from the request stream: ``iter_lines`` splits raw
+chunks into lines, ``iter_rows`` turns lines into dicts, and
+``coerce_product`` validates one row into the document that gets written.
+Nothing holds more than the current line (or quoted CSV record) in memory.
+"""
+import csv
+import io
+import json
+import math
+from typing import AsyncIterator, Dict, Optional, Tuple
+
+# Optional text fields an import may set besides name/price/stock; anything
+# else in a row is ignored (rating aggregates and created_at are server-owned)
+TEXT_FIELDS = ("id", "description", "category_id", "image_url", "unit")
+
+EXPORT_FIELDS = (
+    "id", "name", "description", "price", "stock", "category_id", "image_url", "unit",
+    "seller_id", "original_wh_product_id", "rating", "review_count",
+)
+
+MAX_LINE_BYTES = 1 << 20
+
+
+class RowError(ValueError):
+    pass
+
+
+async def iter_lines(chunks: AsyncIterator[bytes]) -> AsyncIterator[str]:
+    """Decoded lines from a byte stream, without the line terminator."""
+    pending = b""
+    encoding = "utf-8-sig"  # tolerate a byte-order mark on the first line only
+    async for chunk in chunks:
+        pending += chunk
+        *lines, pending = pending.split(b"\n")
+        for line in lines:
+            yield line.rstrip(b"\r").decode(encoding, errors="replace")
+            encoding = "utf-8"
+        if len(pending) > MAX_LINE_BYTES:
+            raise RowError(f"line longer than {MAX_LINE_BYTES} bytes")
+    if pending.strip():
+        yield pending.rstrip(b"\r").decode(encoding, errors="replace")
+
+
+async def iter_rows(lines: AsyncIterator[str], fmt: str) -> AsyncIterator[Tuple[int, Optional[dict], Optional[str]]]:
+    """(row number, row dict or None, error or None) for every data row."""
+    if fmt == "ndjson":
+        row_no = 0
+        async for line in lines:
+            if not line.strip():
+                continue
+            row_no += 1
+            try:
+                row = json.loads(line)
+            except ValueError as e:
+                yield row_no, None, f"invalid JSON: {e}"
+                continue
+            if not isinstance(row, dict):
+                yield row_no, None, "expected a JSON object"
+                continue
+            yield row_no, row, None
+        return
+
+    header = None
+    record = ""
+    row_no = 0
+    async for line in lines:
+        # A quoted CSV field may span lines; keep reading until quotes balance
+        record = f"{record}\n{line}" if record else line
+        if record.count('"') % 2:
+            continue
+        values = next(csv.reader(io.StringIO(record)), [])
+        record = ""
+        if not any(v.strip() for v in values):
+            continue
+        if header is None:
+            header = [h.strip().lower() for h in values]
+            continue
+        row_no += 1
+        if len(values) > len(header):
+            yield row_no, None, f"expected {len(header)} columns, got {len(values)}"
+            continue
+        yield row_no, dict(zip(header, values)), None
+    if record:
+        row_no += 1
+        yield row_no, None, "unterminated quoted field"
+
+
+def _number(value, field: str, integer: bool = False):
+    if value is None or (isinstance(value, str) and not value.strip()):
+        raise RowError(f"{field} is required")
+    if isinstance(value, bool):
+        raise RowError(f"{field} must be a number")
+    try:
+        number = float(value)
+    except (TypeError, ValueError):
+        raise RowError(f"{field} must be a number, got {value!r}")
+    if not math.isfinite(number) or number < 0:
+        raise RowError(f"{field} must be a non-negative number")
+    if integer:
+        if not number.is_integer():
+            raise RowError(f"{field} must be a whole number")
+        return int(number)
+    return round(number, 2)
+
+
+def coerce_product(row: Dict, seller_id: str) -> dict:
+    """Validated product fields for ``row``; raises ``RowError``."""
+    if row.get("seller_id") not in (None, "", seller_id):
+        raise RowError("seller_id does not match the import's seller")
+    name = str(row.get("name") or "").strip()
+    if not name:
+        raise RowError("name is required")
+
+    doc = {"name": name, "seller_id": seller_id}
+    for field in TEXT_FIELDS:
+        value = row.get(field)
+        if value not in (None, ""):
+            doc[field] = str(value).strip()
+    doc["price"] = _number(row.get("price"), "price")
+    stock = row.get("stock")
+    doc["stock"] = 0 if stock in (None, "") else _number(stock, "stock", integer=True)
+    return doc
+
+
+def export_ndjson(doc: dict) -> str:
+    return json.dumps(doc, default=str) + "\n"
+
+
+def export_csv_header() -> str:
+    return export_csv_row({f: f for f in EXPORT_FIELDS})
+
+
+def export_csv_row(doc: dict) -> str:
+    out = io.StringIO()
+    csv.writer(out).writerow(["" if doc.get(f) is None else doc.get(f) for f in EXPORT_FIELDS])
+    return out.getvalue()
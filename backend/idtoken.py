@@ -0,0 +1,174 @@
+# idtoken.py
+"""Google ID token verification against a cached JWKS.
+
+Google rotates its signing keys every few days and serves them with a
+``Cache-Control: max-age`` header. ``JWKSCache`` keeps the current key set in
+memory for that long, refreshes it in the background shortly before it
+expires, and only waits on the network when it has no keys yet or sees a
+``kid`` it does not know (a rotation). Signature checks then run locally.
+
+``GOOGLE_CERTS_URL`` can point at a local JWKS file server for offline
+testing with self-signed tokens.
+"""
+import asyncio
+import logging
+import re
+import time
+from email.utils import parsedate_to_datetime
+from typing import Callable, Dict, Optional, Sequence, Tuple
+
+import jwt
+
+logger = logging.getLogger("idtoken")
+
+GOOGLE_CERTS_URL = "https://www.googleapis.com/oauth2/v3/certs"
+GOOGLE_ISSUERS = ("accounts.google.com", "https://accounts.google.com")
+
+MAX_AGE_RE = re.compile(r"max-age=(\d+)")
+
+
+def cache_lifetime(headers, default: float) -> float:
+    """Seconds the response may be cached for, from Cache-Control or Expires."""
+    cache_control = headers.get("Cache-Control", "")
+    if "no-store" in cache_control or "no-cache" in cache_control:
+        return 0.0
+    match = MAX_AGE_RE.search(cache_control)
+    if match:
+        return max(0.0, float(match.group(1)) - float(headers.get("Age", 0) or 0))
+    expires = headers.get("Expires")
+    if expires:
+        try:
+            return max(0.0, parsedate_to_datetime(expires).timestamp() - time.time())
+        except (TypeError, ValueError):
+            pass
+    return default
+
+
+def fetch_jwks(url: str, timeout: float = 5.0) -> Tuple[dict, float]:
+    """Blocking fetch of a JWKS document; returns (document, max age seconds)."""
+    import requests  # first fetch only; keeps it out of the server's import time
+
+    resp = requests.get(url, timeout=timeout)
+    resp.raise_for_status()
+    return resp.json(), cache_lifetime(resp.headers, default=300.0)
+
+
+class JWKSCache:
+    def __init__(
+        self,
+        url: str = GOOGLE_CERTS_URL,
+        min_ttl: float = 60.0,
+        max_ttl: float = 24 * 3600.0,
+        refresh_ahead: float = 0.1,
+        unknown_kid_cooldown: float = 30.0,
+        fetch: Callable[[str], Tuple[dict, float]] = fetch_jwks,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.url = url
+        self.min_ttl = min_ttl
+        self.max_ttl = max_ttl
+        self.refresh_ahead = refresh_ahead
+        self.unknown_kid_cooldown = unknown_kid_cooldown
+        self._fetch = fetch
+        self._clock = clock
+
+        self._keys: Dict[str, jwt.PyJWK] = {}
+        self._fetched_at = 0.0
+        self._expires_at = 0.0
+        self._refreshing: Optional[asyncio.Task] = None
+        self.fetches = 0
+        self.fetch_errors = 0
+
+    def stats(self) -> dict:
+        now = self._clock()
+        return {
+            "keys": len(self._keys),
+            "expires_in": round(max(0.0, self._expires_at - now), 1),
+            "fetches": self.fetches,
+            "fetch_errors": self.fetch_errors,
+        }
+
+    async def refresh(self):
+        """Fetch the key set now; concurrent callers share one request."""
+        if self._refreshing is None or self._refreshing.done():
+            self._refreshing = asyncio.create_task(self._refresh())
+        await asyncio.shield(self._refreshing)
+
+    async def _refresh(self):
+        try:
+            document, max_age = await asyncio.to_thread(self._fetch, self.url)
+            keys = {}
+            for jwk in document.get("keys", []):
+                try:
+                    keys[jwk["kid"]] = jwt.PyJWK(jwk)
+                except (KeyError, jwt.PyJWKError) as e:
+                    logger.warning(f"Skipping unusable JWK {jwk.get('kid')}: {e}")
+        except Exception:
+            self.fetch_errors += 1
+            raise
+        self.fetches += 1
+        now = self._clock()
+        self._keys = keys
+        self._fetched_at = now
+        self._expires_at = now + min(self.max_ttl, max(self.min_ttl, max_age))
+        logger.info(f"Loaded {len(keys)} signing keys from {self.url}, cached for {self._expires_at - now:.0f}s")
+
+    def _refresh_in_background(self):
+        if self._refreshing is not None and not self._refreshing.done():
+            return
+        self._refreshing = asyncio.create_task(self._refresh())
+        # Failures are retried on the next lookup; keep them out of the loop's error log
+        self._refreshing.add_done_callback(lambda t: t.cancelled() or t.exception())
+
+    async def get_key(self, kid: str) -> jwt.PyJWK:
+        now = self._clock()
+        lifetime = self._expires_at - self._fetched_at
+        if kid in self._keys and now < self._expires_at:
+            if now >= self._expires_at - lifetime * self.refresh_ahead:
+                self._refresh_in_background()
+            return self._keys[kid]
+
+        if not self._keys or now >= self._expires_at:
+            try:
+                await self.refresh()
+            except Exception:
+                # Keep serving the last good key set through a Google outage
+                if kid not in self._keys:
+                    raise
+                logger.warning("JWKS refresh failed; using expired keys")
+        elif kid not in self._keys and now - self._fetched_at >= self.unknown_kid_cooldown:
+            # Unknown kid on a fresh key set: Google may have just rotated
+            await self.refresh()
+
+        key = self._keys.get(kid)
+        if key is None:
+            raise jwt.InvalidTokenError(f"Unknown signing key {kid!r}")
+        return key
+
+
+class GoogleTokenVerifier:
+    def __init__(self, audience: str, jwks: JWKSCache, issuers: Sequence[str] = GOOGLE_ISSUERS, leeway: float = 30.0):
+        self.audience = audience
+        self.jwks = jwks
+        self.issuers = list(issuers)
+        self.leeway = leeway
+
+    def _decode(self, token: str, key: jwt.PyJWK) -> dict:
+        return jwt.decode(
+            token,
+            key.key,
+            algorithms=[key.algorithm_name or "RS256"],
+            audience=self.audience,
+            issuer=self.issuers,
+            leeway=self.leeway,
+            options={"require": ["exp", "iat", "iss", "aud", "sub"]},
+        )
+
+    async def verify(self, token: str) -> dict:
+        """Return the token's claims; raises ``jwt.InvalidTokenError`` if invalid."""
+        kid = jwt.get_unverified_header(token).get("kid")
+        if not kid:
+            raise jwt.InvalidTokenError("Token has no key id")
+        key = await self.jwks.get_key(kid)
+        # RSA verification is CPU work; keep it off the event loop
+        return await asyncio.to_thread(self._decode, token, key)
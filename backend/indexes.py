@@ -0,0 +1,273 @@
+# indexes.py
+"""Declarative MongoDB index registry.
+
+Every index the backend relies on is declared here with the query shapes it
+serves. ``create_indexes`` builds them all concurrently at startup, and
+``verify`` runs ``explain`` on each registered shape and flags any that
+the planner would answer with a ``COLLSCAN``. Indexes marked ``required``
+carry correctness, not just speed (e.g. the unique product ``id`` that turns
+a short-stock upsert in ``reserve_stock`` into an error); the server stays
+unready while ``missing_required`` reports any of them. Add the index and
+its query together; a query shape without an index shows up in the check.
+
+Check a deployment (or the benchmark database) from the backend directory:
+
+    python -m indexes --mongo-url mongodb://localhost:27017 --db-name livemart_bench --no-tls
+"""
+import argparse
+import asyncio
+import json
+import logging
+import sys
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+logger = logging.getLogger("indexes")
+
+
+@dataclass(frozen=True)
+class QueryShape:
+    """A representative query: a find (``filter`` + ``sort``) or an aggregate ``pipeline``."""
+    filter: Dict[str, Any] = field(default_factory=dict)
+    sort: Optional[Dict[str, int]] = None
+    pipeline: Optional[List[dict]] = None
+    note: str = ""
+
+
+@dataclass(frozen=True)
+class IndexSpec:
+    collection: str
+    keys: Sequence[Tuple[str, Any]]
+    options: Dict[str, Any] = field(default_factory=dict)
+    queries: Sequence[QueryShape] = ()
+    required: bool = False
+
+    @property
+    def label(self) -> str:
+        if "name" in self.options:
+            return f"{self.collection}.{self.options['name']}"
+        return f"{self.collection}." + "_".join(f"{k}_{d}" for k, d in self.keys)
+
+
+def _find(filter: dict, sort: Optional[dict] = None, note: str = "") -> QueryShape:
+    return QueryShape(filter=filter, sort=sort, note=note)
+
+
+INDEXES: List[IndexSpec] = [
+    # ---- products ----
+    # Required: reserve_stock relies on it to reject upserts of short stock
+    IndexSpec("products", [("id", 1)], {"unique": True}, [
+        _find({"id": "p"}, note="product detail, cart and order lookups"),
+    ], required=True),
+    IndexSpec("products", [("name", "text"), ("description", "text")],
+              {"weights": {"name": 3, "description": 1}, "name": "products_text"}, [
+        _find({"$text": {"$search": "milk"}}, note="SEARCH_ENGINE=text"),
+    ]),
+    # Retailer mirrors of wholesale products, upserted by purchase_from_wholesaler
+    IndexSpec("products", [("seller_id", 1), ("original_wh_product_id", 1)],
+              {"unique": True, "partialFilterExpression": {"original_wh_product_id": {"$exists": True}}}, [
+        _find({"seller_id": "s", "original_wh_product_id": "p"}, note="purchase upsert"),
+    ]),
+    IndexSpec("products", [("seller_id", 1), ("id", 1)], {}, [
+        _find({"seller_id": "s", "stock": {"$gt": 0}}, {"id": 1}, note="product list by seller"),
+        _find({"seller_id": "s"}, {"id": 1}, note="catalog export, retailer listing, products_count"),
+        _find({"seller_id": {"$in": ["s", "S"]}}, note="wholesaler dashboard products_count"),
+    ]),
+    IndexSpec("products", [("category_id", 1), ("id", 1)], {}, [
+        _find({"category_id": "c", "stock": {"$gt": 0}}, {"id": 1}, note="product list by category"),
+    ]),
+    IndexSpec("products", [("price", 1)], {}, [
+        _find({"price": {"$gte": 10, "$lte": 50}}, note="price range filter"),
+    ]),
+    IndexSpec("products", [("stock", 1)], {}, [
+        _find({"stock": {"$lte": 0}}, note="out-of-stock products"),
+    ]),
+    IndexSpec("products", [("original_wh_product_id", 1)], {"sparse": True}, [
+        _find({"original_wh_product_id": "p"}, note="retailer mirrors of a wholesale product"),
+    ]),
+
+    # ---- orders ----
+    IndexSpec("orders", [("id", 1)], {"unique": True}, [
+        _find({"id": "o"}),
+    ]),
+    IndexSpec("orders", [("user_id", 1)], {}, [
+        _find({"user_id": "u"}, note="customer order history"),
+    ]),
+    IndexSpec("orders", [("items.seller_id", 1)], {}, [
+        _find({"items.seller_id": "s"}, note="orders containing a seller's items"),
+    ]),
+
+    # ---- feedback ----
+    IndexSpec("feedback", [("id", 1)], {"unique": True}, [
+        _find({"id": "f"}),
+    ]),
+    IndexSpec("feedback", [("product_id", 1), ("created_at", -1)], {}, [
+        _find({"product_id": "p"}, {"created_at": -1}, note="product reviews, newest first"),
+    ]),
+    IndexSpec("feedback", [("user_id", 1), ("product_id", 1)], {}, [
+        _find({"user_id": "u", "product_id": "p"}, note="update a user's existing review"),
+    ]),
+
+    # ---- users ----
+    IndexSpec("users", [("email", 1)], {"unique": True}, [
+        _find({"email": "a@b.c"}, note="login, OTP and Google sign-in"),
+    ]),
+    IndexSpec("users", [("id", 1)], {"unique": True}, [
+        _find({"id": "u"}, note="profile and auth lookups"),
+    ]),
+    IndexSpec("users", [("role", 1), ("pincode", 1)], {}, [
+        _find({"role": "retailer", "pincode": {"$exists": True, "$ne": None}}, note="retailer index load"),
+    ]),
+
+    # ---- everything else ----
+    IndexSpec("categories", [("id", 1)], {"unique": True}),
+    IndexSpec("transactions", [("id", 1)], {"unique": True}),
+    # Required: add_to_cart relies on it to stop a racing upsert creating a second cart
+    IndexSpec("cart", [("user_id", 1)], {"unique": True}, [
+        _find({"user_id": "u"}, note="cart reads and updates"),
+    ], required=True),
+    IndexSpec("purchases", [("id", 1)], {"unique": True}),
+    IndexSpec("purchases", [("wholesaler_id", 1), ("created_at", 1)], {}, [
+        QueryShape(pipeline=[
+            {"$match": {"wholesaler_id": "w", "created_at": {"$gte": "2024-01-01"}}},
+            {"$group": {"_id": None, "n": {"$sum": 1}}},
+        ], note="wholesaler dashboard totals"),
+    ]),
+    IndexSpec("seller_stats", [("seller_id", 1)], {"unique": True}, [
+        _find({"seller_id": "s"}, note="dashboard rollups"),
+    ]),
+    IndexSpec("otps", [("email", 1)], {}, [
+        _find({"email": "a@b.c"}, note="OTP verification"),
+    ]),
+]
+
+
+async def create_indexes(db, specs: Sequence[IndexSpec] = INDEXES) -> Dict[str, Optional[str]]:
+    """Create every index concurrently; returns label -> error message (None on success).
+
+    A failing index (e.g. a unique index over duplicate data) is logged and
+    does not stop the others.
+    """
+    async def create(spec: IndexSpec):
+        await db[spec.collection].create_index(list(spec.keys), **spec.options)
+
+    results = await asyncio.gather(*(create(s) for s in specs), return_exceptions=True)
+    report: Dict[str, Optional[str]] = {}
+    for spec, result in zip(specs, results):
+        if isinstance(result, BaseException):
+            logger.error(f"Index {spec.label} not created: {result}")
+            report[spec.label] = str(result)
+        else:
+            report[spec.label] = None
+    return report
+
+
+async def missing_required(db, specs: Sequence[IndexSpec] = INDEXES) -> List[str]:
+    """Labels of ``required`` indexes not present on the server with their keys and uniqueness."""
+    async def present(spec: IndexSpec) -> bool:
+        wanted = [tuple(k) for k in spec.keys]
+        for info in (await db[spec.collection].index_information()).values():
+            if [tuple(k) for k in info["key"]] == wanted and bool(info.get("unique")) == bool(spec.options.get("unique")):
+                return True
+        return False
+
+    required = [spec for spec in specs if spec.required]
+    found = await asyncio.gather(*(present(spec) for spec in required))
+    return [spec.label for spec, ok in zip(required, found) if not ok]
+
+
+def plan_stages(explain: Any) -> List[str]:
+    """Every stage name in the explain output's winning plan(s).
+
+    Walks the whole document, skipping rejected plans, so it copes with find
+    and aggregate explains and with the classic and slot-based engine layouts.
+    """
+    stages: List[str] = []
+
+    def walk(node):
+        if isinstance(node, dict):
+            for key, value in node.items():
+                if key == "rejectedPlans":
+                    continue
+                if key == "stage" and isinstance(value, str):
+                    stages.append(value)
+                else:
+                    walk(value)
+        elif isinstance(node, list):
+            for item in node:
+                walk(item)
+
+    walk(explain)
+    return stages
+
+
+async def explain(db, collection: str, shape: QueryShape) -> dict:
+    if shape.pipeline is not None:
+        command = {"aggregate": collection, "pipeline": shape.pipeline, "cursor": {}}
+    else:
+        command = {"find": collection, "filter": shape.filter}
+        if shape.sort:
+            command["sort"] = shape.sort
+    return await db.command("explain", command, verbosity="queryPlanner")
+
+
+async def verify(db, specs: Sequence[IndexSpec] = INDEXES) -> List[dict]:
+    """Explain every registered query shape; one result row per shape.
+
+    ``status`` is ``ok``, ``COLLSCAN`` or ``error`` (explain itself failed).
+    """
+    async def check(spec: IndexSpec, shape: QueryShape) -> dict:
+        row = {"index": spec.label, "query": shape.pipeline or shape.filter, "note": shape.note}
+        if shape.sort:
+            row["sort"] = shape.sort
+        try:
+            stages = plan_stages(await explain(db, spec.collection, shape))
+        except Exception as e:
+            row.update(status="error", error=str(e))
+            return row
+        row["stages"] = stages
+        row["status"] = "COLLSCAN" if "COLLSCAN" in stages else "ok"
+        return row
+
+    return await asyncio.gather(*(check(spec, shape) for spec in specs for shape in spec.queries))
+
+
+def _parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Create the registered indexes and check query plans")
+    parser.add_argument("--mongo-url", help="defaults to MONGO_URL")
+    parser.add_argument("--db-name", help="defaults to DB_NAME")
+    parser.add_argument("--no-tls", action="store_true", help="plain connection (local benchmark server)")
+    parser.add_argument("--no-create", action="store_true", help="only explain; do not create missing indexes")
+    parser.add_argument("--json", action="store_true", help="print the full report as JSON")
+    return parser.parse_args(argv)
+
+
+def main(argv=None) -> int:
+    """Exit status 1 if any registered query shape is answered by a collection scan."""
+    args = _parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format="%(levelname)s %(name)s: %(message)s")
+    import server
+
+    async def run():
+        db = server.open_db(args.mongo_url, args.db_name, tls=not args.no_tls)
+        try:
+            if not args.no_create:
+                await create_indexes(db)
+            return await verify(db)
+        finally:
+            server.client.close()
+
+    rows = asyncio.run(run())
+    if args.json:
+        print(json.dumps(rows, indent=2, default=str))
+    else:
+        for row in rows:
+            detail = row.get("error") or " > ".join(row["stages"])
+            print(f"{row['status']:<9} {row['index']:<55} {json.dumps(row['query'], default=str)}  [{detail}]")
+    failed = [r for r in rows if r["status"] != "ok"]
+    print(f"{len(rows) - len(failed)}/{len(rows)} query shapes use an index", file=sys.stderr)
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
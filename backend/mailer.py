@@ -0,0 +1,231 @@
+# mailer.py
+"""Background email dispatcher with a small pool of persistent SMTP sessions.
+
+Messages are queued in-process and sent by ``pool_size`` worker tasks, each
+holding one connected (and, when credentials are set, authenticated) SMTP
+session that is reused across messages instead of a fresh
+TCP + STARTTLS + AUTH handshake per email. A worker drains up to
+``batch_size`` queued messages per wake-up over its session, failed sends are
+retried with exponential backoff, and ``allow()`` enforces a per-recipient
+rate limit before anything is queued.
+
+For local testing point it at an ``aiosmtpd`` server with ``start_tls=False``
+and no credentials.
+"""
+import asyncio
+import logging
+import time
+from collections import deque
+from dataclasses import dataclass, field
+from typing import TYPE_CHECKING, Callable, Deque, Dict, Optional
+
+if TYPE_CHECKING:
+    import aiosmtplib
+
+logger = logging.getLogger("mailer")
+
+
+def _smtplib():
+    # Imported when the first worker connects, so a server without SMTP
+    # configured never loads it
+    import aiosmtplib
+
+    return aiosmtplib
+
+
+@dataclass
+class _Job:
+    recipient: str
+    message: object
+    on_failure: Optional[Callable[[Exception], None]] = None
+    attempt: int = 0
+    queued_at: float = field(default_factory=time.monotonic)
+
+
+class MailDispatcher:
+    def __init__(
+        self,
+        hostname: str,
+        port: int,
+        username: str = "",
+        password: str = "",
+        start_tls: Optional[bool] = True,
+        pool_size: int = 2,
+        batch_size: int = 20,
+        max_retries: int = 3,
+        backoff: float = 1.0,
+        queue_size: int = 1000,
+        rate_limit: int = 3,
+        rate_window: float = 300.0,
+        timeout: float = 30.0,
+    ):
+        self.hostname = hostname
+        self.port = port
+        self.username = username or None
+        self.password = password or None
+        self.start_tls = start_tls
+        self.pool_size = pool_size
+        self.batch_size = batch_size
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.rate_limit = rate_limit
+        self.rate_window = rate_window
+        self.timeout = timeout
+
+        self._queue_size = queue_size
+        self._queue: Optional[asyncio.Queue] = None
+        self._workers = []
+        self._retry_tasks = set()
+        self._recent: Dict[str, Deque[float]] = {}
+        self._counters = {
+            "sent": 0,
+            "failed": 0,
+            "retried": 0,
+            "rate_limited": 0,
+            "dropped": 0,
+            "connections_opened": 0,
+        }
+
+    @property
+    def running(self) -> bool:
+        return bool(self._workers)
+
+    async def start(self):
+        if self._workers:
+            return
+        self._queue = asyncio.Queue(maxsize=self._queue_size)
+        self._workers = [asyncio.create_task(self._worker(i)) for i in range(self.pool_size)]
+        logger.info(f"Mail dispatcher started with {self.pool_size} SMTP connections to {self.hostname}:{self.port}")
+
+    async def stop(self, drain_timeout: float = 5.0):
+        """Give queued mail a moment to go out, then close every session."""
+        if not self._workers:
+            return
+        try:
+            await asyncio.wait_for(self._queue.join(), timeout=drain_timeout)
+        except asyncio.TimeoutError:
+            logger.warning(f"Mail dispatcher stopping with {self._queue.qsize()} messages unsent")
+        for task in list(self._retry_tasks) + self._workers:
+            task.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+
+    def allow(self, recipient: str) -> bool:
+        """Record a send attempt for ``recipient``; False once it exceeds the rate limit."""
+        now = time.monotonic()
+        recent = self._recent.setdefault(recipient.lower(), deque())
+        while recent and recent[0] <= now - self.rate_window:
+            recent.popleft()
+        if len(recent) >= self.rate_limit:
+            self._counters["rate_limited"] += 1
+            return False
+        recent.append(now)
+        # Keep the bookkeeping from growing with every address ever seen
+        if len(self._recent) > 10000:
+            self._recent = {k: v for k, v in self._recent.items() if v and v[-1] > now - self.rate_window}
+        return True
+
+    def enqueue(self, recipient: str, message, on_failure: Optional[Callable[[Exception], None]] = None) -> bool:
+        """Queue ``message`` for delivery; returns False if the queue is full or not running."""
+        if self._queue is None:
+            return False
+        try:
+            self._queue.put_nowait(_Job(recipient, message, on_failure))
+            return True
+        except asyncio.QueueFull:
+            self._counters["dropped"] += 1
+            return False
+
+    def stats(self) -> dict:
+        return {
+            **self._counters,
+            "queue_depth": self._queue.qsize() if self._queue else 0,
+            "workers": len(self._workers),
+        }
+
+    # ------------------------------------------------------------------
+    async def _connect(self) -> "aiosmtplib.SMTP":
+        smtp = _smtplib().SMTP(
+            hostname=self.hostname,
+            port=self.port,
+            username=self.username,
+            password=self.password,
+            start_tls=self.start_tls,
+            timeout=self.timeout,
+        )
+        # connect() runs EHLO, STARTTLS and AUTH (when credentials are set)
+        await smtp.connect()
+        self._counters["connections_opened"] += 1
+        return smtp
+
+    async def _worker(self, n: int):
+        smtp: Optional["aiosmtplib.SMTP"] = None
+        try:
+            while True:
+                jobs = [await self._queue.get()]
+                while len(jobs) < self.batch_size:
+                    try:
+                        jobs.append(self._queue.get_nowait())
+                    except asyncio.QueueEmpty:
+                        break
+
+                for job in jobs:
+                    try:
+                        smtp = await self._send(smtp, job)
+                    finally:
+                        self._queue.task_done()
+        except asyncio.CancelledError:
+            pass
+        finally:
+            if smtp is not None and smtp.is_connected:
+                try:
+                    await smtp.quit()
+                except Exception:
+                    smtp.close()
+
+    async def _send(self, smtp: Optional["aiosmtplib.SMTP"], job: _Job) -> Optional["aiosmtplib.SMTP"]:
+        """Send one job, reconnecting once if the pooled session went stale."""
+        for fresh in (False, True):
+            try:
+                if smtp is None or not smtp.is_connected or fresh:
+                    if smtp is not None:
+                        smtp.close()
+                    smtp = await self._connect()
+                await smtp.send_message(job.message)
+                self._counters["sent"] += 1
+                logger.info(f"Mail sent to {job.recipient}")
+                return smtp
+            except _smtplib().SMTPServerDisconnected:
+                # Idle sessions get dropped by the relay; retry on a new one
+                smtp = None
+                if fresh:
+                    self._schedule_retry(job, _smtplib().SMTPServerDisconnected("disconnected"))
+            except Exception as e:
+                if smtp is not None and not smtp.is_connected:
+                    smtp = None
+                self._schedule_retry(job, e)
+                return smtp
+        return smtp
+
+    def _schedule_retry(self, job: _Job, error: Exception):
+        if job.attempt >= self.max_retries:
+            self._counters["failed"] += 1
+            logger.error(f"Giving up on mail to {job.recipient} after {job.attempt + 1} attempts: {error}")
+            if job.on_failure:
+                job.on_failure(error)
+            return
+
+        job.attempt += 1
+        self._counters["retried"] += 1
+        delay = self.backoff * (2 ** (job.attempt - 1))
+
+        async def requeue():
+            await asyncio.sleep(delay)
+            try:
+                self._queue.put_nowait(job)
+            except asyncio.QueueFull:
+                self._counters["dropped"] += 1
+
+        task = asyncio.create_task(requeue())
+        self._retry_tasks.add(task)
+        task.add_done_callback(self._retry_tasks.discard)
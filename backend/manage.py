@@ -0,0 +1,102 @@
+# manage.py
+"""Maintenance commands for the LiveMART backend.
+
+Run from the backend directory with the same .env as the server:
+
+    python manage.py backfill-ratings
+    python manage.py rebuild-seller-stats
+    python manage.py normalize-purchases
+    python manage.py migrate-schema [--collections products,cart,orders] [--dry-run]
+"""
+import argparse
+import asyncio
+import logging
+
+import schema
+import server
+
+logger = logging.getLogger("manage")
+
+
+async def backfill_ratings(args):
+    updated = await server.rebuild_rating_aggregates(batch_size=args.batch_size)
+    logger.info(f"Rebuilt rating aggregates for {updated} products")
+
+
+async def rebuild_seller_stats(args):
+    sellers = await server.rebuild_seller_stats(batch_size=args.batch_size)
+    logger.info(f"Rebuilt sales rollups for {sellers} sellers")
+
+
+async def normalize_purchases(args):
+    modified = await server.normalize_purchase_ids()
+    logger.info(f"Normalized wholesaler_id on {modified} purchases")
+
+
+async def migrate_schema(args):
+    collections = [c.strip() for c in args.collections.split(",") if c.strip()]
+    unknown = set(collections) - set(schema.SCHEMA_VERSIONS)
+    if unknown:
+        raise SystemExit(f"Unknown collections: {', '.join(sorted(unknown))}")
+
+    for name in collections:
+        if args.dry_run:
+            count = await server.db[name].count_documents(schema.outdated(name))
+            logger.info(f"{name}: {count} documents below schema version {schema.SCHEMA_VERSIONS[name]}")
+            continue
+
+        def progress(stats):
+            done = stats["scanned"]
+            total = max(stats["outdated"], done)
+            remaining = (total - done) / stats["docs_per_s"] if stats["docs_per_s"] else 0
+            logger.info(
+                f"{name}: {done}/{total} ({done / total:.0%}), {stats['docs_per_s']:.0f} docs/s, "
+                f"~{remaining:.0f}s left"
+            )
+
+        stats = await schema.migrate(server.db, name, batch_size=args.batch_size, progress=progress)
+        logger.info(
+            f"{name}: upgraded {stats['upgraded']} documents to schema version {stats['version']}"
+            + (f"; {stats['skipped']} changed during the run, run again to pick them up" if stats["skipped"] else "")
+        )
+
+
+COMMANDS = {
+    "backfill-ratings": backfill_ratings,
+    "rebuild-seller-stats": rebuild_seller_stats,
+    "normalize-purchases": normalize_purchases,
+    "migrate-schema": migrate_schema,
+}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="LiveMART maintenance commands")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p = sub.add_parser("backfill-ratings", help="rebuild product rating aggregates from feedback")
+    p.add_argument("--batch-size", type=int, default=1000)
+
+    p = sub.add_parser("rebuild-seller-stats", help="recompute seller sales rollups from orders and products")
+    p.add_argument("--batch-size", type=int, default=1000)
+
+    sub.add_parser("normalize-purchases", help="lowercase/trim wholesaler_id on existing purchases")
+
+    p = sub.add_parser("migrate-schema", help="upgrade products, carts and orders to the current schema version")
+    p.add_argument("--collections", default=",".join(schema.SCHEMA_VERSIONS))
+    p.add_argument("--batch-size", type=int, default=500)
+    p.add_argument("--dry-run", action="store_true", help="only count documents that need upgrading")
+
+    args = parser.parse_args(argv)
+
+    async def run():
+        server.open_db()
+        try:
+            await COMMANDS[args.command](args)
+        finally:
+            server.client.close()
+
+    asyncio.run(run())
+
+
+if __name__ == "__main__":
+    main()
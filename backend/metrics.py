@@ -0,0 +1,276 @@
+# metrics.py
+"""In-process metrics with Prometheus text exposition.
+
+``MetricsMiddleware`` records per-route request counts, latency histograms
+and in-flight gauges; routes are labelled by their path template
+(``/api/orders/{uid}``), never the raw URL, so label cardinality stays at the
+number of routes. ``MongoCommandMetrics`` is a pymongo ``CommandListener``
+recording per-collection, per-command latency and documents returned.
+
+Recording is a dict lookup, a bisect and a few integer increments under a
+lock; all formatting happens when ``/api/metrics`` is scraped. Values are per
+worker process.
+"""
+import bisect
+import threading
+import time
+from functools import lru_cache
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from pymongo import monitoring
+from starlette.routing import Match
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+DOCUMENT_BUCKETS = (0, 1, 10, 100, 1000, 10000, 100000)
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names: Sequence[str], values: Sequence, extra: str = "") -> str:
+    parts = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _number(value) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(value) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def header(self) -> List[str]:
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, name, help, labelnames=()):
+        super().__init__(name, help, labelnames)
+        self._values: Dict[tuple, float] = {}
+
+    def inc(self, labels: tuple = (), amount: float = 1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def render(self) -> List[str]:
+        with self._lock:
+            items = list(self._values.items())
+        return self.header() + [f"{self.name}{_labels(self.labelnames, k)} {_number(v)}" for k, v in items]
+
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def set(self, labels: tuple, value: float):
+        with self._lock:
+            self._values[labels] = value
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name, help, labelnames=(), buckets: Sequence[float] = LATENCY_BUCKETS):
+        super().__init__(name, help, labelnames)
+        self.buckets = tuple(buckets)
+        self._series: Dict[tuple, list] = {}  # labels -> [per-bucket counts..., +Inf count, sum]
+
+    def observe(self, labels: tuple, value: float):
+        i = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [0] * (len(self.buckets) + 1) + [0.0]
+            series[i] += 1
+            series[-1] += value
+
+    def snapshot(self) -> Dict[tuple, Tuple[int, float]]:
+        """labels -> (count, sum)."""
+        with self._lock:
+            return {k: (sum(v[:-1]), v[-1]) for k, v in self._series.items()}
+
+    def render(self) -> List[str]:
+        with self._lock:
+            items = [(k, list(v)) for k, v in self._series.items()]
+        lines = self.header()
+        for labels, series in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), series[:-1]):
+                cumulative += count
+                le = f'le="{_number(float(bound))}"'
+                lines.append(f"{self.name}_bucket{_labels(self.labelnames, labels, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_labels(self.labelnames, labels)} {_number(series[-1])}")
+            lines.append(f"{self.name}_count{_labels(self.labelnames, labels)} {cumulative}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: List[_Metric] = []
+        self._collectors: List[Callable[[], Iterable[_Metric]]] = []
+
+    def register(self, metric: _Metric) -> _Metric:
+        self._metrics.append(metric)
+        return metric
+
+    def counter(self, name, help, labelnames=()) -> Counter:
+        return self.register(Counter(name, help, labelnames))
+
+    def gauge(self, name, help, labelnames=()) -> Gauge:
+        return self.register(Gauge(name, help, labelnames))
+
+    def histogram(self, name, help, labelnames=(), buckets=LATENCY_BUCKETS) -> Histogram:
+        return self.register(Histogram(name, help, labelnames, buckets))
+
+    def add_collector(self, collect: Callable[[], Iterable[_Metric]]):
+        """Register a callable producing metrics at scrape time (cache stats etc.)."""
+        self._collectors.append(collect)
+
+    def render(self) -> str:
+        lines: List[str] = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        for collect in self._collectors:
+            for metric in collect():
+                lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+def stats_gauges(prefix: str, stats: Dict[str, Dict[str, float]], label: str) -> List[Gauge]:
+    """Turn ``{"products": {"hits": 3, ...}, ...}`` into one gauge per stat, labelled by key."""
+    gauges: Dict[str, Gauge] = {}
+    for key, values in stats.items():
+        for stat, value in values.items():
+            if not isinstance(value, (int, float)) or isinstance(value, bool):
+                continue
+            gauge = gauges.get(stat)
+            if gauge is None:
+                gauge = gauges[stat] = Gauge(f"{prefix}_{stat}", f"{prefix} {stat}", (label,))
+            gauge.set((key,), value)
+    return list(gauges.values())
+
+
+# ----------------------------------------------------------------------
+class MetricsMiddleware:
+    """Pure ASGI middleware; cheaper than BaseHTTPMiddleware and streams untouched."""
+
+    def __init__(self, app, registry: Registry):
+        self.app = app
+        self.requests = registry.counter(
+            "http_requests_total", "HTTP requests by route, method and status", ("route", "method", "status")
+        )
+        self.latency = registry.histogram(
+            "http_request_duration_seconds", "HTTP request latency by route", ("route", "method")
+        )
+        self.in_flight = registry.gauge(
+            "http_requests_in_flight", "HTTP requests being handled by route", ("route", "method")
+        )
+        # The router only records the matched route once it has run, so the
+        # in-flight label is found by matching up front (cached per path)
+        self._routes: Sequence = ()
+        self._template = lru_cache(maxsize=4096)(self._match_template)
+
+    def _match_template(self, method: str, path: str, root_path: str) -> str:
+        scope = {"type": "http", "method": method, "path": path, "root_path": root_path}
+        for route in self._routes:
+            match, _ = route.matches(scope)
+            if match == Match.FULL:
+                return getattr(route, "path", None) or "unmatched"
+        return "unmatched"
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        method = scope["method"]
+        if not self._routes:
+            self._routes = getattr(getattr(scope.get("app"), "router", None), "routes", ())
+        template = self._template(method, scope["path"], scope.get("root_path", ""))
+        status = 500
+        start = time.perf_counter()
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        self.in_flight.inc((template, method))
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            self.in_flight.inc((template, method), -1)
+            # The router stores the matched route in the scope
+            route = scope.get("route")
+            path = getattr(route, "path", None) or "unmatched"
+            self.latency.observe((path, method), time.perf_counter() - start)
+            self.requests.inc((path, method, str(status)))
+
+
+class MongoCommandMetrics(monitoring.CommandListener):
+    """pymongo command listener; pass it to the client via ``event_listeners``."""
+
+    def __init__(self, registry: Registry):
+        self.latency = registry.histogram(
+            "mongo_command_duration_seconds", "MongoDB command latency", ("collection", "command")
+        )
+        self.documents = registry.histogram(
+            "mongo_command_documents", "Documents returned or affected per command",
+            ("collection", "command"), buckets=DOCUMENT_BUCKETS,
+        )
+        self.failures = registry.counter(
+            "mongo_command_failures_total", "Failed MongoDB commands", ("collection", "command")
+        )
+        self._pending: Dict[Tuple, Tuple[str, str]] = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _collection(event) -> str:
+        value = event.command.get(event.command_name)
+        if isinstance(value, str):
+            return value
+        # getMore carries the cursor id under its own name
+        return str(event.command.get("collection", "-"))
+
+    def started(self, event):
+        with self._lock:
+            self._pending[(event.connection_id, event.request_id)] = (self._collection(event), event.command_name)
+
+    def _finish(self, event) -> Optional[Tuple[str, str]]:
+        with self._lock:
+            return self._pending.pop((event.connection_id, event.request_id), None)
+
+    def succeeded(self, event):
+        labels = self._finish(event)
+        if labels is None:
+            return
+        self.latency.observe(labels, event.duration_micros / 1e6)
+        reply = event.reply
+        cursor = reply.get("cursor")
+        if cursor is not None:
+            count = len(cursor.get("firstBatch", cursor.get("nextBatch", ())))
+        else:
+            count = reply.get("n", 0)
+        self.documents.observe(labels, count)
+
+    def failed(self, event):
+        labels = self._finish(event)
+        if labels is None:
+            return
+        self.latency.observe(labels, event.duration_micros / 1e6)
+        self.failures.inc(labels)
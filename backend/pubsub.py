@@ -0,0 +1,111 @@
+# pubsub.py
+"""In-process topic pub/sub for pushing live updates to WebSocket clients.
+
+Topics are plain strings such as ``seller:<id>``, ``product:<id>`` or
+``order:<id>``. ``publish`` never blocks: each subscriber has a bounded
+queue. When a slow client's queue is full, its oldest pending event is
+dropped to make room. A client that keeps overflowing (``max_drops`` events
+in a row without catching up) is marked closed, and its connection handler
+disconnects it. A stuck socket therefore costs one bounded queue, never the
+publisher's time.
+
+The bus is per worker process; with several workers the server feeds it
+from a MongoDB change stream instead (see ``WS_CHANGE_STREAM``).
+"""
+import asyncio
+import time
+from typing import Dict, Iterable, Optional, Set
+
+
+class Subscriber:
+    def __init__(self, queue_size: int = 100, max_drops: int = 50, user_id: Optional[str] = None):
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=queue_size)
+        self.topics: Set[str] = set()
+        self.max_drops = max_drops
+        self.user_id = user_id
+        self.dropped = 0
+        self._drop_streak = 0
+        self.closed = asyncio.Event()
+
+    def offer(self, message: dict) -> bool:
+        """Queue ``message``; on overflow drop the oldest one. False if this client is too slow."""
+        if self.closed.is_set():
+            return False
+        try:
+            self.queue.put_nowait(message)
+            self._drop_streak = 0
+            return True
+        except asyncio.QueueFull:
+            pass
+        try:
+            self.queue.get_nowait()
+        except asyncio.QueueEmpty:
+            pass
+        self.queue.put_nowait(message)
+        self.dropped += 1
+        self._drop_streak += 1
+        if self._drop_streak >= self.max_drops:
+            self.closed.set()
+            return False
+        return True
+
+
+class PubSub:
+    def __init__(self):
+        self._topics: Dict[str, Set[Subscriber]] = {}
+        self.connections = 0
+        self.published = 0
+        self.delivered = 0
+        self.dropped = 0
+        self.slow_disconnects = 0
+
+    def connect(self, subscriber: Subscriber):
+        self.connections += 1
+
+    def disconnect(self, subscriber: Subscriber):
+        self.connections -= 1
+        for topic in list(subscriber.topics):
+            self.unsubscribe(subscriber, topic)
+        if subscriber.closed.is_set():
+            self.slow_disconnects += 1
+
+    def subscribe(self, subscriber: Subscriber, topic: str):
+        self._topics.setdefault(topic, set()).add(subscriber)
+        subscriber.topics.add(topic)
+
+    def unsubscribe(self, subscriber: Subscriber, topic: str):
+        subscriber.topics.discard(topic)
+        subscribers = self._topics.get(topic)
+        if subscribers is not None:
+            subscribers.discard(subscriber)
+            if not subscribers:
+                del self._topics[topic]
+
+    def publish(self, topic: str, event_type: str, data: dict) -> int:
+        """Fan ``data`` out to the topic's subscribers; returns how many got it."""
+        self.published += 1
+        subscribers = self._topics.get(topic)
+        if not subscribers:
+            return 0
+        message = {"topic": topic, "type": event_type, "data": data, "ts": time.time()}
+        sent = 0
+        for subscriber in list(subscribers):
+            dropped = subscriber.dropped
+            if subscriber.offer(message):
+                sent += 1
+            self.dropped += subscriber.dropped - dropped
+        self.delivered += sent
+        return sent
+
+    def publish_many(self, events: Iterable[tuple]) -> int:
+        return sum(self.publish(topic, event_type, data) for topic, event_type, data in events)
+
+    def stats(self) -> dict:
+        return {
+            "connections": self.connections,
+            "topics": len(self._topics),
+            "published": self.published,
+            "delivered": self.delivered,
+            "dropped": self.dropped,
+            "slow_disconnects": self.slow_disconnects,
+        }
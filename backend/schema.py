@@ -0,0 +1,190 @@
+# schema.py
+"""Versioned document schemas for products, carts and orders.
+
+Every document in these collections carries ``schema_version``. The server
+coerces numeric fields when it writes (``normalize_*``), so read paths
+return what Mongo holds without converting each item, and range queries on
+``price`` or ``stock`` see real numbers. New documents are stamped with the
+current version on insert. Documents written before versioning, for example
+with prices stored as strings, are upgraded in place by ``migrate``:
+
+    python manage.py migrate-schema
+
+A migration pages through outdated documents in ``_id`` order and rewrites
+each batch with one unordered ``bulk_write``. Each update is conditional on
+the values it read, so a concurrent write wins and that document is simply
+picked up by the next run. Upgraded documents leave the outdated set, so an
+interrupted run resumes where it stopped when started again.
+"""
+import logging
+import math
+import time
+from typing import Callable, Dict, Optional
+
+from pymongo import UpdateOne
+
+logger = logging.getLogger("schema")
+
+SCHEMA_VERSIONS = {"products": 1, "cart": 1, "orders": 1}
+
+PRODUCT_FLOATS = ("price", "rating")
+PRODUCT_INTS = ("stock", "review_count")
+ORDER_ITEM_FLOATS = ("price", "total")
+
+
+def to_float(value, default: float = 0.0) -> float:
+    try:
+        number = float(value)
+    except (TypeError, ValueError):
+        return default
+    return number if math.isfinite(number) else default
+
+
+def to_int(value, default: int = 0) -> int:
+    if isinstance(value, int) and not isinstance(value, bool):
+        return value
+    number = to_float(value, None)
+    return default if number is None else int(number)
+
+
+def version_stamp(collection: str) -> dict:
+    return {"schema_version": SCHEMA_VERSIONS[collection]}
+
+
+def is_current(collection: str, doc: dict) -> bool:
+    version = doc.get("schema_version")
+    return isinstance(version, int) and version >= SCHEMA_VERSIONS[collection]
+
+
+# ---- write-time normalization ----
+def normalize_product(doc: dict) -> dict:
+    """Coerce the numeric fields present in a product document or ``$set`` (in place).
+
+    A value that is not a number (``"oops"``) is logged and dropped rather
+    than written as 0; missing (``None``) values still become 0.
+    """
+    doc.pop("schema_version", None)  # owned by the server, never by the payload
+    for fields, convert in ((PRODUCT_FLOATS, to_float), (PRODUCT_INTS, to_int)):
+        for field in fields:
+            if field not in doc:
+                continue
+            value = convert(doc[field], None)
+            if value is None and doc[field] is not None:
+                logger.warning(f"Dropping non-numeric product {field} {doc[field]!r} (id {doc.get('id', 'not given')})")
+                del doc[field]
+            else:
+                doc[field] = convert(doc[field])
+    return doc
+
+
+def normalize_cart_items(items) -> list:
+    if not isinstance(items, list):
+        return []
+    return [
+        {**it, "product_id": str(it["product_id"]), "quantity": to_int(it.get("quantity"), 1)}
+        for it in items
+        if isinstance(it, dict) and it.get("product_id")
+    ]
+
+
+def normalize_order(order: dict) -> dict:
+    """Coerce an order's amounts and quantities and stamp the current version (in place)."""
+    order["items"] = [
+        {
+            **it,
+            "quantity": to_int(it.get("quantity")),
+            **{field: to_float(it.get(field)) for field in ORDER_ITEM_FLOATS},
+        }
+        for it in order.get("items") or []
+        if isinstance(it, dict)
+    ]
+    order["total_amount"] = to_float(order.get("total_amount"))
+    order.update(version_stamp("orders"))
+    return order
+
+
+# ---- upgrades of stored documents ----
+def upgrade_product(doc: dict) -> dict:
+    doc = normalize_product(dict(doc))
+    for field in PRODUCT_FLOATS:
+        doc.setdefault(field, 0.0)
+    for field in PRODUCT_INTS:
+        doc.setdefault(field, 0)
+    return doc
+
+
+def upgrade_cart(doc: dict) -> dict:
+    return {**doc, "items": normalize_cart_items(doc.get("items"))}
+
+
+def upgrade_order(doc: dict) -> dict:
+    return normalize_order(dict(doc))
+
+
+UPGRADES: Dict[str, Callable[[dict], dict]] = {
+    "products": upgrade_product,
+    "cart": upgrade_cart,
+    "orders": upgrade_order,
+}
+
+
+def outdated(collection: str) -> dict:
+    """Filter for documents below the current version (including unversioned ones)."""
+    return {"schema_version": {"$not": {"$gte": SCHEMA_VERSIONS[collection]}}}
+
+
+def upgrade_op(collection: str, doc: dict) -> UpdateOne:
+    """Conditional update bringing ``doc`` to the current version, guarded on the values it changes."""
+    new = UPGRADES[collection](doc)
+    new.update(version_stamp(collection))
+    changed = {k: v for k, v in new.items() if k not in doc or doc[k] != v or type(doc[k]) is not type(v)}
+    guard = {"_id": doc["_id"]}
+    for field in changed:
+        guard[field] = doc[field] if field in doc else {"$exists": False}
+    return UpdateOne(guard, {"$set": changed})
+
+
+async def upgrade_stored(db, collection: str, doc: dict) -> bool:
+    """Upgrade one stored document (read with its ``_id``) if it is outdated.
+
+    Conditional like ``migrate``: False if it was current or changed meanwhile.
+    """
+    if is_current(collection, doc):
+        return False
+    result = await db[collection].bulk_write([upgrade_op(collection, doc)])
+    return result.matched_count == 1
+
+
+async def migrate(db, collection: str, batch_size: int = 500, progress: Optional[Callable[[dict], None]] = None) -> dict:
+    """Upgrade every outdated document in ``collection``; returns the final counters.
+
+    ``progress`` is called after each batch with the same counters.
+    """
+    query = outdated(collection)
+    stats = {
+        "collection": collection,
+        "version": SCHEMA_VERSIONS[collection],
+        "outdated": await db[collection].count_documents(query),
+        "scanned": 0,
+        "upgraded": 0,
+        "skipped": 0,  # changed concurrently; left for the next run
+        "docs_per_s": 0.0,
+    }
+    start = time.perf_counter()
+    last_id = None
+    while True:
+        page = dict(query)
+        if last_id is not None:
+            page["_id"] = {"$gt": last_id}
+        docs = await db[collection].find(page).sort("_id", 1).limit(batch_size).to_list(batch_size)
+        if not docs:
+            break
+        last_id = docs[-1]["_id"]
+        result = await db[collection].bulk_write([upgrade_op(collection, d) for d in docs], ordered=False)
+        stats["scanned"] += len(docs)
+        stats["upgraded"] += result.matched_count
+        stats["skipped"] += len(docs) - result.matched_count
+        stats["docs_per_s"] = round(stats["scanned"] / max(time.perf_counter() - start, 1e-9), 1)
+        if progress:
+            progress(dict(stats))
+    return stats
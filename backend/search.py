@@ -0,0 +1,100 @@
+# search.py
+"""In-process product search index.
+
+Used by ``GET /products?search=`` when ``SEARCH_ENGINE=memory``, for
+deployments where a MongoDB text index is not available. Products are
+tokenized on lowercase alphanumeric runs; every query term matches as a
+prefix, and all terms must match (AND). Matches in the name weigh more than
+matches in the description.
+"""
+import bisect
+import re
+from typing import Dict, List, Optional
+
+TOKEN_RE = re.compile(r"[a-z0-9]+")
+
+FIELD_WEIGHTS = {"name": 3.0, "description": 1.0}
+
+
+def tokenize(text) -> List[str]:
+    return TOKEN_RE.findall(str(text or "").lower())
+
+
+class InvertedIndex:
+    def __init__(self, fields: Optional[Dict[str, float]] = None):
+        self.fields = fields or FIELD_WEIGHTS
+        self._postings: Dict[str, Dict[str, float]] = {}  # token -> {doc id: weight}
+        self._docs: Dict[str, List[str]] = {}             # doc id -> its tokens
+        self._vocab: List[str] = []                       # sorted tokens, for prefix scans
+
+    def __len__(self):
+        return len(self._docs)
+
+    def clear(self):
+        self._postings = {}
+        self._docs = {}
+        self._vocab = []
+
+    def add(self, doc_id: str, doc: dict):
+        """Index ``doc`` under ``doc_id``, replacing any previous version."""
+        self.remove(doc_id)
+        weights: Dict[str, float] = {}
+        for field, weight in self.fields.items():
+            for token in tokenize(doc.get(field)):
+                weights[token] = weights.get(token, 0) + weight
+        if not weights:
+            return
+        for token, weight in weights.items():
+            postings = self._postings.get(token)
+            if postings is None:
+                postings = self._postings[token] = {}
+                bisect.insort(self._vocab, token)
+            postings[doc_id] = weight
+        self._docs[doc_id] = list(weights)
+
+    def remove(self, doc_id: str):
+        for token in self._docs.pop(doc_id, ()):
+            postings = self._postings.get(token)
+            if postings is None:
+                continue
+            postings.pop(doc_id, None)
+            if not postings:
+                del self._postings[token]
+                pos = bisect.bisect_left(self._vocab, token)
+                if pos < len(self._vocab) and self._vocab[pos] == token:
+                    del self._vocab[pos]
+
+    def _expand(self, term: str) -> List[str]:
+        """All indexed tokens starting with ``term``."""
+        lo = bisect.bisect_left(self._vocab, term)
+        hi = bisect.bisect_left(self._vocab, term + "\uffff")
+        return self._vocab[lo:hi]
+
+    def search(self, query: str, limit: Optional[int] = None) -> List[str]:
+        """Return matching doc ids, best first."""
+        terms = tokenize(query)
+        if not terms:
+            return []
+
+        scores: Optional[Dict[str, float]] = None
+        # Rarest terms first keeps the running intersection small
+        for term in sorted(set(terms), key=lambda t: len(self._expand(t))):
+            term_scores: Dict[str, float] = {}
+            for token in self._expand(term):
+                # Exact token matches outrank prefix-only matches
+                boost = 1.0 if token == term else 0.5
+                for doc_id, weight in self._postings[token].items():
+                    if scores is not None and doc_id not in scores:
+                        continue
+                    score = weight * boost
+                    if score > term_scores.get(doc_id, 0):
+                        term_scores[doc_id] = score
+            if scores is None:
+                scores = term_scores
+            else:
+                scores = {d: scores[d] + s for d, s in term_scores.items()}
+            if not scores:
+                return []
+
+        ranked = sorted(scores, key=lambda d: (-scores[d], d))
+        return ranked[:limit] if limit else ranked
@@ -1,15 +1,20 @@
 # server.py
-print("🔥 BACKEND LOADED FROM:", __file__)
-print("🔥 SERVER LOADED FROM:", __file__)
-print("🔥🔥🔥 THIS IS THE TOP OF THE REAL SERVER FILE:", __file__)
+import time
+from startup import ReadinessGate, StartupReport
 
-from fastapi import FastAPI, APIRouter, HTTPException, WebSocket, WebSocketDisconnect, Body, Query
+# Import and warm-up timings, served at /api/ready
+startup_report = StartupReport(started=time.perf_counter())
+
+from fastapi import FastAPI, APIRouter, HTTPException, WebSocket, WebSocketDisconnect, Body, Query, Depends, Request
+from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
-from pydantic import BaseModel, Field, EmailStr
+from fastapi.responses import JSONResponse, ORJSONResponse, StreamingResponse, PlainTextResponse
+from pydantic import BaseModel, ConfigDict, Field, EmailStr
 from typing import Optional, List, Dict, Any
 from datetime import datetime, timezone, timedelta
 from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import ReturnDocument, UpdateOne
+from pymongo.errors import BulkWriteError, DuplicateKeyError
 from dotenv import load_dotenv
 from pathlib import Path
 import bcrypt
@@ -17,18 +22,26 @@ import jwt
 import uuid
 import logging
 import os
-import certifi
 import re
 import json
-import pyotp
-import aiosmtplib
-from email.mime.text import MIMEText
-from email.mime.multipart import MIMEMultipart
-from google.oauth2 import id_token
-from google.auth.transport import requests as google_requests
+import orjson
 import hmac
 import hashlib
 import math
+import bisect
+import base64
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from search import InvertedIndex
+from cache import TTLCache
+from mailer import MailDispatcher
+from applog import configure_logging, get_logger, stop_logging
+from metrics import MetricsMiddleware, MongoCommandMetrics, Registry, stats_gauges
+from pubsub import PubSub, Subscriber
+import catalog
+from indexes import create_indexes, missing_required
+from schema import normalize_order, normalize_product, to_float, to_int, upgrade_stored, version_stamp
+from idtoken import GOOGLE_CERTS_URL, GoogleTokenVerifier, JWKSCache
 
 # ================= CONFIG =====================
 ROOT_DIR = Path(__file__).parent
@@ -40,20 +53,89 @@ SECRET_KEY = os.getenv("JWT_SECRET", "secret")
 ALGO = "HS256"
 TOKEN_EXP = 60 * 24 * 7  # minutes
 
+# Password hashing: bcrypt cost and size of the worker pool it runs on
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", "12"))
+PASSWORD_POOL_SIZE = int(os.getenv("PASSWORD_POOL_SIZE", "4"))
+
+# Product listing page sizes
+PRODUCTS_PAGE_DEFAULT = int(os.getenv("PRODUCTS_PAGE_DEFAULT", "50"))
+PRODUCTS_PAGE_MAX = int(os.getenv("PRODUCTS_PAGE_MAX", "1000"))
+
+# Product search backend: "text" (MongoDB text index), "memory" (in-process
+# inverted index, see search.py) or "regex" (legacy unanchored $regex scan)
+SEARCH_ENGINE = os.getenv("SEARCH_ENGINE", "text").lower()
+SEARCH_MAX_CANDIDATES = int(os.getenv("SEARCH_MAX_CANDIDATES", "5000"))
+# Seconds between rebuilds of the per-worker memory search index, so products
+# written through another worker become searchable (0 disables)
+SEARCH_INDEX_TTL = float(os.getenv("SEARCH_INDEX_TTL", "60"))
+
+# Read-through product cache (per worker; TTL bounds cross-worker staleness)
+PRODUCT_CACHE_SIZE = int(os.getenv("PRODUCT_CACHE_SIZE", "10000"))
+PRODUCT_CACHE_TTL = float(os.getenv("PRODUCT_CACHE_TTL", "30"))
+
+# Seconds between rebuilds of the per-worker retailer pincode index, so
+# retailers registered or moved through another worker show up (0 disables)
+RETAILER_INDEX_TTL = float(os.getenv("RETAILER_INDEX_TTL", "60"))
+
+# Verified-token and user-document caches behind the auth dependencies
+TOKEN_CACHE_SIZE = int(os.getenv("TOKEN_CACHE_SIZE", "10000"))
+USER_CACHE_SIZE = int(os.getenv("USER_CACHE_SIZE", "10000"))
+USER_CACHE_TTL = float(os.getenv("USER_CACHE_TTL", "30"))
+
+# Live updates over /ws: per-client send queue, topic cap, and whether events
+# come from a MongoDB change stream (needed with more than one worker)
+WS_QUEUE_SIZE = int(os.getenv("WS_QUEUE_SIZE", "100"))
+WS_MAX_TOPICS = int(os.getenv("WS_MAX_TOPICS", "100"))
+WS_CHANGE_STREAM = os.getenv("WS_CHANGE_STREAM", "false").lower() in ("1", "true", "yes")
+
+# Bulk catalog import: rows per bulk_write, and how many row errors to report
+IMPORT_BATCH_SIZE = int(os.getenv("IMPORT_BATCH_SIZE", "1000"))
+IMPORT_MAX_ERRORS = int(os.getenv("IMPORT_MAX_ERRORS", "1000"))
+
 # OTP & OAuth Config
 SMTP_HOST = os.getenv("SMTP_HOST", "smtp.gmail.com")
 SMTP_PORT = int(os.getenv("SMTP_PORT", "587"))
 SMTP_USER = os.getenv("SMTP_USER", "")
 SMTP_PASSWORD = os.getenv("SMTP_PASSWORD", "")
+SMTP_START_TLS = os.getenv("SMTP_START_TLS", "true").lower() in ("1", "true", "yes")
+SMTP_POOL_SIZE = int(os.getenv("SMTP_POOL_SIZE", "2"))
+SMTP_BATCH_SIZE = int(os.getenv("SMTP_BATCH_SIZE", "20"))
+SMTP_MAX_RETRIES = int(os.getenv("SMTP_MAX_RETRIES", "3"))
+OTP_RATE_LIMIT = int(os.getenv("OTP_RATE_LIMIT", "3"))  # OTP emails per address...
+OTP_RATE_WINDOW = int(os.getenv("OTP_RATE_WINDOW", "300"))  # ...per this many seconds
 OTP_EXPIRY_MINUTES = int(os.getenv("OTP_EXPIRY_MINUTES", "5"))
 
 GOOGLE_CLIENT_ID = os.getenv("GOOGLE_CLIENT_ID", "")
 GOOGLE_CLIENT_SECRET = os.getenv("GOOGLE_CLIENT_SECRET", "")
+GOOGLE_CERTS_URL = os.getenv("GOOGLE_CERTS_URL", GOOGLE_CERTS_URL)
+
+# Records go through a queue to a listener thread (see applog.py)
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO")
+LOG_FORMAT = os.getenv("LOG_FORMAT", "text").lower()  # "text" or "json"
+# Fraction of request-payload debug events kept when LOG_LEVEL=DEBUG
+LOG_PAYLOAD_SAMPLE = float(os.getenv("LOG_PAYLOAD_SAMPLE", "0.01"))
 
-logging.basicConfig(level=logging.INFO)
+# How long a request arriving during warm-up waits for it before a 503
+STARTUP_GATE_TIMEOUT = float(os.getenv("STARTUP_GATE_TIMEOUT", "10"))
+# Backoff between retries of failed warm-up steps: first delay and cap, seconds
+WARMUP_RETRY_DELAY = float(os.getenv("WARMUP_RETRY_DELAY", "1"))
+WARMUP_RETRY_MAX = float(os.getenv("WARMUP_RETRY_MAX", "30"))
+
+configure_logging(LOG_LEVEL, json_lines=LOG_FORMAT == "json")
 logger = logging.getLogger("server")
+log = get_logger("server")
 
-app = FastAPI(title="LiveMART API (Full)")
+# Routes without an explicit response class serialize with orjson; hot list
+# routes go further and return ORJSONResponse themselves (see MODELS)
+app = FastAPI(title="LiveMART API (Full)", default_response_class=ORJSONResponse)
+
+# Hold requests until warm-up finishes (see startup.py); probes answer at once
+app.add_middleware(
+    ReadinessGate,
+    report=startup_report,
+    exempt=("/api/health", "/api/ready", "/api/metrics"),
+    timeout=STARTUP_GATE_TIMEOUT,
+)
 
 # ================= IMPROVED CORS CONFIGURATION =====================
 app.add_middleware(
@@ -62,38 +144,105 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor"],
 )
 
+# Per-route and per-Mongo-command metrics, scraped from /api/metrics
+metrics_registry = Registry()
+mongo_metrics = MongoCommandMetrics(metrics_registry)
+app.add_middleware(MetricsMiddleware, registry=metrics_registry)
+
 api = APIRouter(prefix="/api")
 
 client = None
 db = None
 
 # =============== DB CONNECT =================
-@app.on_event("startup")
-async def connect_db():
+def open_db(url: Optional[str] = None, db_name: Optional[str] = None, tls: bool = True):
+    """Create the Motor client and bind the module-level ``db`` handle.
+
+    Defaults to MONGO_URL / DB_NAME over TLS; the benchmark tools pass a local
+    server instead.
+    """
     global client, db
-    if not MONGO_URL:
+    url = url or MONGO_URL
+    if not url:
         logger.error("MONGO_URL not set in environment (.env)")
         raise RuntimeError("MONGO_URL not configured")
 
-    client = AsyncIOMotorClient(MONGO_URL, tls=True, tlsCAFILE=certifi.where())
-    db = client[DB_NAME]
+    tls_options = {}
+    if tls:
+        import certifi  # only needed for TLS connections
+
+        tls_options = {"tls": True, "tlsCAFILE": certifi.where()}
+    client = AsyncIOMotorClient(url, event_listeners=[mongo_metrics], **tls_options)
+    db = client[db_name or DB_NAME]
+    return db
+
+async def ensure_indexes():
+    """Create every index declared in indexes.py (concurrently; failures are logged).
+
+    Raises if the database cannot be reached or a required index is missing,
+    so warm-up retries the step and the server stays unready.
+    """
+    await db.command("ping")
+    failed = [label for label, error in (await create_indexes(db)).items() if error]
+    if failed:
+        logger.warning(f"{len(failed)} indexes not created: {', '.join(failed)}")
+    missing = await missing_required(db)
+    if missing:
+        raise RuntimeError(f"required indexes missing: {', '.join(missing)}")
+
+async def warm_up():
+    """Startup work that runs concurrently in the background; the server is ready when it is done.
+
+    Failed steps are retried with backoff until they succeed.
+    """
+    await startup_report.run(
+        {
+            "indexes": ensure_indexes,
+            "retailer_index": load_retailer_index,
+            "search_index": load_search_index,
+        },
+        retry_delay=WARMUP_RETRY_DELAY,
+        max_retry_delay=WARMUP_RETRY_MAX,
+    )
+    log.info("startup.ready", **startup_report.as_dict())
+
+@app.on_event("startup")
+async def connect_db():
+    if db is None:
+        open_db()
 
     logger.info("MongoDB connected")
 
-    try:
-        # create indexes used in your app
-        await db.products.create_index("id", unique=True)
-        await db.categories.create_index("id", unique=True)
-        await db.users.create_index("email", unique=True)
-        await db.orders.create_index("id", unique=True)
-        await db.transactions.create_index("id", unique=True)
-        await db.cart.create_index("user_id", unique=True)
-        await db.purchases.create_index("id", unique=True)
-        await db.feedback.create_index("id", unique=True)
-    except Exception:
-        logger.exception("Index creation skipped or failed (non-fatal)")
+    startup_report.begin()
+    run_in_background(warm_up())
+
+    if SMTP_USER and SMTP_PASSWORD:
+        await mailer.start()
+
+    if GOOGLE_CLIENT_ID:
+        # Warm the key cache so the first Google login does not wait on it
+        run_in_background(warm_google_keys())
+
+    if WS_CHANGE_STREAM:
+        run_in_background(watch_changes())
+
+    if RETAILER_INDEX_TTL > 0:
+        run_in_background(refresh_retailer_index())
+
+    if SEARCH_ENGINE == "memory" and SEARCH_INDEX_TTL > 0:
+        run_in_background(refresh_search_index())
+
+@app.on_event("shutdown")
+async def close_db():
+    for task in list(_background_tasks):
+        task.cancel()
+    await mailer.stop()
+    if client is not None:
+        client.close()
+    stop_logging()
 
 # ================= MODELS ==========================
 class User(BaseModel):
@@ -130,12 +279,122 @@ class OTPVerify(BaseModel):
 class GoogleAuthRequest(BaseModel):
     token: str  # Google ID token
 
+# Response shapes for the hot read routes. They document the API; the routes
+# return ORJSONResponse directly, which skips FastAPI's response validation and
+# jsonable_encoder pass. Numbers are coerced when documents are written, so
+# what Mongo returns already matches these types.
+class ProductOut(BaseModel):
+    model_config = ConfigDict(extra="allow")
+
+    id: str
+    name: str
+    price: float
+    stock: int
+    rating: float = 0
+    review_count: int = 0
+    seller_id: Optional[str] = None
+    category_id: Optional[str] = None
+    description: Optional[str] = None
+    image_url: Optional[str] = None
+    unit: Optional[str] = None
+    original_wh_product_id: Optional[str] = None
+
+class OrderItemOut(BaseModel):
+    model_config = ConfigDict(extra="allow")
+
+    product_id: str
+    product_name: str
+    quantity: int
+    price: float
+    total: float
+    seller_id: Optional[str] = None
+
+class OrderOut(BaseModel):
+    model_config = ConfigDict(extra="allow")
+
+    id: str
+    user_id: str
+    items: List[OrderItemOut]
+    total_amount: float
+    delivery_address: Optional[str] = None
+    payment_method: Optional[str] = None
+    payment_status: Optional[str] = None
+    order_status: Optional[str] = None
+    created_at: Optional[str] = None
+
+class FeedbackOut(BaseModel):
+    model_config = ConfigDict(extra="allow")
+
+    id: str
+    user_id: str
+    user_name: Optional[str] = None
+    product_id: str
+    rating: int
+    comment: str = ""
+    created_at: Optional[str] = None
+
 # ================ HELPERS ===========================
-def hash_pw(pwd: str) -> str:
-    return bcrypt.hashpw(pwd.encode(), bcrypt.gensalt()).decode()
+# bcrypt takes hundreds of ms of CPU per call; it runs on a bounded thread pool
+# (bcrypt releases the GIL) so the event loop keeps serving other requests.
+_pw_pool = ThreadPoolExecutor(max_workers=PASSWORD_POOL_SIZE, thread_name_prefix="bcrypt")
+_pw_stats = {"in_flight": 0, "max_in_flight": 0, "completed": 0}
+_background_tasks = set()
+
+async def _run_pw(fn, *args):
+    _pw_stats["in_flight"] += 1
+    _pw_stats["max_in_flight"] = max(_pw_stats["max_in_flight"], _pw_stats["in_flight"])
+    try:
+        return await asyncio.get_running_loop().run_in_executor(_pw_pool, fn, *args)
+    finally:
+        _pw_stats["in_flight"] -= 1
+        _pw_stats["completed"] += 1
+
+def password_pool_stats() -> dict:
+    return {
+        **_pw_stats,
+        "workers": PASSWORD_POOL_SIZE,
+        "queue_depth": max(0, _pw_stats["in_flight"] - PASSWORD_POOL_SIZE),
+        "rounds": BCRYPT_ROUNDS,
+    }
+
+def _hash_pw_sync(pwd: str) -> str:
+    return bcrypt.hashpw(pwd.encode(), bcrypt.gensalt(rounds=BCRYPT_ROUNDS)).decode()
 
-def verify_pw(pwd: str, hashed: str) -> bool:
-    return bcrypt.checkpw(pwd.encode(), hashed.encode())
+def _verify_pw_sync(pwd: str, hashed: str) -> bool:
+    try:
+        return bcrypt.checkpw(pwd.encode(), hashed.encode())
+    except ValueError:
+        # not a bcrypt hash
+        return False
+
+async def hash_pw(pwd: str) -> str:
+    return await _run_pw(_hash_pw_sync, pwd)
+
+async def verify_pw(pwd: str, hashed: str) -> bool:
+    return await _run_pw(_verify_pw_sync, pwd, hashed)
+
+def needs_rehash(hashed: str) -> bool:
+    """True if ``hashed`` was made with a different cost than BCRYPT_ROUNDS."""
+    try:
+        return int(hashed.split("$")[2]) != BCRYPT_ROUNDS
+    except (IndexError, ValueError, AttributeError):
+        return False
+
+def run_in_background(coro):
+    """Fire-and-forget ``coro``, keeping a reference until it finishes."""
+    task = asyncio.create_task(coro)
+    _background_tasks.add(task)
+    task.add_done_callback(_background_tasks.discard)
+    return task
+
+async def rehash_password(user_id: str, pwd: str, old_hash: str):
+    """Upgrade a stored hash to the configured cost after a successful login."""
+    try:
+        new_hash = await hash_pw(pwd)
+        # Only replace the hash we verified; a concurrent password change wins
+        await db.users.update_one({"id": user_id, "password": old_hash}, {"$set": {"password": new_hash}})
+    except Exception as e:
+        logger.error(f"Password rehash failed for {user_id}: {e}")
 
 def create_token(data: dict) -> str:
     payload = data.copy()
@@ -157,61 +416,103 @@ def safe_int(x, default=0):
 def regex_icase(s: str):
     return {"$regex": re.escape(s), "$options": "i"}
 
+def encode_cursor(last_id: str) -> str:
+    """Opaque keyset cursor pointing just past ``last_id``."""
+    raw = json.dumps({"id": last_id}, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+def decode_cursor(cursor: str) -> str:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        return str(json.loads(raw)["id"])
+    except Exception:
+        raise HTTPException(400, "Invalid cursor")
+
+def normalize_id(s) -> str:
+    """Canonical form for ids that used to be compared case-insensitively."""
+    return str(s or "").strip().lower()
+
+def iso_utc(dt: datetime) -> str:
+    """ISO string comparable with the ``created_at`` values we store."""
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=timezone.utc)
+    return dt.astimezone(timezone.utc).isoformat()
+
 # OTP Helper Functions
 def generate_otp() -> str:
     """Generate a 6-digit OTP"""
+    import pyotp
+
     return pyotp.random_base32()[:6].upper()
 
-async def send_otp_email(email: str, otp: str):
-    """Send OTP via email"""
+# OTP emails go out through a few long-lived SMTP sessions in the background,
+# so /auth/otp/send returns as soon as the OTP is stored
+mailer = MailDispatcher(
+    SMTP_HOST,
+    SMTP_PORT,
+    username=SMTP_USER,
+    password=SMTP_PASSWORD,
+    start_tls=SMTP_START_TLS,
+    pool_size=SMTP_POOL_SIZE,
+    batch_size=SMTP_BATCH_SIZE,
+    max_retries=SMTP_MAX_RETRIES,
+    rate_limit=OTP_RATE_LIMIT,
+    rate_window=OTP_RATE_WINDOW,
+)
+
+def build_otp_message(email: str, otp: str):
+    # The MIME package is only loaded once the first OTP email goes out
+    from email.mime.multipart import MIMEMultipart
+    from email.mime.text import MIMEText
+
+    message = MIMEMultipart()
+    message["From"] = SMTP_USER
+    message["To"] = email
+    message["Subject"] = "Your LiveMART OTP Code"
+
+    body = f"""
+    <html>
+        <body>
+            <h2>LiveMART Verification</h2>
+            <p>Your OTP code is: <strong style="font-size: 24px; color: #7C3AED;">{otp}</strong></p>
+            <p>This code will expire in {OTP_EXPIRY_MINUTES} minutes.</p>
+            <p>If you didn't request this code, please ignore this email.</p>
+        </body>
+    </html>
+    """
+    message.attach(MIMEText(body, "html"))
+    return message
+
+def send_otp_email(email: str, otp: str):
+    """Queue the OTP email on the background mailer; never waits on SMTP."""
+    def log_fallback(error=None):
+        logger.info(f"📧 OTP for {email}: {otp}")  # Log OTP as fallback
+
     if not SMTP_USER or not SMTP_PASSWORD:
         logger.warning("SMTP not configured, OTP will only be logged")
-        logger.info(f"📧 OTP for {email}: {otp}")
+        log_fallback()
         return
-    
+
+    if not mailer.enqueue(email, build_otp_message(email, otp), on_failure=log_fallback):
+        logger.error("❌ Mail queue unavailable, OTP email not sent")
+        log_fallback()
+
+# Google's signing keys are cached per their Cache-Control header and
+# refreshed in the background; tokens are verified locally against them
+google_jwks = JWKSCache(GOOGLE_CERTS_URL)
+google_verifier = GoogleTokenVerifier(GOOGLE_CLIENT_ID, google_jwks)
+
+async def warm_google_keys():
     try:
-        message = MIMEMultipart()
-        message["From"] = SMTP_USER
-        message["To"] = email
-        message["Subject"] = "Your LiveMART OTP Code"
-        
-        body = f"""
-        <html>
-            <body>
-                <h2>LiveMART Verification</h2>
-                <p>Your OTP code is: <strong style="font-size: 24px; color: #7C3AED;">{otp}</strong></p>
-                <p>This code will expire in {OTP_EXPIRY_MINUTES} minutes.</p>
-                <p>If you didn't request this code, please ignore this email.</p>
-            </body>
-        </html>
-        """
-        message.attach(MIMEText(body, "html"))
-        
-        await aiosmtplib.send(
-            message,
-            hostname=SMTP_HOST,
-            port=SMTP_PORT,
-            username=SMTP_USER,
-            password=SMTP_PASSWORD,
-            start_tls=True,
-        )
-        logger.info(f"✅ OTP sent to {email}")
+        await google_jwks.refresh()
     except Exception as e:
-        logger.error(f"❌ Failed to send OTP email: {e}")
-        logger.info(f"📧 OTP for {email}: {otp}")  # Log OTP as fallback
+        logger.warning(f"Could not prefetch Google signing keys: {e}")
 
 async def verify_google_token(token: str) -> dict:
     """Verify Google ID token and return user info"""
     try:
-        idinfo = id_token.verify_oauth2_token(
-            token, 
-            google_requests.Request(), 
-            GOOGLE_CLIENT_ID
-        )
-        
-        if idinfo['iss'] not in ['accounts.google.com', 'https://accounts.google.com']:
-            raise ValueError('Wrong issuer.')
-        
+        idinfo = await google_verifier.verify(token)
+
         return {
             'email': idinfo['email'],
             'name': idinfo.get('name', ''),
@@ -222,6 +523,330 @@ async def verify_google_token(token: str) -> dict:
         logger.error(f"❌ Google token verification failed: {e}")
         raise HTTPException(status_code=401, detail="Invalid Google token")
 
+# ============== RETAILER LOCATION INDEX ==================
+class RetailerIndex:
+    """In-memory pincode -> retailer index used by every retailer-matching path.
+
+    Retailers are kept in a list of (numeric pincode, retailer id) tuples sorted
+    by pincode, so nearest / k-nearest lookups are a bisect plus a short walk
+    outwards instead of a scan over every retailer document. Exact matches are
+    resolved on the raw pincode string first, matching the old
+    ``find_one({"role": "retailer", "pincode": ...})`` behaviour.
+    """
+
+    def __init__(self):
+        self._sorted: List[tuple] = []          # [(pincode_int, retailer_id)]
+        self._exact: Dict[str, List[str]] = {}  # pincode string -> retailer ids
+        self._pincodes: Dict[str, str] = {}     # retailer id -> pincode string
+
+    def __len__(self):
+        return len(self._pincodes)
+
+    @classmethod
+    def from_rows(cls, rows) -> "RetailerIndex":
+        """Build an index from (retailer_id, pincode) pairs with a single sort.
+
+        ``add`` keeps the array sorted one insort at a time, which is quadratic
+        over a full load; later duplicates of an id win, as with ``add``.
+        """
+        index = cls()
+        for retailer_id, pincode in rows:
+            if retailer_id and pincode:
+                index._pincodes[retailer_id] = str(pincode)
+        for retailer_id, pincode in index._pincodes.items():
+            index._exact.setdefault(pincode, []).append(retailer_id)
+            key = cls._numeric(pincode)
+            if key is not None:
+                index._sorted.append((key, retailer_id))
+        index._sorted.sort()
+        return index
+
+    @staticmethod
+    def _numeric(pincode) -> Optional[int]:
+        try:
+            return int(pincode)
+        except (ValueError, TypeError):
+            return None
+
+    def clear(self):
+        self._sorted = []
+        self._exact = {}
+        self._pincodes = {}
+
+    def add(self, retailer_id: str, pincode: Optional[str]):
+        """Insert or move a retailer. A falsy pincode removes it from the index."""
+        self.remove(retailer_id)
+        if not retailer_id or not pincode:
+            return
+        pincode = str(pincode)
+        self._pincodes[retailer_id] = pincode
+        self._exact.setdefault(pincode, []).append(retailer_id)
+        key = self._numeric(pincode)
+        if key is not None:
+            bisect.insort(self._sorted, (key, retailer_id))
+
+    def remove(self, retailer_id: str):
+        pincode = self._pincodes.pop(retailer_id, None)
+        if pincode is None:
+            return
+        ids = self._exact.get(pincode, [])
+        if retailer_id in ids:
+            ids.remove(retailer_id)
+        if not ids:
+            self._exact.pop(pincode, None)
+        key = self._numeric(pincode)
+        if key is not None:
+            pos = bisect.bisect_left(self._sorted, (key, retailer_id))
+            if pos < len(self._sorted) and self._sorted[pos] == (key, retailer_id):
+                del self._sorted[pos]
+
+    def pincode_of(self, retailer_id: str) -> Optional[str]:
+        return self._pincodes.get(retailer_id)
+
+    def exact(self, pincode: str) -> List[str]:
+        """Ids of the retailers registered at exactly ``pincode``."""
+        return list(self._exact.get(str(pincode), []))
+
+    def nearest(self, pincode: str) -> Optional[str]:
+        """Return the id of the exact or closest retailer for ``pincode``."""
+        ids = self.k_nearest(pincode, 1)
+        return ids[0] if ids else None
+
+    def k_nearest(self, pincode: str, k: int) -> List[str]:
+        """Return up to ``k`` retailer ids ordered by pincode distance.
+
+        Exact string matches always come first; the remainder is filled by
+        walking outwards from the bisect position of the numeric pincode.
+        """
+        if k <= 0:
+            return []
+        pincode = str(pincode) if pincode is not None else ""
+        result = list(self._exact.get(pincode, []))[:k]
+        key = self._numeric(pincode)
+        if key is None or len(result) >= k:
+            return result
+
+        seen = set(result)
+        entries = self._sorted
+        lo = bisect.bisect_left(entries, (key, ""))
+        hi = lo
+        lo -= 1
+        while len(result) < k and (lo >= 0 or hi < len(entries)):
+            if hi >= len(entries) or (lo >= 0 and key - entries[lo][0] <= entries[hi][0] - key):
+                rid = entries[lo][1]
+                lo -= 1
+            else:
+                rid = entries[hi][1]
+                hi += 1
+            if rid not in seen:
+                seen.add(rid)
+                result.append(rid)
+        return result
+
+retailer_index = RetailerIndex()
+
+async def load_retailer_index():
+    """(Re)build the retailer index from the users collection.
+
+    The new index is filled on the side and swapped in, so lookups during a
+    rebuild keep using the previous one.
+    """
+    global retailer_index
+    cursor = db.users.find(
+        {"role": "retailer", "pincode": {"$exists": True, "$ne": None}},
+        {"_id": 0, "id": 1, "pincode": 1},
+    )
+    rows = [(r.get("id"), r.get("pincode")) async for r in cursor]
+    # The sort is CPU work; build on a thread so the loop keeps serving requests
+    retailer_index = await asyncio.to_thread(RetailerIndex.from_rows, rows)
+    logger.info(f"Retailer index built with {len(retailer_index)} retailers")
+
+async def refresh_retailer_index():
+    """Rebuild the index every RETAILER_INDEX_TTL seconds.
+
+    Writes in this worker update the index directly; the rebuild bounds how
+    long a retailer written through another worker stays invisible.
+    """
+    while True:
+        await asyncio.sleep(RETAILER_INDEX_TTL)
+        try:
+            await load_retailer_index()
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            logger.exception("Retailer index refresh failed; keeping the current one")
+
+def sync_retailer_index(user: dict):
+    """Keep the retailer index current after a user document changes."""
+    if user.get("role") == "retailer" and user.get("pincode"):
+        retailer_index.add(user["id"], user["pincode"])
+    else:
+        retailer_index.remove(user.get("id"))
+
+def match_retailer(pincode: str) -> Optional[dict]:
+    """Return ``{"id", "pincode", "match_type"}`` for the retailer closest to ``pincode``."""
+    retailer_id = retailer_index.nearest(pincode)
+    if not retailer_id:
+        return None
+    retailer_pincode = retailer_index.pincode_of(retailer_id)
+    return {
+        "id": retailer_id,
+        "pincode": retailer_pincode,
+        "match_type": "exact" if retailer_pincode == str(pincode) else "proximity",
+    }
+
+# ============== PRODUCT SEARCH INDEX =====================
+search_index = InvertedIndex()
+
+def build_search_index(docs: List[dict]) -> InvertedIndex:
+    index = InvertedIndex()
+    for p in docs:
+        index.add(p["id"], p)
+    return index
+
+async def load_search_index():
+    """(Re)build the in-process search index when SEARCH_ENGINE=memory.
+
+    Like the retailer index, the new index is built on the side and swapped in.
+    """
+    global search_index
+    if SEARCH_ENGINE != "memory":
+        return
+    docs = await db.products.find({}, {"_id": 0, "id": 1, "name": 1, "description": 1}).to_list(None)
+    search_index = await asyncio.to_thread(build_search_index, docs)
+    logger.info(f"Search index built with {len(search_index)} products")
+
+async def refresh_search_index():
+    """Rebuild the search index every SEARCH_INDEX_TTL seconds.
+
+    Writes in this worker update the index directly; the rebuild bounds how
+    long a product written through another worker stays unsearchable.
+    """
+    while True:
+        await asyncio.sleep(SEARCH_INDEX_TTL)
+        try:
+            await load_search_index()
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            logger.exception("Search index refresh failed; keeping the current one")
+
+def index_product(doc: dict):
+    if SEARCH_ENGINE == "memory" and doc and doc.get("id"):
+        search_index.add(doc["id"], doc)
+
+def unindex_product(pid: str):
+    if SEARCH_ENGINE == "memory":
+        search_index.remove(pid)
+
+def product_search_filter(search: str) -> dict:
+    """Query fragment for the text and regex engines."""
+    if SEARCH_ENGINE == "text":
+        return {"$text": {"$search": search}}
+    return {"$or": [
+        {"name": regex_icase(search)},
+        {"description": regex_icase(search)},
+    ]}
+
+# ============== PRODUCT CACHE =====================
+product_cache = TTLCache(maxsize=PRODUCT_CACHE_SIZE, ttl=PRODUCT_CACHE_TTL)
+
+async def get_cached_product(pid: str) -> Optional[dict]:
+    """Product document by id, served from the cache when possible. Returns a copy."""
+    doc = product_cache.get(pid)
+    if doc is None:
+        generation = product_cache.generation
+        doc = await db.products.find_one({"id": pid}, {"_id": 0})
+        if doc is None:
+            return None
+        product_cache.set(pid, doc, generation=generation)
+    return dict(doc)
+
+async def get_cached_products(ids: List[str]) -> Dict[str, dict]:
+    """Product documents for ``ids`` (missing ones omitted), one $in query for the misses."""
+    found: Dict[str, dict] = {}
+    misses = []
+    for pid in dict.fromkeys(ids):
+        doc = product_cache.get(pid)
+        if doc is None:
+            misses.append(pid)
+        else:
+            found[pid] = dict(doc)
+    if misses:
+        generation = product_cache.generation
+        async for doc in db.products.find({"id": {"$in": misses}}, {"_id": 0}):
+            product_cache.set(doc["id"], doc, generation=generation)
+            found[doc["id"]] = dict(doc)
+    return found
+
+def invalidate_products(*pids: str):
+    product_cache.invalidate(*pids)
+
+# ============== AUTH DEPENDENCIES =====================
+# Verified claims keyed by SHA-256 of the token, kept until the token expires,
+# so repeat requests skip the HMAC check and JSON decode
+token_cache = TTLCache(maxsize=TOKEN_CACHE_SIZE, ttl=TOKEN_EXP * 60)
+# User documents (without password) for the auth dependency and uid lookups
+user_cache = TTLCache(maxsize=USER_CACHE_SIZE, ttl=USER_CACHE_TTL)
+bearer_scheme = HTTPBearer(auto_error=False)
+
+def decode_token(token: str) -> dict:
+    key = hashlib.sha256(token.encode()).digest()
+    claims = token_cache.get(key)
+    if claims is None:
+        try:
+            claims = jwt.decode(token, SECRET_KEY, algorithms=[ALGO])
+        except jwt.InvalidTokenError:
+            raise HTTPException(401, "Invalid or expired token")
+        if "exp" in claims:
+            token_cache.set(key, claims, ttl=claims["exp"] - time.time())
+        else:
+            token_cache.set(key, claims)
+    return claims
+
+async def get_cached_user(uid: str) -> Optional[dict]:
+    """User document by id (password excluded), served from the cache when possible."""
+    user = user_cache.get(uid)
+    if user is None:
+        generation = user_cache.generation
+        user = await db.users.find_one({"id": uid}, {"_id": 0, "password": 0})
+        if user is None:
+            return None
+        user_cache.set(uid, user, generation=generation)
+    return dict(user)
+
+def invalidate_users(*uids: str):
+    user_cache.invalidate(*uids)
+
+async def optional_user(
+    credentials: Optional[HTTPAuthorizationCredentials] = Depends(bearer_scheme),
+) -> Optional[dict]:
+    """The bearer token's user, or None when the request carries no token."""
+    if credentials is None:
+        return None
+    claims = decode_token(credentials.credentials)
+    user = await get_cached_user(claims.get("user_id", ""))
+    if user is None:
+        raise HTTPException(401, "User no longer exists")
+    return user
+
+async def current_user(user: Optional[dict] = Depends(optional_user)) -> dict:
+    if user is None:
+        raise HTTPException(401, "Not authenticated", headers={"WWW-Authenticate": "Bearer"})
+    return user
+
+async def resolve_user(uid: str, auth_user: Optional[dict]) -> Optional[dict]:
+    """The user a ``{uid}`` route acts for.
+
+    With a bearer token the token's user must be ``uid``; requests without one
+    (older clients) fall back to a cached lookup by id.
+    """
+    if auth_user is not None:
+        if auth_user["id"] != uid:
+            raise HTTPException(403, "Token does not belong to this user")
+        return auth_user
+    return await get_cached_user(uid)
+
 # ================== AUTH ============================
 @api.post("/auth/register", response_model=Token)
 async def register(data: UserCreate):
@@ -229,40 +854,18 @@ async def register(data: UserCreate):
     if existing:
         raise HTTPException(status_code=400, detail="Email already registered")
 
-    hashed = hash_pw(data.password)
+    hashed = await hash_pw(data.password)
     user_dict = data.model_dump()
     user_dict.pop("password", None)
     
     # If user is a customer with pincode, find matching retailer
     if data.role == "customer" and data.pincode:
-        # First try exact pincode match
-        matching_retailer = await db.users.find_one({
-            "role": "retailer",
-            "pincode": data.pincode
-        })
-        
-        # If no exact match, find closest retailer by pincode proximity
-        if not matching_retailer:
-            all_retailers = await db.users.find(
-                {"role": "retailer", "pincode": {"$exists": True, "$ne": None}}
-            ).to_list(1000)
-            
-            if all_retailers:
-                def pincode_distance(pincode1: str, pincode2: str) -> float:
-                    try:
-                        return abs(int(pincode1) - int(pincode2))
-                    except (ValueError, TypeError):
-                        return float('inf')
-                
-                matching_retailer = min(
-                    all_retailers,
-                    key=lambda r: pincode_distance(data.pincode, r.get("pincode", ""))
-                )
+        # Exact pincode match first, otherwise closest retailer by proximity
+        matching_retailer = match_retailer(data.pincode)
         
         if matching_retailer:
             user_dict["preferred_retailer_id"] = matching_retailer["id"]
-            match_type = "exact" if matching_retailer.get("pincode") == data.pincode else "proximity"
-            logger.info(f"Matched customer to retailer {matching_retailer['id']} by {match_type} (pincode {data.pincode})")
+            logger.info(f"Matched customer to retailer {matching_retailer['id']} by {matching_retailer['match_type']} (pincode {data.pincode})")
     
     user = User(**user_dict)
 
@@ -270,6 +873,7 @@ async def register(data: UserCreate):
     doc["password"] = hashed
 
     await db.users.insert_one(doc)
+    sync_retailer_index(doc)
 
     token = create_token({"sub": user.email, "user_id": user.id})
     return Token(access_token=token, user=user)
@@ -277,36 +881,18 @@ async def register(data: UserCreate):
 @api.post("/auth/login", response_model=Token)
 async def login(data: UserLogin):
     user_doc = await db.users.find_one({"email": data.email})
-    if not user_doc or not verify_pw(data.password, user_doc.get("password", "")):
+    if not user_doc or not await verify_pw(data.password, user_doc.get("password", "")):
         raise HTTPException(status_code=401, detail="Invalid credentials")
 
-    user_doc.pop("password", None)
+    stored_hash = user_doc.pop("password", None)
+    # Transparently move the hash to the configured cost without delaying the response
+    if needs_rehash(stored_hash):
+        run_in_background(rehash_password(user_doc["id"], data.password, stored_hash))
     
     # Check if customer needs retailer matching based on pincode
     if user_doc.get("role") == "customer" and user_doc.get("pincode") and not user_doc.get("preferred_retailer_id"):
-        # First try exact pincode match
-        matching_retailer = await db.users.find_one({
-            "role": "retailer",
-            "pincode": user_doc.get("pincode")
-        })
-        
-        # If no exact match, find closest retailer
-        if not matching_retailer:
-            all_retailers = await db.users.find(
-                {"role": "retailer", "pincode": {"$exists": True, "$ne": None}}
-            ).to_list(1000)
-            
-            if all_retailers:
-                def pincode_distance(pincode1: str, pincode2: str) -> float:
-                    try:
-                        return abs(int(pincode1) - int(pincode2))
-                    except (ValueError, TypeError):
-                        return float('inf')
-                
-                matching_retailer = min(
-                    all_retailers,
-                    key=lambda r: pincode_distance(user_doc.get("pincode"), r.get("pincode", ""))
-                )
+        # Exact pincode match first, otherwise closest retailer by proximity
+        matching_retailer = match_retailer(user_doc.get("pincode"))
         
         if matching_retailer:
             user_doc["preferred_retailer_id"] = matching_retailer["id"]
@@ -314,14 +900,18 @@ async def login(data: UserLogin):
                 {"id": user_doc["id"]},
                 {"$set": {"preferred_retailer_id": matching_retailer["id"]}}
             )
-            match_type = "exact" if matching_retailer.get("pincode") == user_doc.get("pincode") else "proximity"
-            logger.info(f"Matched customer {user_doc['id']} to retailer {matching_retailer['id']} by {match_type}")
+            invalidate_users(user_doc["id"])
+            logger.info(f"Matched customer {user_doc['id']} to retailer {matching_retailer['id']} by {matching_retailer['match_type']}")
     
     user = User(**user_doc)
 
     token = create_token({"sub": user.email, "user_id": user.id})
     return Token(access_token=token, user=user)
 
+@api.get("/auth/me")
+async def auth_me(user: dict = Depends(current_user)):
+    return user
+
 # ================= OTP ENDPOINTS ====================
 @api.post("/auth/otp/send")
 async def send_otp(data: OTPRequest):
@@ -333,6 +923,9 @@ async def send_otp(data: OTPRequest):
         
         if data.purpose == "register" and user:
             raise HTTPException(status_code=400, detail="Email already registered")
+
+        if not mailer.allow(data.email):
+            raise HTTPException(status_code=429, detail="Too many OTP requests, please try again later")
         
         otp = generate_otp()
         expiry = datetime.now(timezone.utc) + timedelta(minutes=OTP_EXPIRY_MINUTES)
@@ -350,7 +943,7 @@ async def send_otp(data: OTPRequest):
             upsert=True
         )
         
-        await send_otp_email(data.email, otp)
+        send_otp_email(data.email, otp)
         
         return {
             "message": "OTP sent successfully",
@@ -425,29 +1018,8 @@ async def google_auth(data: GoogleAuthRequest):
             )
             
             if user_doc.get("role") == "customer" and user_doc.get("pincode") and not user_doc.get("preferred_retailer_id"):
-                # First try exact pincode match
-                matching_retailer = await db.users.find_one({
-                    "role": "retailer",
-                    "pincode": user_doc.get("pincode")
-                })
-                
-                # If no exact match, find closest retailer
-                if not matching_retailer:
-                    all_retailers = await db.users.find(
-                        {"role": "retailer", "pincode": {"$exists": True, "$ne": None}}
-                    ).to_list(1000)
-                    
-                    if all_retailers:
-                        def pincode_distance(pincode1: str, pincode2: str) -> float:
-                            try:
-                                return abs(int(pincode1) - int(pincode2))
-                            except (ValueError, TypeError):
-                                return float('inf')
-                        
-                        matching_retailer = min(
-                            all_retailers,
-                            key=lambda r: pincode_distance(user_doc.get("pincode"), r.get("pincode", ""))
-                        )
+                # Exact pincode match first, otherwise closest retailer by proximity
+                matching_retailer = match_retailer(user_doc.get("pincode"))
                 
                 if matching_retailer:
                     user_doc["preferred_retailer_id"] = matching_retailer["id"]
@@ -455,6 +1027,7 @@ async def google_auth(data: GoogleAuthRequest):
                         {"id": user_doc["id"]},
                         {"$set": {"preferred_retailer_id": matching_retailer["id"]}}
                     )
+                    invalidate_users(user_doc["id"])
             
             user = User(**user_doc)
             token = create_token({"sub": user.email, "user_id": user.id})
@@ -478,7 +1051,7 @@ async def google_auth(data: GoogleAuthRequest):
             
             user = User(**user_dict)
             doc = user.model_dump()
-            doc["password"] = hash_pw(str(uuid.uuid4()))
+            doc["password"] = await hash_pw(str(uuid.uuid4()))
             doc["google_id"] = google_user.get("google_id")
             doc["picture"] = google_user.get("picture")
             
@@ -520,74 +1093,38 @@ async def update_user_profile(user_id: str, data: UserProfileUpdate):
     if update_data.get("role") == "customer" or (user.get("role") == "customer" and data.pincode):
         pincode = data.pincode or user.get("pincode")
         if pincode:
-            # First try exact match
-            matching_retailer = await db.users.find_one({
-                "role": "retailer",
-                "pincode": pincode
-            })
-            
-            # If no exact match, find closest retailer
-            if not matching_retailer:
-                all_retailers = await db.users.find(
-                    {"role": "retailer", "pincode": {"$exists": True, "$ne": None}}
-                ).to_list(1000)
-                
-                if all_retailers:
-                    def pincode_distance(pincode1: str, pincode2: str) -> float:
-                        try:
-                            return abs(int(pincode1) - int(pincode2))
-                        except (ValueError, TypeError):
-                            return float('inf')
-                    
-                    matching_retailer = min(
-                        all_retailers,
-                        key=lambda r: pincode_distance(pincode, r.get("pincode", ""))
-                    )
+            # Exact pincode match first, otherwise closest retailer by proximity
+            matching_retailer = match_retailer(pincode)
             
             if matching_retailer:
                 update_data["preferred_retailer_id"] = matching_retailer["id"]
-                match_type = "exact" if matching_retailer.get("pincode") == pincode else "proximity"
-                logger.info(f"Matched customer to retailer {matching_retailer['id']} by {match_type} (pincode {pincode})")
+                logger.info(f"Matched customer to retailer {matching_retailer['id']} by {matching_retailer['match_type']} (pincode {pincode})")
     
     await db.users.update_one({"id": user_id}, {"$set": update_data})
+    invalidate_users(user_id)
     
     updated_user = await db.users.find_one({"id": user_id}, {"_id": 0, "password": 0})
+    # Role or pincode may have changed; keep the retailer index in step
+    if updated_user:
+        sync_retailer_index(updated_user)
     return updated_user
 
 @api.get("/retailers/by-pincode/{pincode}")
-async def get_retailers_by_pincode(pincode: str):
-    # First try exact match
-    exact_retailers = await db.users.find(
-        {"role": "retailer", "pincode": pincode},
-        {"_id": 0, "password": 0}
-    ).to_list(100)
-    
-    if exact_retailers:
-        return exact_retailers
+async def get_retailers_by_pincode(pincode: str, limit: int = Query(100, ge=1, le=1000)):
+    # Only the exact matches when there are any, otherwise the closest
+    # retailers by pincode proximity (numeric pincodes only), nearest first
+    retailer_ids = retailer_index.exact(pincode)[:limit] or retailer_index.k_nearest(pincode, limit)
+    if not retailer_ids:
+        return []
     
-    # If no exact match, get all retailers and sort by pincode proximity
-    all_retailers = await db.users.find(
-        {"role": "retailer", "pincode": {"$exists": True, "$ne": None}},
+    docs = await db.users.find(
+        {"id": {"$in": retailer_ids}, "role": "retailer"},
         {"_id": 0, "password": 0}
-    ).to_list(1000)
-    
-    # Calculate distance and sort
-    def pincode_distance(pincode1: str, pincode2: str) -> float:
-        """Calculate simple numeric distance between pincodes"""
-        try:
-            p1 = int(pincode1)
-            p2 = int(pincode2)
-            return abs(p1 - p2)
-        except (ValueError, TypeError):
-            return float('inf')
+    ).to_list(len(retailer_ids))
     
-    # Sort retailers by pincode proximity
-    sorted_retailers = sorted(
-        all_retailers,
-        key=lambda r: pincode_distance(pincode, r.get("pincode", ""))
-    )
-    
-    return sorted_retailers
+    # Restore proximity order lost by the $in query
+    by_id = {d["id"]: d for d in docs}
+    return [by_id[rid] for rid in retailer_ids if rid in by_id]
 
 @api.put("/users/{user_id}/preferred-retailer")
 async def update_preferred_retailer(user_id: str, payload: dict = Body(...)):
@@ -603,6 +1140,7 @@ async def update_preferred_retailer(user_id: str, payload: dict = Body(...)):
         {"id": user_id},
         {"$set": {"preferred_retailer_id": retailer_id}}
     )
+    invalidate_users(user_id)
     
     if result.matched_count == 0:
         raise HTTPException(404, "User not found")
@@ -610,28 +1148,74 @@ async def update_preferred_retailer(user_id: str, payload: dict = Body(...)):
     return {"message": "Preferred retailer updated", "retailer_id": retailer_id}
 
 # ============== HEALTH CHECK =========================
+def startup_status() -> str:
+    """Warm-up health: "healthy" once ready (or when no warm-up ran), "starting", or "degraded" while retrying."""
+    state = startup_report.state
+    if state in ("ready", "not_started"):
+        return "healthy"
+    return "degraded" if state == "retrying" else "starting"
+
 @api.get("/health")
 async def health_check():
     try:
         await db.command("ping")
         return {
-            "status": "healthy",
+            "status": startup_status(),
             "database": "connected",
+            "ready": startup_report.ready,
+            "password_pool": password_pool_stats(),
+            "mailer": mailer.stats(),
+            "google_keys": google_jwks.stats(),
+            "startup": startup_report.as_dict(),
             "timestamp": datetime.now(timezone.utc).isoformat()
         }
     except Exception as e:
         return {
             "status": "unhealthy",
             "database": "disconnected",
+            "ready": startup_report.ready,
             "error": str(e),
+            "startup": startup_report.as_dict(),
             "timestamp": datetime.now(timezone.utc).isoformat()
         }
 
+@api.get("/ready")
+async def readiness():
+    """200 once warm-up has finished, 503 before (or while failed steps are retried); body is the startup report."""
+    report = startup_report.as_dict()
+    return ORJSONResponse(report, status_code=200 if report["ready"] else 503)
+
+@api.get("/cache/stats")
+async def cache_stats():
+    return {
+        "products": product_cache.stats(),
+        "users": user_cache.stats(),
+        "tokens": token_cache.stats(),
+    }
+
+def collect_runtime_metrics():
+    yield from stats_gauges("livemart_cache", {
+        "products": product_cache.stats(),
+        "users": user_cache.stats(),
+        "tokens": token_cache.stats(),
+    }, "cache")
+    yield from stats_gauges("livemart_pool", {
+        "password": password_pool_stats(),
+        "mailer": mailer.stats(),
+    }, "pool")
+    yield from stats_gauges("livemart_google_keys", {"jwks": google_jwks.stats()}, "source")
+    yield from stats_gauges("livemart_ws", {"bus": bus.stats()}, "source")
+
+metrics_registry.add_collector(collect_runtime_metrics)
+
+@api.get("/metrics", response_class=PlainTextResponse)
+async def metrics():
+    return PlainTextResponse(metrics_registry.render(), media_type="text/plain; version=0.0.4")
+
 # ============== TEST CART ENDPOINT ==================
 @api.get("/test-cart/{uid}")
-async def test_cart(uid: str):
-    print(f"🧪 Testing cart for user: {uid}")
-    user = await db.users.find_one({"id": uid})
+async def test_cart(uid: str, auth_user: Optional[dict] = Depends(optional_user)):
+    user = await resolve_user(uid, auth_user)
     if not user:
         return {"error": "User not found", "user_id": uid}
     cart = await db.cart.find_one({"user_id": uid}) or {"user_id": uid, "items": []}
@@ -656,10 +1240,9 @@ async def options_feedback(uid: str):
     )
 
 @api.post("/feedback/{uid}")
-async def create_feedback(uid: str, payload: dict = Body(...)):
+async def create_feedback(uid: str, payload: dict = Body(...), auth_user: Optional[dict] = Depends(optional_user)):
     try:
-        print(f"📝 Creating feedback for user: {uid}")
-        print(f"📝 Feedback payload: {json.dumps(payload, indent=2)}")
+        log.debug("feedback.payload", sample=LOG_PAYLOAD_SAMPLE, user_id=uid, payload=lambda: json.dumps(payload))
         
         if not payload.get("product_id"):
             raise HTTPException(status_code=400, detail="product_id is required")
@@ -669,29 +1252,27 @@ async def create_feedback(uid: str, payload: dict = Body(...)):
             raise HTTPException(status_code=400, detail="Rating must be between 1 and 5")
         
         # Get user info
-        user = await db.users.find_one({"id": uid})
+        user = await resolve_user(uid, auth_user)
         user_name = user.get("name", "Anonymous") if user else "Anonymous"
         
-        # Check if user already reviewed this product
-        existing_feedback = await db.feedback.find_one({
-            "user_id": uid,
-            "product_id": payload.get("product_id")
-        })
+        # Update the user's existing review in place, getting the old rating back
+        existing_feedback = await db.feedback.find_one_and_update(
+            {"user_id": uid, "product_id": payload.get("product_id")},
+            {"$set": {
+                "rating": rating,
+                "comment": payload.get("comment", ""),
+                "updated_at": datetime.now(timezone.utc).isoformat()
+            }},
+            return_document=ReturnDocument.BEFORE,
+        )
         
         if existing_feedback:
-            # Update existing feedback
-            await db.feedback.update_one(
-                {"id": existing_feedback["id"]},
-                {"$set": {
-                    "rating": rating,
-                    "comment": payload.get("comment", ""),
-                    "updated_at": datetime.now(timezone.utc).isoformat()
-                }}
-            )
+            old_rating = safe_int(existing_feedback.get("rating"))
             feedback_data = existing_feedback
             feedback_data["rating"] = rating
             feedback_data["comment"] = payload.get("comment", "")
         else:
+            old_rating = None
             # Create new feedback
             feedback_data = {
                 "id": str(uuid.uuid4()),
@@ -704,54 +1285,151 @@ async def create_feedback(uid: str, payload: dict = Body(...)):
             }
             await db.feedback.insert_one(feedback_data)
         
-        # Recalculate product average rating
-        all_feedback = await db.feedback.find(
-            {"product_id": payload.get("product_id")}
-        ).to_list(1000)
-        
-        if all_feedback:
-            avg_rating = sum(f.get("rating", 0) for f in all_feedback) / len(all_feedback)
-            await db.products.update_one(
-                {"id": payload.get("product_id")},
-                {"$set": {
-                    "rating": round(avg_rating, 1),
-                    "review_count": len(all_feedback)
-                }}
-            )
-            print(f"✅ Updated product rating: {avg_rating:.1f} from {len(all_feedback)} reviews")
+        # Fold the rating into the product's running aggregates
+        summary = await apply_rating_change(payload.get("product_id"), rating, old_rating)
+        log.info(
+            "feedback.saved",
+            user_id=uid,
+            product_id=payload.get("product_id"),
+            rating=rating,
+            updated=existing_feedback is not None,
+            product_rating=summary["rating"] if summary else None,
+        )
         
         feedback_data.pop('_id', None)
+        publish_events(feedback_events(feedback_data, summary))
         return feedback_data
     except HTTPException:
         raise
     except Exception as e:
-        print(f"❌ Feedback creation error: {str(e)}")
-        logger.error(f"Feedback error: {str(e)}")
+        log.exception("feedback.failed", user_id=uid)
         raise HTTPException(status_code=500, detail=f"Internal server error: {str(e)}")
 
-@api.get("/feedback/product/{product_id}")
+@api.get("/feedback/product/{product_id}", response_model=List[FeedbackOut])
 async def get_product_feedback(product_id: str):
     try:
-        print(f"📝 Getting feedback for product: {product_id}")
         feedback_list = await db.feedback.find(
             {"product_id": product_id},
             {"_id": 0}
         ).sort("created_at", -1).to_list(100)
-        
-        print(f"✅ Found {len(feedback_list)} reviews")
-        return feedback_list
-    except Exception as e:
-        print(f"❌ Get feedback error: {str(e)}")
-        logger.error(f"Get feedback error: {str(e)}")
+        return ORJSONResponse(feedback_list)
+    except Exception:
+        log.exception("feedback.list_failed", product_id=product_id)
         return []
 
+# ============== RATING AGGREGATES ====================
+# Products keep running rating aggregates so feedback writes never re-read
+# every review: rating_sum, rating_count and rating_hist ({"1".."5": n}).
+# rating / review_count stay as the denormalized fields the frontend reads.
+RATING_STARS = ("1", "2", "3", "4", "5")
+
+def rating_summary(rating_sum, rating_count) -> dict:
+    rating_sum = safe_float(rating_sum)
+    rating_count = safe_int(rating_count)
+    avg = rating_sum / rating_count if rating_count > 0 else 0
+    return {"rating": round(avg, 1), "review_count": rating_count}
+
+async def apply_rating_change(product_id: str, new_rating: int, old_rating: Optional[int] = None):
+    """Fold one new or edited review into the product's running aggregates."""
+    inc: Dict[str, int] = {"rating_sum": new_rating, f"rating_hist.{new_rating}": 1}
+    if old_rating is None:
+        inc["rating_count"] = 1
+    else:
+        if old_rating == new_rating:
+            return None
+        inc["rating_sum"] -= old_rating
+        inc[f"rating_hist.{old_rating}"] = -1
+
+    invalidate_products(product_id)
+    # Only fold into aggregates that exist; a product that predates them (not
+    # yet backfilled) is recomputed from its reviews instead
+    product = await db.products.find_one_and_update(
+        {"id": product_id, "rating_count": {"$exists": True}},
+        {"$inc": inc},
+        projection={"_id": 0, "rating_sum": 1, "rating_count": 1},
+        return_document=ReturnDocument.AFTER,
+    )
+    if not product:
+        return await recompute_rating_aggregates(product_id)
+
+    summary = rating_summary(product.get("rating_sum"), product.get("rating_count"))
+    # Only write the derived fields if no other review landed in between;
+    # otherwise that later writer publishes the newer average.
+    await db.products.update_one(
+        {
+            "id": product_id,
+            "rating_sum": product.get("rating_sum"),
+            "rating_count": product.get("rating_count"),
+        },
+        {"$set": summary},
+    )
+    invalidate_products(product_id)
+    return summary
+
+def rating_pipeline(match: Optional[dict] = None) -> list:
+    """Aggregate feedback into per-product rating_sum / rating_count / hist_<star>."""
+    group = {"$group": {
+        "_id": "$product_id",
+        "rating_sum": {"$sum": "$rating"},
+        "rating_count": {"$sum": 1},
+        **{
+            f"hist_{star}": {"$sum": {"$cond": [{"$eq": ["$rating", int(star)]}, 1, 0]}}
+            for star in RATING_STARS
+        },
+    }}
+    return [{"$match": match}, group] if match else [group]
+
+def rating_fields(row: dict) -> dict:
+    return {
+        "rating_sum": row["rating_sum"],
+        "rating_count": row["rating_count"],
+        "rating_hist": {star: row[f"hist_{star}"] for star in RATING_STARS},
+        **rating_summary(row["rating_sum"], row["rating_count"]),
+    }
+
+async def recompute_rating_aggregates(product_id: str) -> Optional[dict]:
+    """Set one product's rating aggregates from its reviews; None if the product is gone."""
+    rows = await db.feedback.aggregate(rating_pipeline({"product_id": product_id})).to_list(1)
+    row = rows[0] if rows else {"rating_sum": 0, "rating_count": 0, **{f"hist_{star}": 0 for star in RATING_STARS}}
+    fields = rating_fields(row)
+    res = await db.products.update_one({"id": product_id}, {"$set": fields})
+    invalidate_products(product_id)
+    if not res.matched_count:
+        return None
+    return rating_summary(fields["rating_sum"], fields["rating_count"])
+
+async def rebuild_rating_aggregates(batch_size: int = 1000) -> int:
+    """Recompute every product's rating aggregates from the feedback collection."""
+    updated = 0
+    ops = []
+    async for row in db.feedback.aggregate(rating_pipeline(), allowDiskUse=True):
+        if not row["_id"]:
+            continue
+        ops.append(UpdateOne({"id": row["_id"]}, {"$set": rating_fields(row)}))
+        if len(ops) >= batch_size:
+            res = await db.products.bulk_write(ops, ordered=False)
+            updated += res.modified_count
+            ops = []
+    if ops:
+        res = await db.products.bulk_write(ops, ordered=False)
+        updated += res.modified_count
+    return updated
+
 # ============== SEED-DATA ============================
+_seed_password_hash: Optional[str] = None
+
 @api.post("/seed-data")
 async def seed_data():
+    # Fixture users share one password; hash it once per process, not per seed call
+    global _seed_password_hash
+    if _seed_password_hash is None:
+        _seed_password_hash = await hash_pw("password")
+    seed_pw = _seed_password_hash
+
     wholesalers = [
-        {"id": "wh1", "name": "Wholesaler One", "role": "wholesaler", "email": "wh1@example.com", "phone": "000", "password": hash_pw("password"), "pincode": "110001", "address": "Wholesale Market, Delhi"},
-        {"id": "ret1", "name": "Retailer One", "role": "retailer", "email": "ret1@example.com", "phone": "111", "password": hash_pw("password"), "pincode": "110001", "address": "Retail Store, Delhi"},
-        {"id": "9b155690-f6b4-4119-b3d0-4f4e8d717e18", "name": "Default Retailer", "role": "retailer", "email": "retailer@default.com", "phone": "222", "password": hash_pw("password"), "pincode": "400001", "address": "Default Store, Mumbai"},
+        {"id": "wh1", "name": "Wholesaler One", "role": "wholesaler", "email": "wh1@example.com", "phone": "000", "password": seed_pw, "pincode": "110001", "address": "Wholesale Market, Delhi"},
+        {"id": "ret1", "name": "Retailer One", "role": "retailer", "email": "ret1@example.com", "phone": "111", "password": seed_pw, "pincode": "110001", "address": "Retail Store, Delhi"},
+        {"id": "9b155690-f6b4-4119-b3d0-4f4e8d717e18", "name": "Default Retailer", "role": "retailer", "email": "retailer@default.com", "phone": "222", "password": seed_pw, "pincode": "400001", "address": "Default Store, Mumbai"},
     ]
 
     categories = [
@@ -769,17 +1447,27 @@ async def seed_data():
 
     for u in wholesalers:
         await db.users.update_one({"id": u["id"]}, {"$set": u}, upsert=True)
+        invalidate_users(u["id"])
+        sync_retailer_index(u)
 
     for c in categories:
         await db.categories.update_one({"id": c["id"]}, {"$set": c}, upsert=True)
 
     for p in products:
-        await db.products.update_one({"id": p["id"]}, {"$set": p}, upsert=True)
+        res = await db.products.update_one(
+            {"id": p["id"]},
+            {"$set": p, "$setOnInsert": {"rating": 0.0, "review_count": 0, **version_stamp("products")}},
+            upsert=True,
+        )
+        invalidate_products(p["id"])
+        if res.upserted_id is not None:
+            await bump_products_count(p["seller_id"], 1)
+        index_product(p)
 
     return {"message": "seeded"}
 
 # ================= PRODUCTS ===========================
-@api.get("/products")
+@api.get("/products", response_model=List[ProductOut])
 async def get_products(
     category_id: Optional[str] = None,
     search: Optional[str] = None,
@@ -787,8 +1475,21 @@ async def get_products(
     max_price: Optional[float] = None,
     available_only: Optional[bool] = True,
     seller_id: Optional[str] = None,
-    limit: int = 1000,
+    limit: Optional[int] = Query(None, ge=1),
+    cursor: Optional[str] = None,
+    format: str = Query("json", pattern="^(json|ndjson)$"),
 ):
+    """List products in ``id`` order, one keyset page at a time.
+
+    The page is returned as a JSON array (unchanged shape) with the cursor for
+    the following page in the ``X-Next-Cursor`` header. ``format=ndjson``
+    instead streams every matching product, one per line, straight off the
+    Mongo cursor; ``limit`` caps the stream when given.
+
+    ``search`` goes through the engine picked by SEARCH_ENGINE. The text and
+    memory engines rank by relevance, so those results are a single page in
+    score order with no next cursor.
+    """
     q: Dict[str, Any] = {}
 
     if seller_id:
@@ -797,12 +1498,6 @@ async def get_products(
     if category_id and category_id != "all":
         q["category_id"] = category_id
 
-    if search:
-        q["$or"] = [
-            {"name": regex_icase(search)},
-            {"description": regex_icase(search)},
-        ]
-
     if min_price is not None or max_price is not None:
         pf = {}
         if min_price is not None:
@@ -814,79 +1509,298 @@ async def get_products(
     if available_only:
         q["stock"] = {"$gt": 0}
 
-    items = await db.products.find(q, {"_id": 0}).to_list(length=limit)
-
-    for it in items:
-        it["price"] = safe_float(it.get("price", 0))
-        it["stock"] = safe_int(it.get("stock", 0))
-        it["rating"] = safe_float(it.get("rating", 0))
+    # Keyset pagination on the unique id: resume strictly after the last id seen
+    id_filter: Dict[str, Any] = {}
+    if cursor:
+        id_filter["$gt"] = decode_cursor(cursor)
 
-    return items
-
-@api.get("/products/retailer/{rid}")
+    # Relevance-ranked searches come back as a single page in score order
+    projection: Dict[str, Any] = {"_id": 0}
+    sort: List[tuple] = [("id", 1)]
+    ranked_ids: Optional[List[str]] = None
+    if search:
+        if SEARCH_ENGINE == "memory":
+            ranked_ids = search_index.search(search, limit=SEARCH_MAX_CANDIDATES)
+            id_filter["$in"] = ranked_ids
+        else:
+            q.update(product_search_filter(search))
+            if SEARCH_ENGINE == "text":
+                projection["score"] = {"$meta": "textScore"}
+                sort = [("score", {"$meta": "textScore"}), ("id", 1)]
+    ranked = bool(search) and SEARCH_ENGINE in ("text", "memory")
+
+    if id_filter:
+        q["id"] = id_filter
+
+    def strip_score(it):
+        it.pop("score", None)
+        return it
+
+    async def ranked_page(n: Optional[int]):
+        # $in loses the index's ranking; fetch the bounded candidate set and reorder
+        docs = await db.products.find(q, projection).to_list(len(ranked_ids))
+        rank = {pid: i for i, pid in enumerate(ranked_ids)}
+        docs.sort(key=lambda d: rank[d["id"]])
+        return docs[:n] if n else docs
+
+    if format == "ndjson":
+        if ranked_ids is not None:
+            ranked_docs = await ranked_page(limit)
+
+            async def ranked_source():
+                for it in ranked_docs:
+                    yield it
+
+            docs = ranked_source()
+        else:
+            docs = db.products.find(q, projection).sort(sort).batch_size(500)
+            if limit:
+                docs = docs.limit(limit)
+
+        async def stream():
+            async for it in docs:
+                yield orjson.dumps(strip_score(it), default=str) + b"\n"
+
+        return StreamingResponse(stream(), media_type="application/x-ndjson")
+
+    page_size = min(limit or PRODUCTS_PAGE_DEFAULT, PRODUCTS_PAGE_MAX)
+    headers = {}
+    if ranked_ids is not None:
+        items = await ranked_page(page_size)
+    else:
+        # Fetch one extra document to learn whether another page follows
+        items = await db.products.find(q, projection).sort(sort).to_list(length=page_size + 1)
+        if len(items) > page_size:
+            items = items[:page_size]
+            if not ranked:
+                headers["X-Next-Cursor"] = encode_cursor(items[-1]["id"])
+
+    return ORJSONResponse([strip_score(it) for it in items], headers=headers)
+
+@api.get("/products/retailer/{rid}", response_model=List[ProductOut])
 async def get_products_by_retailer(rid: str):
     items = await db.products.find(
         {"seller_id": rid}, {"_id": 0}
     ).to_list(1000)
+    return ORJSONResponse(items)
+
+@api.post("/products/batch", response_model=List[ProductOut])
+async def get_products_batch(payload: dict = Body(...)):
+    """Products for a list of ids in one call, in request order; unknown ids are skipped."""
+    ids = payload.get("ids")
+    if not isinstance(ids, list):
+        raise HTTPException(400, "ids must be a list")
+    if len(ids) > PRODUCTS_PAGE_MAX:
+        raise HTTPException(400, f"At most {PRODUCTS_PAGE_MAX} ids per request")
+
+    found = await get_cached_products([str(i) for i in ids])
+    return ORJSONResponse([found[pid] for pid in dict.fromkeys(str(i) for i in ids) if pid in found])
+
+async def import_batch(seller_id: str, batch: List[tuple], now: str) -> dict:
+    """Upsert one batch of (row number, product) pairs; returns counts and row errors."""
+    ops = [
+        UpdateOne(
+            # Matching on seller too means an id owned by another seller
+            # fails on the unique id index instead of being overwritten
+            {"id": doc["id"], "seller_id": seller_id},
+            {"$set": doc, "$setOnInsert": {"rating": 0.0, "review_count": 0, "created_at": now, **version_stamp("products")}},
+            upsert=True,
+        )
+        for _, doc in batch
+    ]
+    failed: Dict[int, str] = {}
+    try:
+        result = (await db.products.bulk_write(ops, ordered=False)).bulk_api_result
+    except BulkWriteError as e:
+        result = e.details
+        for err in result.get("writeErrors", []):
+            failed[err["index"]] = (
+                "id belongs to another seller's product" if err.get("code") == 11000 else err.get("errmsg", "write failed")
+            )
+
+    written = [doc for i, (_, doc) in enumerate(batch) if i not in failed]
+    invalidate_products(*(doc["id"] for doc in written))
+    for doc in written:
+        index_product(doc)
+    inserted = result.get("nUpserted", 0)
+    await bump_products_count(seller_id, inserted)
+    return {
+        "inserted": inserted,
+        "updated": result.get("nMatched", 0),
+        "errors": [{"row": batch[i][0], "error": msg} for i, msg in sorted(failed.items())],
+    }
 
-    for it in items:
-        it["price"] = safe_float(it.get("price", 0))
-        it["stock"] = safe_int(it.get("stock", 0))
-        it["rating"] = safe_float(it.get("rating", 0))
+@api.post("/products/import")
+async def import_products(
+    request: Request,
+    seller_id: str = Query(...),
+    format: Optional[str] = Query(None, pattern="^(ndjson|csv)$"),
+    auth_user: Optional[dict] = Depends(optional_user),
+):
+    """Bulk upsert a seller's catalog from an NDJSON or CSV request body.
 
-    return items
+    The body is the raw file (not multipart); the format comes from
+    ``format`` or the Content-Type. Rows are validated as they stream in and
+    written with unordered bulk_writes of IMPORT_BATCH_SIZE, one batch in
+    flight while the next is parsed. Rows with an ``id`` update that product;
+    rows without one create a new product.
+    """
+    seller = await resolve_user(seller_id, auth_user)
+    if not seller or seller.get("role") not in ("retailer", "wholesaler"):
+        raise HTTPException(404, "Seller not found")
+    if format is None:
+        format = "csv" if "csv" in request.headers.get("content-type", "") else "ndjson"
+
+    started = time.perf_counter()
+    now = datetime.now(timezone.utc).isoformat()
+    summary = {"rows": 0, "inserted": 0, "updated": 0, "failed": 0, "errors": []}
+
+    def add_error(row_no: int, error: str):
+        summary["failed"] += 1
+        if len(summary["errors"]) < IMPORT_MAX_ERRORS:
+            summary["errors"].append({"row": row_no, "error": error})
+
+    async def collect(task):
+        result = await task
+        summary["inserted"] += result["inserted"]
+        summary["updated"] += result["updated"]
+        for err in result["errors"]:
+            add_error(err["row"], err["error"])
+
+    batch: List[tuple] = []
+    seen_ids: Dict[str, int] = {}
+    in_flight = None
+    try:
+        async for row_no, row, error in catalog.iter_rows(catalog.iter_lines(request.stream()), format):
+            summary["rows"] += 1
+            if error is None:
+                try:
+                    doc = catalog.coerce_product(row, seller_id)
+                except catalog.RowError as e:
+                    error = str(e)
+            if error is not None:
+                add_error(row_no, error)
+                continue
+
+            doc.setdefault("id", str(uuid.uuid4()))
+            if doc["id"] in seen_ids:
+                add_error(row_no, f"duplicate id {doc['id']} (first seen on row {seen_ids[doc['id']]})")
+                continue
+            seen_ids[doc["id"]] = row_no
+            batch.append((row_no, doc))
+
+            if len(batch) >= IMPORT_BATCH_SIZE:
+                if in_flight is not None:
+                    await collect(in_flight)
+                in_flight = asyncio.create_task(import_batch(seller_id, batch, now))
+                batch = []
+                seen_ids.clear()
+    except catalog.RowError as e:
+        add_error(summary["rows"] + 1, str(e))
+    finally:
+        if in_flight is not None:
+            await collect(in_flight)
+    if batch:
+        await collect(import_batch(seller_id, batch, now))
+
+    elapsed = time.perf_counter() - started
+    summary["errors_truncated"] = summary["failed"] > len(summary["errors"])
+    summary["seconds"] = round(elapsed, 3)
+    summary["rows_per_s"] = round(summary["rows"] / elapsed) if elapsed else summary["rows"]
+    log.info(
+        "catalog.imported",
+        seller_id=seller_id,
+        rows=summary["rows"],
+        inserted=summary["inserted"],
+        updated=summary["updated"],
+        failed=summary["failed"],
+        seconds=summary["seconds"],
+    )
+    return summary
+
+@api.get("/products/export")
+async def export_products(seller_id: str = Query(...), format: str = Query("ndjson", pattern="^(ndjson|csv)$")):
+    """Stream a seller's catalog straight from the cursor, in id order."""
+    cursor = db.products.find({"seller_id": seller_id}, {"_id": 0}).sort("id", 1).batch_size(1000)
+
+    async def stream():
+        if format == "csv":
+            yield catalog.export_csv_header()
+        async for doc in cursor:
+            yield catalog.export_csv_row(doc) if format == "csv" else catalog.export_ndjson(doc)
+
+    media_type = "text/csv" if format == "csv" else "application/x-ndjson"
+    filename = f"products-{seller_id}.{format}"
+    return StreamingResponse(
+        stream(),
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+    )
 
-@api.get("/products/{pid}")
+@api.get("/products/{pid}", response_model=ProductOut)
 async def get_product(pid: str):
-    item = await db.products.find_one({"id": pid}, {"_id": 0})
+    item = await get_cached_product(pid)
     if not item:
         raise HTTPException(404, "Product not found")
-
-    item["price"] = safe_float(item.get("price", 0))
-    item["stock"] = safe_int(item.get("stock", 0))
-    item["rating"] = safe_float(item.get("rating", 0))
-
-    return item
+    return ORJSONResponse(item)
 
 @api.post("/products")
 async def create_product(payload: dict = Body(...)):
     if "id" not in payload or not payload["id"]:
         payload["id"] = str(uuid.uuid4())
 
-    payload["price"] = safe_float(payload.get("price", 0))
-    payload["stock"] = safe_int(payload.get("stock", 0))
+    normalize_product(payload)
+    payload.setdefault("price", 0.0)
+    payload.setdefault("stock", 0)
+    payload.setdefault("rating", 0.0)
 
-    if "rating" not in payload:
-        payload["rating"] = 0
-
-    await db.products.update_one({"id": payload["id"]}, {"$set": payload}, upsert=True)
+    res = await db.products.update_one(
+        {"id": payload["id"]}, {"$set": payload, "$setOnInsert": version_stamp("products")}, upsert=True
+    )
+    invalidate_products(payload["id"])
+    if res.upserted_id is not None:
+        await bump_products_count(payload.get("seller_id"), 1)
     doc = await db.products.find_one({"id": payload["id"]}, {"_id": 0})
+    index_product(doc)
 
     return doc
 
 @api.put("/products/{pid}")
 async def update_product(pid: str, payload: dict = Body(...)):
-    if "price" in payload:
-        payload["price"] = safe_float(payload["price"])
-    if "stock" in payload:
-        payload["stock"] = safe_int(payload["stock"])
-    if "rating" in payload:
-        payload["rating"] = safe_float(payload["rating"])
-
-    await db.products.update_one({"id": pid}, {"$set": payload})
-
-    doc = await db.products.find_one({"id": pid}, {"_id": 0})
+    normalize_product(payload)
+
+    projection = {"_id": 0, "id": 1, "seller_id": 1}
+    if payload:
+        before = await db.products.find_one_and_update({"id": pid}, {"$set": payload}, projection=projection)
+    else:
+        before = await db.products.find_one({"id": pid}, projection)  # every field was dropped as invalid
+    invalidate_products(pid)
+    if before and "seller_id" in payload and before.get("seller_id") != payload["seller_id"]:
+        # The product moved sellers; keep both rollups' products_count right
+        await bump_products_count(before.get("seller_id"), -1)
+        await bump_products_count(payload["seller_id"], 1)
+
+    doc = await db.products.find_one({"id": pid})
     if not doc:
         raise HTTPException(404, "Product not found")
-
-    doc["rating"] = safe_float(doc.get("rating", 0))
+    # A product from before versioning is upgraded as a whole (and stamped)
+    # while we are writing it, rather than being left for migrate-schema
+    if await upgrade_stored(db, "products", doc):
+        invalidate_products(pid)
+        doc = await db.products.find_one({"id": pid}) or doc
+    doc.pop("_id", None)
+    index_product(doc)
+    publish_events(product_events(doc))
     return doc
 
 @api.delete("/products/{pid}")
 async def delete_product(pid: str):
-    res = await db.products.delete_one({"id": pid})
-    if res.deleted_count == 0:
+    deleted = await db.products.find_one_and_delete({"id": pid}, projection={"_id": 0, "seller_id": 1})
+    invalidate_products(pid)
+    if not deleted:
         raise HTTPException(404, "Product not found")
+    await bump_products_count(deleted.get("seller_id"), -1)
+    unindex_product(pid)
     return {"message": "Product deleted"}
 
 # ================= CATEGORIES ========================
@@ -907,18 +1821,35 @@ async def create_category(payload: dict = Body(...)):
     return doc
 
 # ================= CART ============================
+CART_PRODUCT_FIELDS = ("id", "name", "price", "stock", "image_url", "unit", "seller_id")
+
 @api.get("/cart/{uid}")
-async def get_cart(uid: str):
+async def get_cart(uid: str, expand: Optional[str] = None):
+    """Cart lines; ``expand=products`` joins each line with its product and line total."""
     if not uid or len(uid) < 5:
         raise HTTPException(400, "Invalid user ID format")
     
     cart = await db.cart.find_one({"user_id": uid}, {"_id": 0})
 
     if not cart or not isinstance(cart.get("items"), list):
-        return {"user_id": uid, "items": []}
+        cart = {"user_id": uid, "items": []}
 
-    for it in cart["items"]:
-        it["quantity"] = safe_int(it.get("quantity", 1))
+    if expand == "products":
+        # Carts and products not yet migrated may hold junk lines or string
+        # numbers; coerce here so such a cart still renders
+        cart["items"] = [it for it in cart["items"] if isinstance(it, dict) and it.get("product_id")]
+        products = await get_cached_products([str(it["product_id"]) for it in cart["items"]])
+        total = 0.0
+        for it in cart["items"]:
+            product = products.get(str(it["product_id"]))
+            if product:
+                product = {k: product.get(k) for k in CART_PRODUCT_FIELDS}
+                it["line_total"] = to_float(product["price"]) * to_int(it.get("quantity"))
+                total += it["line_total"]
+            else:
+                it["line_total"] = 0.0
+            it["product"] = product
+        cart["total_amount"] = total
 
     return cart
 
@@ -933,49 +1864,73 @@ async def add_to_cart(uid: str, payload: dict = Body(...)):
     if not pid:
         raise HTTPException(400, "product_id required")
 
-    product = await db.products.find_one({"id": pid}, {"_id": 0})
+    product = await get_cached_product(pid)
     if not product:
         raise HTTPException(400, f"Invalid product ID: {pid}")
 
-    cart = await db.cart.find_one({"user_id": uid}) or {"user_id": uid, "items": []}
-    if not isinstance(cart.get("items"), list):
-        cart["items"] = []
+    # Each step is a single atomic update, so concurrent taps never lose quantity
+    for _ in range(3):
+        # Bump the line if the product is already in the cart. Only numeric
+        # quantities match: $inc on a legacy string quantity is a write error.
+        cart = await db.cart.find_one_and_update(
+            {"user_id": uid, "items": {"$elemMatch": {"product_id": pid, "quantity": {"$type": "number"}}}},
+            {"$inc": {"items.$.quantity": qty}},
+            projection={"_id": 0},
+            return_document=ReturnDocument.AFTER,
+        )
+        if cart:
+            return cart
+
+        # Otherwise append it, creating the cart if needed. If the line exists
+        # (another request added it in between, or its quantity is a legacy
+        # string) the upsert hits the unique user_id index; coerce the line and
+        # go back to bumping it.
+        try:
+            cart = await db.cart.find_one_and_update(
+                {"user_id": uid, "items.product_id": {"$ne": pid}},
+                {"$push": {"items": {"product_id": pid, "quantity": qty}}, "$setOnInsert": version_stamp("cart")},
+                projection={"_id": 0},
+                upsert=True,
+                return_document=ReturnDocument.AFTER,
+            )
+            return cart
+        except DuplicateKeyError:
+            await coerce_cart_quantity(uid, pid)
 
-    updated = False
-    for item in cart["items"]:
-        if item["product_id"] == pid:
-            item["quantity"] = safe_int(item["quantity"]) + qty
-            updated = True
-            break
+    raise HTTPException(409, "Cart was modified concurrently, please retry")
 
-    if not updated:
-        cart["items"].append({"product_id": pid, "quantity": qty})
+async def coerce_cart_quantity(uid: str, pid: str):
+    """Rewrite a cart line's non-numeric quantity (pre-migration data) as an int.
 
-    await db.cart.replace_one({"user_id": uid}, cart, upsert=True)
-    cart.pop('_id', None)
-    return cart
+    The update only applies if the quantity is still the value read, so a
+    concurrent coercion or edit is never overwritten.
+    """
+    cart = await db.cart.find_one({"user_id": uid, "items.product_id": pid}, {"_id": 0, "items": 1})
+    line = next((it for it in (cart or {}).get("items", []) if isinstance(it, dict) and it.get("product_id") == pid), None)
+    if line is None or isinstance(line.get("quantity"), (int, float)):
+        return
+    await db.cart.update_one(
+        {"user_id": uid, "items": {"$elemMatch": {"product_id": pid, "quantity": line.get("quantity")}}},
+        {"$set": {"items.$.quantity": safe_int(line.get("quantity"))}},
+    )
 
 @api.put("/cart/{uid}/{itemId}")
 async def update_cart_item(uid: str, itemId: str, quantity: int = Query(...)):
     if not uid or len(uid) < 5:
         raise HTTPException(400, "Invalid user ID format")
     
-    cart = await db.cart.find_one({"user_id": uid})
+    cart = await db.cart.find_one_and_update(
+        {"user_id": uid, "items.product_id": itemId},
+        {"$set": {"items.$[line].quantity": safe_int(quantity)}},
+        array_filters=[{"line.product_id": itemId}],
+        projection={"_id": 0},
+        return_document=ReturnDocument.AFTER,
+    )
     if not cart:
-        raise HTTPException(404, "Cart not found")
-
-    found = False
-    for item in cart["items"]:
-        if item["product_id"] == itemId:
-            item["quantity"] = safe_int(quantity)
-            found = True
-            break
-
-    if not found:
+        if not await db.cart.find_one({"user_id": uid}, {"_id": 1}):
+            raise HTTPException(404, "Cart not found")
         raise HTTPException(404, "Item not in cart")
 
-    await db.cart.replace_one({"user_id": uid}, cart)
-    cart.pop('_id', None)
     return cart
 
 @api.delete("/cart/{uid}/{itemId}")
@@ -983,14 +1938,15 @@ async def remove_cart_item(uid: str, itemId: str):
     if not uid or len(uid) < 5:
         raise HTTPException(400, "Invalid user ID format")
     
-    cart = await db.cart.find_one({"user_id": uid})
+    cart = await db.cart.find_one_and_update(
+        {"user_id": uid},
+        {"$pull": {"items": {"product_id": itemId}}},
+        projection={"_id": 0},
+        return_document=ReturnDocument.AFTER,
+    )
     if not cart:
         raise HTTPException(404, "Cart not found")
 
-    cart["items"] = [i for i in cart["items"] if i["product_id"] != itemId]
-
-    await db.cart.replace_one({"user_id": uid}, cart)
-    cart.pop('_id', None)
     return cart
 
 @api.delete("/cart/{uid}")
@@ -1001,40 +1957,202 @@ async def clear_cart(uid: str):
     await db.cart.delete_one({"user_id": uid})
     return {"message": "Cart cleared"}
 
+# ================= SELLER STATS =====================
+# One rollup document per seller in ``seller_stats`` ({seller_id, orders_count,
+# revenue, products_count}) so the retailer dashboard is a single point read.
+# Counters are bumped as orders and products are written; ``rebuild_seller_stats``
+# recomputes them from scratch.
+async def record_order_stats(order: dict):
+    """Add a placed order to the rollup of every seller with a line in it."""
+    revenue: Dict[str, float] = {}
+    for item in order["items"]:
+        revenue[item["seller_id"]] = revenue.get(item["seller_id"], 0) + safe_float(item.get("total", 0))
+    if not revenue:
+        return
+    await db.seller_stats.bulk_write(
+        [
+            UpdateOne({"seller_id": sid}, {"$inc": {"orders_count": 1, "revenue": amount}}, upsert=True)
+            for sid, amount in revenue.items()
+        ],
+        ordered=False,
+    )
+
+async def bump_products_count(seller_id: Optional[str], delta: int):
+    if not seller_id or not delta:
+        return
+    await db.seller_stats.update_one({"seller_id": seller_id}, {"$inc": {"products_count": delta}}, upsert=True)
+
+def seller_orders_pipeline(seller_id: Optional[str] = None) -> list:
+    """Per-seller orders_count / revenue from order lines, optionally for one seller."""
+    match = [{"$match": {"items.seller_id": seller_id}}] if seller_id else []
+    return [
+        *match,
+        {"$unwind": "$items"},
+        *match,
+        {"$group": {
+            "_id": {"order": "$id", "seller": "$items.seller_id"},
+            "revenue": {"$sum": "$items.total"},
+        }},
+        {"$group": {
+            "_id": "$_id.seller",
+            "orders_count": {"$sum": 1},
+            "revenue": {"$sum": "$revenue"},
+        }},
+    ]
+
+async def live_seller_stats(seller_id: str) -> dict:
+    """One seller's rollup computed from orders and products (the pre-rollup dashboard query)."""
+    rows = await db.orders.aggregate(seller_orders_pipeline(seller_id)).to_list(1)
+    products_count = await db.products.count_documents({"seller_id": seller_id})
+    orders = rows[0] if rows else {}
+    return {
+        "orders_count": orders.get("orders_count", 0),
+        "revenue": orders.get("revenue", 0),
+        "products_count": products_count,
+    }
+
+async def rebuild_seller_stats(batch_size: int = 1000) -> int:
+    """Recompute every seller rollup from the orders and products collections."""
+    stats: Dict[str, dict] = {}
+
+    def entry(sid):
+        return stats.setdefault(sid, {"orders_count": 0, "revenue": 0, "products_count": 0})
+
+    async for row in db.orders.aggregate(seller_orders_pipeline(), allowDiskUse=True):
+        if row["_id"]:
+            e = entry(row["_id"])
+            e["orders_count"] = row["orders_count"]
+            e["revenue"] = row["revenue"]
+
+    products_pipeline = [{"$group": {"_id": "$seller_id", "products_count": {"$sum": 1}}}]
+    async for row in db.products.aggregate(products_pipeline, allowDiskUse=True):
+        if row["_id"]:
+            entry(row["_id"])["products_count"] = row["products_count"]
+
+    # Sellers that no longer have any orders or products drop back to zero
+    async for row in db.seller_stats.find({}, {"_id": 0, "seller_id": 1}):
+        entry(row["seller_id"])
+
+    ops = [UpdateOne({"seller_id": sid}, {"$set": fields}, upsert=True) for sid, fields in stats.items()]
+    for i in range(0, len(ops), batch_size):
+        await db.seller_stats.bulk_write(ops[i:i + batch_size], ordered=False)
+    return len(ops)
+
+async def normalize_purchase_ids() -> int:
+    """Rewrite legacy purchases so wholesaler_id is stored normalized."""
+    res = await db.purchases.update_many(
+        {"wholesaler_id": {"$type": "string"}},
+        [{"$set": {"wholesaler_id": {"$toLower": {"$trim": {"input": "$wholesaler_id"}}}}}],
+    )
+    return res.modified_count
+
+# ================= STOCK RESERVATION ================
+async def reserve_stock(quantities: Dict[str, int]) -> Optional[str]:
+    """Decrement stock for every product in ``quantities`` or for none of them.
+
+    All decrements go out in one ordered ``bulk_write`` of conditional updates
+    (``stock >= qty``). Each update is an upsert, so a product without enough
+    stock turns into a duplicate-key error on the unique ``id`` index and the
+    batch stops right there; the ops before it are then rolled back. Returns
+    ``None`` on success, otherwise the id of the product that could not be
+    reserved.
+    """
+    if not quantities:
+        return None
+
+    pids = list(quantities)
+    ops = [
+        UpdateOne({"id": pid, "stock": {"$gte": qty}}, {"$inc": {"stock": -qty}}, upsert=True)
+        for pid, qty in quantities.items()
+    ]
+
+    stop = len(ops)
+    invalidate_products(*pids)
+    try:
+        res = await db.products.bulk_write(ops, ordered=True)
+        upserted = dict(res.upserted_ids or {})
+    except BulkWriteError as e:
+        stop = e.details["writeErrors"][0]["index"]
+        upserted = {u["index"]: u["_id"] for u in e.details.get("upserted", [])}
+    # Again after the write: a load that started during it may have cached
+    # the old stock under the generation bumped above
+    invalidate_products(*pids)
+
+    # Upserts only succeed if the product vanished (or the id index is missing);
+    # drop those stub documents and treat them as failures too.
+    if upserted:
+        await db.products.delete_many({"_id": {"$in": list(upserted.values())}})
+
+    failed = [i for i in upserted if i < stop]
+    if stop < len(ops):
+        failed.append(stop)
+    if not failed:
+        return None
+
+    applied = {pid: quantities[pid] for i, pid in enumerate(pids) if i < stop and i not in upserted}
+    await release_stock(applied)
+    return pids[min(failed)]
+
+async def release_stock(quantities: Dict[str, int]):
+    """Give back stock taken by ``reserve_stock``."""
+    if not quantities:
+        return
+    await db.products.bulk_write(
+        [UpdateOne({"id": pid}, {"$inc": {"stock": qty}}) for pid, qty in quantities.items()],
+        ordered=False,
+    )
+    invalidate_products(*quantities)
+
 # ================= ORDERS ===========================
 @api.post("/orders/{uid}")
-async def place_order(uid: str, payload: dict = Body(...)):
+async def place_order(uid: str, payload: dict = Body(...), auth_user: Optional[dict] = Depends(optional_user)):
     try:
-        print(f"🎯 Creating order for user: {uid}")
-        print(f"📦 Payload received: {json.dumps(payload, indent=2)}")
+        log.debug("order.payload", sample=LOG_PAYLOAD_SAMPLE, user_id=uid, payload=lambda: json.dumps(payload))
         if "items" not in payload:
             raise HTTPException(400, "Items missing")
         if not payload.get("delivery_address"):
             raise HTTPException(400, "Delivery address required")
-        user = await db.users.find_one({"id": uid})
+        user = await resolve_user(uid, auth_user)
         if not user:
             raise HTTPException(404, f"User not found: {uid}")
-        order_items = []
-        total = 0.0
+
+        # Total quantity per product (the same product may appear on several lines)
+        quantities: Dict[str, int] = {}
         for it in payload["items"]:
-            pid = it["product_id"]
             qty = safe_int(it["quantity"])
-            product = await db.products.find_one({"id": pid})
+            if qty < 1:
+                raise HTTPException(400, f"Invalid quantity for {it['product_id']}")
+            quantities[it["product_id"]] = quantities.get(it["product_id"], 0) + qty
+
+        # One round trip for every product in the order
+        products = {
+            p["id"]: p
+            for p in await db.products.find(
+                {"id": {"$in": list(quantities)}},
+                {"_id": 0, "id": 1, "name": 1, "price": 1, "stock": 1, "seller_id": 1},
+            ).to_list(len(quantities))
+        }
+        for pid, qty in quantities.items():
+            product = products.get(pid)
             if not product:
                 raise HTTPException(404, f"Product not found: {pid}")
-            if product["stock"] < qty:
+            if safe_int(product.get("stock", 0)) < qty:
                 raise HTTPException(400, f"Insufficient stock for {product['name']}")
+
+        order_items = []
+        total = 0.0
         for it in payload["items"]:
             pid = it["product_id"]
             qty = safe_int(it["quantity"])
-            product = await db.products.find_one({"id": pid})
-            subtotal = product["price"] * qty
+            product = products[pid]
+            price = safe_float(product.get("price", 0))
+            subtotal = price * qty
             total += subtotal
             order_items.append({
                 "product_id": pid,
                 "product_name": product["name"],
                 "quantity": qty,
-                "price": product["price"],
+                "price": price,
                 "total": subtotal,
                 "seller_id": product["seller_id"]
             })
@@ -1049,44 +2167,51 @@ async def place_order(uid: str, payload: dict = Body(...)):
             "order_status": "placed",
             "created_at": datetime.now(timezone.utc).isoformat(),
         }
+        normalize_order(order)
         
         # Add card details if payment method is card
         if payload.get("payment_method") == "card" and payload.get("card_last4"):
             order["card_last4"] = payload.get("card_last4")
         
-        await db.orders.insert_one(order)
-        
-        # Update product stock
-        for it in payload["items"]:
-            await db.products.update_one(
-                {"id": it["product_id"]}, 
-                {"$inc": {"stock": -safe_int(it["quantity"])}}
-            )
+        # Take the stock for all lines at once; a concurrent checkout may have
+        # won the race since the read above, in which case nothing is taken.
+        failed_pid = await reserve_stock(quantities)
+        if failed_pid:
+            raise HTTPException(400, f"Insufficient stock for {products[failed_pid]['name']}")
+
+        try:
+            await db.orders.insert_one(order)
+        except Exception:
+            await release_stock(quantities)
+            raise
+
+        await record_order_stats(order)
         
         # Clear user's cart
         await db.cart.delete_one({"user_id": uid})
         
         order.pop('_id', None)
+        publish_events(order_events(order))
         
-        logger.info(f"✅ Order created: {order['id']} - Total: ₹{total} - Payment: {order['payment_method']}")
+        log.info("order.created", order_id=order["id"], user_id=uid, total=total, payment=order["payment_method"], lines=len(order_items))
         return order
     except HTTPException:
         raise
     except Exception as e:
-        logger.error(f"Order creation failed: {str(e)}")
+        log.exception("order.failed", user_id=uid)
         raise HTTPException(500, f"Internal server error: {str(e)}")
 
-@api.get("/orders/{uid}")
+@api.get("/orders/{uid}", response_model=List[OrderOut])
 async def get_orders(uid: str):
     items = await db.orders.find({"user_id": uid}, {"_id": 0}).to_list(1000)
-    return items
+    return ORJSONResponse(items)
 
-@api.get("/orders/detail/{oid}")
+@api.get("/orders/detail/{oid}", response_model=OrderOut)
 async def get_order_detail(oid: str):
     order = await db.orders.find_one({"id": oid}, {"_id": 0})
     if not order:
         raise HTTPException(404, "Order not found")
-    return order
+    return ORJSONResponse(order)
 
 # ================= WHOLESALE PURCHASE ENDPOINT ==================
 class PurchaseItem(BaseModel):
@@ -1102,100 +2227,147 @@ class WholesalePurchaseRequest(BaseModel):
     total_amount: float
 
 @api.post("/purchase/from-wholesaler")
-async def purchase_from_wholesaler(payload: WholesalePurchaseRequest):
+async def purchase_from_wholesaler(payload: WholesalePurchaseRequest, auth_user: Optional[dict] = Depends(optional_user)):
     """Retailer purchases from wholesaler — with stock transfer + retailer product creation
     This endpoint:
       - validates stock
       - deducts stock from wholesaler
+      - records the purchase
       - creates or updates retailer product with calculated price using markup_percent
     """
     try:
-        print(f"🛒 Wholesale purchase request: {payload.retailer_id} -> {payload.wholesaler_id}")
-        print(f"📦 Items: {payload.items}")
-        print(f"💰 Total: {payload.total_amount}")
+        log.debug(
+            "purchase.request",
+            sample=LOG_PAYLOAD_SAMPLE,
+            retailer_id=payload.retailer_id,
+            wholesaler_id=payload.wholesaler_id,
+            items=lambda: [item.model_dump() for item in payload.items],
+        )
 
-        retailer = await db.users.find_one({"id": payload.retailer_id, "role": "retailer"})
-        if not retailer:
+        retailer = await resolve_user(payload.retailer_id, auth_user)
+        if not retailer or retailer.get("role") != "retailer":
             raise HTTPException(404, "Retailer not found")
 
-        wholesaler = await db.users.find_one({"id": payload.wholesaler_id, "role": "wholesaler"})
-        if not wholesaler:
+        wholesaler = await get_cached_user(payload.wholesaler_id)
+        if not wholesaler or wholesaler.get("role") != "wholesaler":
             raise HTTPException(404, "Wholesaler not found")
 
-        purchase_items = []
+        # Total quantity and markup per wholesale product
+        quantities: Dict[str, int] = {}
+        markups: Dict[str, float] = {}
+        for item in payload.items:
+            if item.quantity < 1:
+                raise HTTPException(400, f"Invalid quantity for {item.product_id}")
+            quantities[item.product_id] = quantities.get(item.product_id, 0) + item.quantity
+            # Use markup_percent if provided, otherwise default to 20
+            markups[item.product_id] = safe_float(item.markup_percent if item.markup_percent is not None else 20)
+
+        # One read for every wholesale product in the purchase
+        products = {
+            p["id"]: p
+            for p in await db.products.find(
+                {"id": {"$in": list(quantities)}}, {"_id": 0}
+            ).to_list(len(quantities))
+        }
 
+        purchase_items = []
         for item in payload.items:
-            product = await db.products.find_one({"id": item.product_id})
+            product = products.get(item.product_id)
             if not product:
                 raise HTTPException(404, f"Product {item.product_id} not found")
-            if product["stock"] < item.quantity:
+            if safe_int(product.get("stock", 0)) < quantities[item.product_id]:
                 raise HTTPException(400, f"Insufficient stock for {product['name']}")
 
+            unit_price = safe_float(product.get("price", 0))
             purchase_items.append({
                 "product_id": item.product_id,
                 "product_name": product["name"],
                 "quantity": item.quantity,
-                "unit_price": product["price"],
-                "total": product["price"] * item.quantity,
+                "unit_price": unit_price,
+                "total": unit_price * item.quantity,
             })
 
         purchase_data = {
             "id": str(uuid.uuid4()),
             "retailer_id": payload.retailer_id,
-            "wholesaler_id": payload.wholesaler_id,
+            "wholesaler_id": normalize_id(payload.wholesaler_id),
             "items": purchase_items,
             "total_amount": payload.total_amount,
             "status": "completed",
             "created_at": datetime.now(timezone.utc).isoformat(),
         }
 
-        await db.purchases.insert_one(purchase_data)
-
-        # Now transfer stock and create/update retailer products
-        for item in payload.items:
-            product = await db.products.find_one({"id": item.product_id})
-
-            # Deduct wholesaler stock
-            await db.products.update_one({"id": item.product_id}, {"$inc": {"stock": -item.quantity}})
+        # Deduct wholesaler stock for all items in one bulk write (all or nothing)
+        failed_pid = await reserve_stock(quantities)
+        if failed_pid:
+            raise HTTPException(400, f"Insufficient stock for {products[failed_pid]['name']}")
 
-            # Use markup_percent if provided, otherwise default to 20
-            markup = safe_float(getattr(item, "markup_percent", 20))
+        # Record the purchase before anything reaches the retailer, so stock
+        # never moves without a purchase on record
+        try:
+            await db.purchases.insert_one(purchase_data)
+        except Exception:
+            await release_stock(quantities)
+            raise
+
+        # Create or top up the retailer's mirror of each wholesale product in one
+        # bulk write, keyed on (seller_id, original_wh_product_id)
+        mirror_ops = []
+        new_mirrors = []
+        for pid, qty in quantities.items():
+            product = products[pid]
             # compute retailer price from wholesaler product price
-            retailer_price = round(safe_float(product.get("price", 0)) * (1 + markup / 100), 2)
-
-            # Find existing retailer product created previously from this wholesale product
-            existing_retail_product = await db.products.find_one({
-                "original_wh_product_id": item.product_id,
-                "seller_id": payload.retailer_id
-            })
-
-            if existing_retail_product:
-                await db.products.update_one({"id": existing_retail_product["id"]}, {"$inc": {"stock": item.quantity}})
-                # optionally update price if you want
-                await db.products.update_one({"id": existing_retail_product["id"]}, {"$set": {"price": retailer_price}})
-            else:
-                new_product = {
-                    "id": str(uuid.uuid4()),
-                    "name": product.get("name"),
-                    "category_id": product.get("category_id"),
-                    "price": retailer_price,
-                    "stock": item.quantity,
-                    "seller_id": payload.retailer_id,
-                    "description": product.get("description", ""),
-                    "image_url": product.get("image_url", ""),
-                    "rating": 0,
-                    "original_wh_product_id": item.product_id
-                }
-                await db.products.insert_one(new_product)
+            retailer_price = round(safe_float(product.get("price", 0)) * (1 + markups[pid] / 100), 2)
+            new_mirror = {
+                "id": str(uuid.uuid4()),
+                "name": product.get("name"),
+                "category_id": product.get("category_id"),
+                "description": product.get("description", ""),
+                "image_url": product.get("image_url", ""),
+                "rating": 0.0,
+                "review_count": 0,
+            }
+            new_mirrors.append(new_mirror)
+            mirror_ops.append(UpdateOne(
+                {"seller_id": payload.retailer_id, "original_wh_product_id": pid},
+                {
+                    "$inc": {"stock": qty},
+                    "$set": {"price": retailer_price},
+                    "$setOnInsert": {**new_mirror, **version_stamp("products")},
+                },
+                upsert=True,
+            ))
+        try:
+            mirror_result = await db.products.bulk_write(mirror_ops, ordered=False)
+        except Exception:
+            await release_stock(quantities)
+            await db.purchases.delete_one({"id": purchase_data["id"]})
+            raise
+        # Existing mirrors were matched by (seller, wholesale product), not by id
+        product_cache.invalidate_if(
+            lambda p: p.get("seller_id") == payload.retailer_id and p.get("original_wh_product_id") in quantities
+        )
+        await bump_products_count(payload.retailer_id, mirror_result.upserted_count)
+        # Only the upserted ops actually created a product with their generated id
+        for i in (mirror_result.upserted_ids or {}):
+            index_product(new_mirrors[i])
 
         purchase_data.pop("_id", None)
-        print(f"✅ Wholesale purchase completed: {purchase_data['id']}")
+        publish_events(purchase_events(purchase_data, wholesaler_id=wholesaler["id"]))
+        log.info(
+            "purchase.completed",
+            purchase_id=purchase_data["id"],
+            retailer_id=payload.retailer_id,
+            wholesaler_id=payload.wholesaler_id,
+            total=payload.total_amount,
+            lines=len(purchase_items),
+        )
         return purchase_data
 
     except HTTPException:
         raise
     except Exception as e:
-        logger.error(f"❌ Wholesale purchase failed: {e}")
+        log.exception("purchase.failed", retailer_id=payload.retailer_id, wholesaler_id=payload.wholesaler_id)
         raise HTTPException(500, f"Purchase failed: {str(e)}")
 
 # ================= DASHBOARD =========================
@@ -1204,30 +2376,17 @@ async def retailer_dashboard(user_id: Optional[str] = None):
     if not user_id:
         return {"products_count": 0, "orders_count": 0, "total_revenue": 0, "products": [], "orders": 0, "revenue": 0}
 
-    products_count = await db.products.count_documents({"seller_id": user_id})
-
-    # Orders where retailer sold products (customer orders)
-    orders_as_seller = await db.orders.find({"items.seller_id": user_id}).to_list(2000)
-
-    # purchases where retailer bought from wholesalers (do NOT count as customer orders)
-    purchases_from_wholesalers = await db.purchases.find({"retailer_id": user_id}).to_list(2000)
+    # Single point read of the seller rollup maintained by place_order. A seller
+    # with no rollup yet (e.g. a database from before it existed, until
+    # ``manage.py rebuild-seller-stats`` runs) is aggregated live instead.
+    stats = await db.seller_stats.find_one({"seller_id": user_id}, {"_id": 0})
+    if stats is None:
+        stats = await live_seller_stats(user_id)
+    products_count = safe_int(stats.get("products_count", 0))
+    orders_count = safe_int(stats.get("orders_count", 0))
+    revenue = stats.get("revenue", 0)
 
-    # Calculate customer orders and revenue
-    orders_count = 0
-    revenue = 0
-    for order in orders_as_seller:
-        included = False
-        for item in order["items"]:
-            if item["seller_id"] == user_id:
-                included = True
-                revenue += item.get("total", 0)
-        if included:
-            orders_count += 1
-
-    # do not add purchases_from_wholesalers to customer order count
-
-    print(f"🎯 Retailer Dashboard - User: {user_id}")
-    print(f"🎯 Products: {products_count}, Orders: {orders_count}, Revenue: {revenue}")
+    log.debug("dashboard.retailer", user_id=user_id, products=products_count, orders=orders_count, revenue=revenue)
 
     # return both legacy keys and new keys so frontend won't break
     return {
@@ -1240,30 +2399,207 @@ async def retailer_dashboard(user_id: Optional[str] = None):
     }
 
 @api.get("/dashboard/wholesaler")
-async def wholesaler_dashboard(user_id: str = Query(..., description="User ID")):
+async def wholesaler_dashboard(
+    user_id: str = Query(..., description="User ID"),
+    start_date: Optional[datetime] = Query(None, description="Only count purchases at or after this time"),
+    end_date: Optional[datetime] = Query(None, description="Only count purchases before this time"),
+):
     try:
-        print(f"🎯 SIMPLE DASHBOARD for: {user_id}")
-        products_count = await db.products.count_documents({"seller_id": user_id})
-        all_purchases = await db.purchases.find({}).to_list(1000)
-        matching_purchases = []
-        for purchase in all_purchases:
-            purchase_wholesaler = purchase.get("wholesaler_id", "")
-            if purchase_wholesaler.lower() == user_id.lower():
-                matching_purchases.append(purchase)
-        orders_count = len(matching_purchases)
-        total_revenue = sum(p.get("total_amount", 0) for p in matching_purchases)
-        print(f"💰 SIMPLE CALCULATION: {orders_count} orders, ₹{total_revenue} revenue")
+        wholesaler_id = normalize_id(user_id)
+        # Product seller ids are stored as given; match the requested and the
+        # normalized spelling. Products saved under any other casing (e.g.
+        # "Wh1" when asked for "WH1") are not counted; see the README.
+        products_count = await db.products.count_documents({"seller_id": {"$in": list({user_id, wholesaler_id})}})
+
+        # wholesaler_id is stored normalized, so this match is served by the
+        # (wholesaler_id, created_at) index and only touches this wholesaler's purchases
+        match: Dict[str, Any] = {"wholesaler_id": wholesaler_id}
+        if start_date or end_date:
+            created: Dict[str, str] = {}
+            if start_date:
+                created["$gte"] = iso_utc(start_date)
+            if end_date:
+                created["$lt"] = iso_utc(end_date)
+            match["created_at"] = created
+
+        totals = await db.purchases.aggregate([
+            {"$match": match},
+            {"$group": {"_id": None, "orders_count": {"$sum": 1}, "total_revenue": {"$sum": "$total_amount"}}},
+        ]).to_list(1)
+        orders_count = totals[0]["orders_count"] if totals else 0
+        total_revenue = totals[0]["total_revenue"] if totals else 0
         result = {
             "products_count": products_count,
             "orders_count": orders_count,
             "total_revenue": total_revenue
         }
-        print(f"✅ FINAL: {result}")
+        log.debug("dashboard.wholesaler", user_id=user_id, **result)
         return result
-    except Exception as e:
-        print(f"❌ SIMPLE DASHBOARD ERROR: {str(e)}")
+    except Exception:
+        log.exception("dashboard.wholesaler_failed", user_id=user_id)
         return {"products_count": 0, "orders_count": 0, "total_revenue": 0}
 
+# ================= LIVE UPDATES (WebSocket) ===================
+# Clients connect to /ws (optionally ?token=<JWT>) and send
+#   {"action": "subscribe" | "unsubscribe", "topics": ["product:<id>", ...]}
+# Topics: product:<id> and order:<id> are open; seller:<id> and user:<id>
+# need a token for that user. Events arrive as {"topic", "type", "data", "ts"}.
+bus = PubSub()
+
+def topic_allowed(topic: str, user_id: Optional[str]) -> bool:
+    kind, _, ident = topic.partition(":")
+    if not ident:
+        return False
+    if kind in ("product", "order"):
+        return True
+    if kind in ("seller", "user"):
+        return user_id == ident
+    return False
+
+def order_events(order: dict, stock: bool = True):
+    summary = {k: order.get(k) for k in ("id", "user_id", "total_amount", "order_status", "created_at")}
+    yield f"order:{order['id']}", "order.created", {**summary, "items": order.get("items", [])}
+    yield f"user:{order['user_id']}", "order.created", {**summary, "items": order.get("items", [])}
+    by_seller: Dict[str, list] = {}
+    for item in order.get("items", []):
+        by_seller.setdefault(item.get("seller_id"), []).append(item)
+        if stock:
+            yield f"product:{item['product_id']}", "product.stock", {"id": item["product_id"], "stock_delta": -item["quantity"]}
+    for seller_id, items in by_seller.items():
+        yield f"seller:{seller_id}", "order.created", {**summary, "items": items}
+
+def purchase_events(purchase: dict, stock: bool = True, wholesaler_id: Optional[str] = None):
+    # Purchases store wholesaler_id normalized; pass the wholesaler's stored id
+    # when it is known so the topic matches what that user subscribed to
+    for user_id in (purchase.get("retailer_id"), wholesaler_id or purchase.get("wholesaler_id")):
+        yield f"seller:{user_id}", "purchase.completed", purchase
+    if stock:
+        for item in purchase.get("items", []):
+            yield f"product:{item['product_id']}", "product.stock", {"id": item["product_id"], "stock_delta": -item["quantity"]}
+
+def product_events(product: dict):
+    yield f"product:{product['id']}", "product.updated", product
+    if product.get("seller_id"):
+        yield f"seller:{product['seller_id']}", "product.updated", product
+
+def feedback_events(feedback: dict, summary: Optional[dict] = None):
+    yield f"product:{feedback['product_id']}", "feedback.saved", {"feedback": feedback, "rating": summary}
+
+def publish_events(events):
+    """Publish to local subscribers, unless the change stream is the source of events."""
+    if not WS_CHANGE_STREAM:
+        bus.publish_many(events)
+
+def change_events(change: dict):
+    """Map a change-stream event onto the same topics the handlers publish to."""
+    coll = change["ns"]["coll"]
+    doc = change.get("fullDocument") or {}
+    doc.pop("_id", None)
+    if coll == "orders" and change["operationType"] == "insert":
+        # Stock changes arrive separately as product updates
+        return order_events(doc, stock=False)
+    if coll == "purchases" and change["operationType"] == "insert":
+        return purchase_events(doc, stock=False)
+    if coll == "products" and doc.get("id"):
+        return product_events(doc)
+    if coll == "feedback" and doc.get("product_id"):
+        return feedback_events(doc)
+    return ()
+
+async def watch_changes():
+    """Feed the bus from a MongoDB change stream so every worker sees every write."""
+    pipeline = [{"$match": {
+        "ns.coll": {"$in": ["orders", "purchases", "products", "feedback"]},
+        "operationType": {"$in": ["insert", "update", "replace"]},
+    }}]
+    resume_token = None
+    while True:
+        try:
+            async with db.watch(pipeline, full_document="updateLookup", resume_after=resume_token) as stream:
+                logger.info("Watching change stream for live updates")
+                async for change in stream:
+                    resume_token = stream.resume_token
+                    bus.publish_many(change_events(change))
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            logger.exception("Change stream failed; retrying in 5s")
+            await asyncio.sleep(5)
+
+@app.websocket("/ws")
+async def live_updates(websocket: WebSocket, token: Optional[str] = None):
+    user_id = None
+    if token:
+        try:
+            user = await get_cached_user(decode_token(token).get("user_id", ""))
+        except HTTPException:
+            user = None
+        if user is None:
+            await websocket.close(code=4401)
+            return
+        user_id = user["id"]
+
+    await websocket.accept()
+    subscriber = Subscriber(queue_size=WS_QUEUE_SIZE, user_id=user_id)
+    bus.connect(subscriber)
+
+    async def reader():
+        while True:
+            try:
+                # A binary frame has no "text" and raises KeyError
+                message = json.loads(await websocket.receive_text())
+                action = message.get("action")
+                topics = message.get("topics") or []
+                if not isinstance(topics, list) or not all(isinstance(t, str) for t in topics):
+                    raise TypeError("topics must be a list of strings")
+            except WebSocketDisconnect:
+                return
+            except (ValueError, TypeError, KeyError, AttributeError):
+                subscriber.offer({"type": "error", "detail": "expected a JSON object with a list of topic strings"})
+                continue
+            if action == "subscribe":
+                denied = [t for t in topics if not topic_allowed(t, user_id)]
+                for topic in topics:
+                    if topic not in denied and len(subscriber.topics) < WS_MAX_TOPICS:
+                        bus.subscribe(subscriber, topic)
+                subscriber.offer({"type": "subscribed", "topics": sorted(subscriber.topics), "denied": denied})
+            elif action == "unsubscribe":
+                for topic in topics:
+                    bus.unsubscribe(subscriber, topic)
+                subscriber.offer({"type": "subscribed", "topics": sorted(subscriber.topics), "denied": []})
+            elif action == "ping":
+                subscriber.offer({"type": "pong"})
+            else:
+                subscriber.offer({"type": "error", "detail": f"unknown action {action!r}"})
+
+    async def writer():
+        # The only task that sends, so replies and events never interleave
+        while True:
+            message = await subscriber.queue.get()
+            await websocket.send_text(json.dumps(message, default=str))
+
+    tasks = [
+        asyncio.create_task(reader()),
+        asyncio.create_task(writer()),
+        asyncio.create_task(subscriber.closed.wait()),
+    ]
+    try:
+        done, _ = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+        for task in done:
+            error = None if task.cancelled() else task.exception()
+            if error is not None and not isinstance(error, WebSocketDisconnect):
+                log.error("ws.failed", user_id=user_id, exc_info=error)
+    finally:
+        bus.disconnect(subscriber)
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        # 1013 when it was too slow to keep up; the client should reconnect and re-fetch
+        try:
+            await websocket.close(code=1013 if subscriber.closed.is_set() else 1000)
+        except Exception:
+            pass  # the client already went away
+
 # ================= SHOPS ============================
 @api.get("/shops")
 async def get_shops():
@@ -1272,7 +2608,4 @@ async def get_shops():
 # ----------------- REGISTER ROUTES -------------------
 app.include_router(api)
 
-print("🔥 USING THIS EXACT SERVER FILE:", __file__)
-print("🔥 ROUTES LOADED:")
-for r in app.routes:
-    print(" →", r.path, r.methods if hasattr(r, 'methods') else '')
+startup_report.mark_imported()
@@ -0,0 +1,171 @@
+# startup.py
+"""Startup timing and readiness gating.
+
+The server accepts connections as soon as the process is up. Warm-up (index
+builds and the in-memory retailer and search indexes) then runs concurrently
+in the background; a step that fails (say MongoDB is briefly unreachable at
+boot) is retried with exponential backoff until it succeeds. Until every step
+has succeeded:
+
+* ``/api/ready`` answers 503, so a load balancer or orchestrator keeps
+  traffic away from the new worker;
+* ``ReadinessGate`` holds other HTTP requests for up to ``timeout`` seconds
+  and then answers 503 with ``Retry-After``. Probe paths and WebSockets pass
+  straight through.
+
+``StartupReport`` records how long the module import and each warm-up step
+took, and the time from import to ready.
+"""
+import asyncio
+import json
+import logging
+import time
+from typing import Awaitable, Callable, Dict, Iterable, Optional
+
+logger = logging.getLogger("startup")
+
+
+class StartupReport:
+    def __init__(self, started: Optional[float] = None):
+        self.started = started if started is not None else time.perf_counter()
+        self.imported: Optional[float] = None
+        self.warmup_started: Optional[float] = None
+        self.ready_at: Optional[float] = None
+        self.steps: Dict[str, dict] = {}
+        self.failed = False  # the last attempt of some step failed; it is being retried
+        self.retry_in: Optional[float] = None
+        self._done: Optional[asyncio.Event] = None
+
+    def mark_imported(self):
+        self.imported = time.perf_counter()
+
+    def begin(self):
+        """Warm-up is starting; the gate closes until ``finish``."""
+        self.warmup_started = time.perf_counter()
+        self.ready_at = None
+        self.failed = False
+        self.retry_in = None
+        self.steps.clear()
+        self._done = asyncio.Event()
+
+    async def step(self, name: str, work: Awaitable):
+        """Run and time one warm-up step; a failure is recorded and keeps the server unready."""
+        start = time.perf_counter()
+        attempts = self.steps.get(name, {}).get("attempts", 0) + 1
+        entry = self.steps[name] = {"status": "running", "attempts": attempts}
+        try:
+            result = await work
+            entry["status"] = "ok"
+            return result
+        except Exception as e:
+            entry.update(status="failed", error=str(e))
+            self.failed = True
+        finally:
+            entry["seconds"] = round(time.perf_counter() - start, 4)
+
+    async def run(
+        self,
+        steps: Dict[str, Callable[[], Awaitable]],
+        retry_delay: float = 1.0,
+        max_retry_delay: float = 30.0,
+    ):
+        """Run ``steps`` concurrently, retrying the failed ones until all succeed, then ``finish``.
+
+        Each value is called for a fresh awaitable on every attempt; the delay
+        between rounds doubles from ``retry_delay`` up to ``max_retry_delay``.
+        """
+        pending = dict(steps)
+        delay = retry_delay
+        while True:
+            self.retry_in = None
+            await asyncio.gather(*(self.step(name, work()) for name, work in pending.items()))
+            pending = {name: work for name, work in pending.items() if self.steps[name]["status"] != "ok"}
+            if not pending:
+                break
+            logger.warning(f"Warm-up steps failed ({', '.join(pending)}); retrying in {delay:g}s")
+            self.retry_in = delay
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, max_retry_delay)
+        self.failed = False
+        self.finish()
+
+    def finish(self):
+        if not self.failed:
+            self.ready_at = time.perf_counter()
+        if self._done is not None:
+            self._done.set()
+
+    @property
+    def ready(self) -> bool:
+        return self.ready_at is not None
+
+    @property
+    def state(self) -> str:
+        if self.ready:
+            return "ready"
+        if self._done is None:
+            return "not_started"
+        return "retrying" if self.failed else "warming_up"
+
+    @property
+    def gated(self) -> bool:
+        """True while requests should be held; never before warm-up begins (e.g. no lifespan)."""
+        return self._done is not None and not self.ready
+
+    async def wait(self, timeout: float) -> bool:
+        if self._done is None:
+            return True
+        try:
+            await asyncio.wait_for(asyncio.shield(self._done.wait()), timeout)
+        except asyncio.TimeoutError:
+            pass
+        return self.ready
+
+    def as_dict(self) -> dict:
+        def since(t: Optional[float], origin: Optional[float]):
+            return round(t - origin, 4) if t is not None and origin is not None else None
+
+        return {
+            "ready": self.ready,
+            "state": self.state,
+            "retry_in_s": self.retry_in,
+            "import_s": since(self.imported, self.started),
+            "warmup_s": since(self.ready_at, self.warmup_started),
+            "time_to_ready_s": since(self.ready_at, self.started),
+            "steps": {name: dict(entry) for name, entry in self.steps.items()},
+        }
+
+
+class ReadinessGate:
+    """Pure ASGI middleware holding HTTP requests while the server warms up."""
+
+    def __init__(self, app, report: StartupReport, exempt: Iterable[str] = (), timeout: float = 10.0):
+        self.app = app
+        self.report = report
+        self.exempt = frozenset(exempt)
+        self.timeout = timeout
+
+    async def __call__(self, scope, receive, send):
+        if (
+            scope["type"] != "http"
+            or not self.report.gated
+            or scope["path"] in self.exempt
+        ):
+            await self.app(scope, receive, send)
+            return
+
+        if not self.report.failed and await self.report.wait(self.timeout):
+            await self.app(scope, receive, send)
+            return
+
+        body = json.dumps({"detail": "Service is starting up, retry shortly"}).encode()
+        await send({
+            "type": "http.response.start",
+            "status": 503,
+            "headers": [
+                (b"content-type", b"application/json"),
+                (b"content-length", str(len(body)).encode()),
+                (b"retry-after", b"1"),
+            ],
+        })
+        await send({"type": "http.response.body", "body": body})
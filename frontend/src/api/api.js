@@ -24,6 +24,10 @@ const api = axios.create({
 // Request interceptor
 api.interceptors.request.use(
   (config) => {
+    const token = localStorage.getItem("token");
+    if (token && !config.headers.Authorization) {
+      config.headers.Authorization = `Bearer ${token}`;
+    }
     console.log(`🔄 ${config.method?.toUpperCase()} ${config.url}`, config.params || config.data);
     return config;
   },
@@ -33,6 +37,14 @@ api.interceptors.request.use(
   }
 );
 
+// Called when a request sent with a token comes back 401 (expired or revoked
+// token); AuthContext registers a handler that logs the user out
+let unauthorizedHandler = null;
+
+export const setUnauthorizedHandler = (handler) => {
+  unauthorizedHandler = handler;
+};
+
 // Response interceptor
 api.interceptors.response.use(
   (response) => {
@@ -50,6 +62,11 @@ api.interceptors.response.use(
     if (error.code === 'ERR_NETWORK') {
       console.error("Network error - check if backend is running on", API_URL);
     }
+
+    const sentToken = error.config?.headers?.Authorization?.startsWith("Bearer ");
+    if (error.response?.status === 401 && sentToken && unauthorizedHandler) {
+      unauthorizedHandler(error);
+    }
     
     return Promise.reject(error);
   }
@@ -89,9 +106,27 @@ export const categoriesAPI = {
 // ======================================================
 // ⭐ PRODUCTS API
 // ======================================================
+// /products returns one page at a time with the next page's cursor in the
+// X-Next-Cursor header; follow it so callers still get every product
+const PRODUCTS_PAGE_SIZE = 1000;
+
+async function getAllPages(params = {}) {
+  const data = [];
+  let cursor;
+  let response;
+  do {
+    response = await api.get(`/products`, {
+      params: { limit: PRODUCTS_PAGE_SIZE, ...params, ...(cursor ? { cursor } : {}) },
+    });
+    data.push(...response.data);
+    cursor = response.headers["x-next-cursor"];
+  } while (cursor);
+  return { ...response, data };
+}
+
 export const productsAPI = {
-  // GET with filters
-  getAll: (params) => api.get(`/products`, { params }),
+  // GET with filters (every page)
+  getAll: (params) => getAllPages(params),
 
   // GET by ID
   getById: (id) => {
@@ -103,13 +138,14 @@ export const productsAPI = {
 },
 
 
+  // GET several products in one request
+  getByIds: (ids) => api.post(`/products/batch`, { ids }),
+
   // GET retailer products only
   getByRetailer: (retailerId) =>
-    api.get(`/products`, {
-      params: {
-        seller_id: retailerId,
-        available_only: true,
-      },
+    getAllPages({
+      seller_id: retailerId,
+      available_only: true,
     }),
 
   create: (data) => api.post(`/products`, data),
@@ -123,6 +159,10 @@ export const productsAPI = {
 export const cartAPI = {
   getCart: (userId) => api.get(`/cart/${userId}`),
 
+  // Cart lines joined with product details and line totals
+  getCartWithProducts: (userId) =>
+    api.get(`/cart/${userId}`, { params: { expand: "products" } }),
+
   addItem: (userId, data) => api.post(`/cart/${userId}`, data),
 
   // FIXED: Use query parameter correctly
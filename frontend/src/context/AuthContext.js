@@ -1,6 +1,6 @@
 import React, { createContext, useState, useContext, useEffect } from "react";
 import { dashboardAPI } from "@/api/api";   // ⭐ FIXED — correct API
-import { authAPI } from "@/api/api";
+import { authAPI, setUnauthorizedHandler } from "@/api/api";
 
 const AuthContext = createContext(null);
 
@@ -87,6 +87,18 @@ export const AuthProvider = ({ children }) => {
     localStorage.removeItem("user");
   };
 
+  // ------------------------------------------------------
+  // EXPIRED TOKEN: log out and send the user back to sign in
+  // ------------------------------------------------------
+  useEffect(() => {
+    setUnauthorizedHandler(() => {
+      if (!localStorage.getItem("token")) return;
+      logout();
+      window.location.assign("/auth");
+    });
+    return () => setUnauthorizedHandler(null);
+  }, []);
+
   // ------------------------------------------------------
   // UPDATE USER
   // ------------------------------------------------------
@@ -4,7 +4,7 @@ import { useAuth } from "@/context/AuthContext";
 import Navbar from "@/components/Navbar";
 import { Button } from "@/components/ui/button";
 import { Card, CardContent } from "@/components/ui/card";
-import { cartAPI, productsAPI } from "@/api/api";
+import { cartAPI } from "@/api/api";
 import { toast } from "sonner";
 import { Trash2, Plus, Minus, ShoppingBag } from "lucide-react";
 
@@ -25,44 +25,35 @@ const CartPage = () => {
   const formatPrice = (price) =>
     "₹" + Number(price).toLocaleString("en-IN", { minimumFractionDigits: 2 });
 
-  // Fetch + attach product details
+  // Fetch cart with product details attached by the backend
   const fetchCart = async () => {
     setLoading(true);
     try {
-      const response = await cartAPI.getCart(user.id);
+      const response = await cartAPI.getCartWithProducts(user.id);
 
       const items = Array.isArray(response.data)
         ? response.data
         : response.data?.items || [];
 
-      const enriched = await Promise.all(
-        items.map(async (item) => {
-          const productId = item.product_id;
-
-          let product = item.product;
-          if (!product) {
-            try {
-              const resp = await productsAPI.getById(productId);
-              product = resp.data;
-            } catch {
-              product = {
-                id: productId,
-                name: "Unnamed Product",
-                price: 0,
-                stock: 0,
-                unit: "",
-                image_url: "",
-              };
-            }
-          }
-
-          return {
-            ...item,
-            id: productId, // stable id
-            product,
-          };
-        })
-      );
+      const enriched = items.map((item) => {
+        const productId = item.product_id;
+
+        // A missing product was deleted since it was added to the cart
+        const product = item.product || {
+          id: productId,
+          name: "Unnamed Product",
+          price: 0,
+          stock: 0,
+          unit: "",
+          image_url: "",
+        };
+
+        return {
+          ...item,
+          id: productId, // stable id
+          product,
+        };
+      });
 
       setCartItems(enriched);
 
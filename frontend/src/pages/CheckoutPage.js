@@ -10,7 +10,7 @@ import { Label } from "@/components/ui/label";
 import { Card, CardContent, CardHeader, CardTitle } from "@/components/ui/card";
 import { RadioGroup, RadioGroupItem } from "@/components/ui/radio-group";
 
-import { cartAPI, productsAPI, ordersAPI, healthAPI } from "@/api/api";
+import { cartAPI, ordersAPI, healthAPI } from "@/api/api";
 import { toast } from "sonner";
 import { Wallet, ShoppingCart, CreditCard } from "lucide-react";
 
@@ -52,7 +52,7 @@ const CheckoutPage = () => {
       }
 
       console.log("🛒 Fetching cart for user:", user.id);
-      const response = await cartAPI.getCart(user.id);
+      const response = await cartAPI.getCartWithProducts(user.id);
 
       const rawItems = Array.isArray(response.data)
         ? response.data
@@ -66,31 +66,19 @@ const CheckoutPage = () => {
         return;
       }
 
-      const enriched = await Promise.all(
-        rawItems.map(async (item) => {
-          try {
-            const p = await productsAPI.getById(item.product_id);
-            return { 
-              ...item, 
-              product: p.data,
-              quantity: Number(item.quantity) || 1
-            };
-          } catch {
-            return {
-              ...item,
-              product: {
-                id: item.product_id,
-                name: "Unknown Product",
-                price: 0,
-                image_url: "",
-                unit: "",
-                seller_id: "unknown"
-              },
-              quantity: Number(item.quantity) || 1
-            };
-          }
-        })
-      );
+      // Products are joined server-side; a missing one was deleted
+      const enriched = rawItems.map((item) => ({
+        ...item,
+        product: item.product || {
+          id: item.product_id,
+          name: "Unknown Product",
+          price: 0,
+          image_url: "",
+          unit: "",
+          seller_id: "unknown"
+        },
+        quantity: Number(item.quantity) || 1
+      }));
 
       setCartItems(enriched);
     } catch (err) {
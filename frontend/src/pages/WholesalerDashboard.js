@@ -63,12 +63,11 @@ export default function WholesalerDashboard() {
       setLoading(true);
 
       const [prodRes, catRes] = await Promise.all([
-        productsAPI.getAll({ available_only: false }),
+        productsAPI.getAll({ seller_id: userId, available_only: false }),
         categoriesAPI.getAll(),
       ]);
 
-      const allProducts = prodRes.data ?? prodRes;
-      const mine = Array.isArray(allProducts) ? allProducts.filter((p) => p.seller_id === userId) : [];
+      const mine = Array.isArray(prodRes.data) ? prodRes.data : [];
 
       setProducts(mine);
       setCategories(catRes.data ?? []);
@@ -0,0 +1,57 @@
+import asyncio
+import os
+import sys
+from pathlib import Path
+
+import pytest
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent / "backend"
+sys.path.insert(0, str(BACKEND_DIR))
+os.environ.setdefault("LOG_LEVEL", "WARNING")
+
+
+def run(coro):
+    """Run ``coro`` on a fresh event loop (the suite has no async plugin)."""
+    return asyncio.run(coro)
+
+
+@pytest.fixture
+def server():
+    """The server module bound to an empty in-memory database with every declared index."""
+    mongomock_motor = pytest.importorskip("mongomock_motor")
+    import server
+    from indexes import create_indexes
+
+    server.client = mongomock_motor.AsyncMongoMockClient()
+    server.db = server.client["livemart_test"]
+    run(create_indexes(server.db))
+    server.product_cache.clear()
+    server.user_cache.clear()
+    server.token_cache.clear()
+    yield server
+    server.client = None
+    server.db = None
+
+
+@pytest.fixture
+def products(server):
+    """Insert products: ``products(apple=5, milk=2)``, stock by id, sold by ``seller_id`` (default ret1)."""
+    def insert(seller_id: str = "ret1", price: float = 10.0, **stock):
+        run(server.db.products.insert_many([
+            {"id": pid, "name": pid.title(), "price": price, "stock": qty, "seller_id": seller_id}
+            for pid, qty in stock.items()
+        ]))
+    return insert
+
+
+@pytest.fixture
+def users(server):
+    """Insert users by id and role: ``users(ret1="retailer", wh1="wholesaler")``."""
+    def insert(**roles):
+        docs = [
+            {"id": uid, "email": f"{uid}@example.com", "name": uid.title(), "role": role}
+            for uid, role in roles.items()
+        ]
+        run(server.db.users.insert_many(docs))
+        return docs
+    return insert
@@ -0,0 +1,68 @@
+import hashlib
+import time
+
+import pytest
+
+from tests.conftest import run
+
+from cache import TTLCache  # noqa: E402
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def token_for(server, user_id, expires_in=3600):
+    return server.jwt.encode({"user_id": user_id, "exp": time.time() + expires_in}, server.SECRET_KEY,
+                             algorithm=server.ALGO)
+
+
+def test_decode_token_returns_claims_and_caches_them(server, monkeypatch):
+    token = server.create_token({"user_id": "ret1"})
+    assert server.decode_token(token)["user_id"] == "ret1"
+
+    # A second decode is served from the cache without verifying again
+    monkeypatch.setattr(server.jwt, "decode", lambda *a, **k: pytest.fail("token verified twice"))
+    assert server.decode_token(token)["user_id"] == "ret1"
+
+
+@pytest.mark.parametrize("make", [
+    lambda server: token_for(server, "ret1", expires_in=-10),
+    lambda server: token_for(server, "ret1")[:-2] + "xx",
+    lambda server: "not-a-jwt",
+])
+def test_bad_or_expired_tokens_are_401(server, make):
+    with pytest.raises(server.HTTPException) as exc:
+        server.decode_token(make(server))
+    assert exc.value.status_code == 401
+
+
+def test_cached_claims_expire_with_the_token(server, monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(server, "token_cache", TTLCache(ttl=24 * 3600, clock=clock))
+    token = token_for(server, "ret1", expires_in=60)
+    key = hashlib.sha256(token.encode()).digest()
+
+    server.decode_token(token)
+    clock.now += 55
+    assert server.token_cache.get(key) is not None
+    clock.now += 10  # past exp, long before the cache's default TTL
+    assert server.token_cache.get(key) is None
+
+
+def test_resolve_user_rejects_another_users_token(server, users):
+    users(ret1="retailer", ret2="retailer")
+    auth_user = run(server.optional_user(server.HTTPAuthorizationCredentials(
+        scheme="Bearer", credentials=token_for(server, "ret1"),
+    )))
+
+    assert run(server.resolve_user("ret1", auth_user))["id"] == "ret1"
+    with pytest.raises(server.HTTPException) as exc:
+        run(server.resolve_user("ret2", auth_user))
+    assert exc.value.status_code == 403
+    # Without a token (older clients) the uid is looked up directly
+    assert run(server.resolve_user("ret2", None))["id"] == "ret2"
@@ -0,0 +1,74 @@
+import asyncio
+
+from tests.conftest import run
+
+UID = "cust-0001"
+
+
+def cart_lines(server):
+    cart = run(server.db.cart.find_one({"user_id": UID}))
+    return {it["product_id"]: it["quantity"] for it in cart["items"]}
+
+
+def test_add_creates_then_bumps_the_line(server, products):
+    products(apple=100)
+    run(server.add_to_cart(UID, {"product_id": "apple", "quantity": 2}))
+    cart = run(server.add_to_cart(UID, {"product_id": "apple", "quantity": 3}))
+    assert cart["items"] == [{"product_id": "apple", "quantity": 5}]
+    assert cart["schema_version"] == server.version_stamp("cart")["schema_version"]
+
+
+def test_concurrent_adds_of_one_product_keep_every_quantity(server, products):
+    products(apple=100)
+
+    async def race():
+        await asyncio.gather(*(server.add_to_cart(UID, {"product_id": "apple", "quantity": 1}) for _ in range(10)))
+
+    # mongomock serializes these, so the real race is only exercised on a
+    # replica set; this still pins the bump/append/upsert fallbacks
+    run(race())
+    assert cart_lines(server) == {"apple": 10}
+    assert run(server.db.cart.count_documents({"user_id": UID})) == 1
+
+
+def test_concurrent_adds_of_different_products_keep_every_line(server, products):
+    products(apple=100, milk=100, bread=100)
+
+    async def race():
+        await asyncio.gather(*(
+            server.add_to_cart(UID, {"product_id": pid, "quantity": 2}) for pid in ("apple", "milk", "bread", "apple")
+        ))
+
+    run(race())
+    assert cart_lines(server) == {"apple": 4, "milk": 2, "bread": 2}
+
+
+def test_append_that_loses_the_race_falls_back_to_a_bump(server, products, monkeypatch):
+    # The cart already holds the line, so the guarded upsert cannot match and
+    # its insert hits the unique user_id index; the retry bumps instead
+    products(apple=100)
+    run(server.db.cart.insert_one({"user_id": UID, "items": [{"product_id": "apple", "quantity": 1}]}))
+    collection_cls = type(server.db.cart)
+    find_one_and_update = collection_cls.find_one_and_update
+    calls = []
+
+    async def first_bump_misses(self, filter, update, *args, **kwargs):
+        calls.append(update)
+        if len(calls) == 1:
+            return None
+        return await find_one_and_update(self, filter, update, *args, **kwargs)
+
+    monkeypatch.setattr(collection_cls, "find_one_and_update", first_bump_misses)
+    cart = run(server.add_to_cart(UID, {"product_id": "apple", "quantity": 2}))
+
+    assert [next(iter(u)) for u in calls] == ["$inc", "$push", "$inc"]
+    assert cart["items"] == [{"product_id": "apple", "quantity": 3}]
+
+
+def test_add_to_a_legacy_string_quantity_coerces_it(server, products):
+    products(apple=100, milk=100)
+    run(server.db.cart.insert_one({"user_id": UID, "items": [
+        {"product_id": "apple", "quantity": "2"}, {"product_id": "milk", "quantity": "1"},
+    ]}))
+    cart = run(server.add_to_cart(UID, {"product_id": "apple", "quantity": 3}))
+    assert cart["items"] == [{"product_id": "apple", "quantity": 5}, {"product_id": "milk", "quantity": "1"}]
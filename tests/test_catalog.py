@@ -0,0 +1,107 @@
+import json
+
+import pytest
+from fastapi.testclient import TestClient
+
+from tests.conftest import run
+
+import catalog  # noqa: E402
+
+
+async def chunks(*parts: bytes):
+    for part in parts:
+        yield part
+
+
+async def collect(agen):
+    return [item async for item in agen]
+
+
+def rows(fmt: str, *parts: bytes):
+    return run(collect(catalog.iter_rows(catalog.iter_lines(chunks(*parts)), fmt)))
+
+
+def test_lines_are_split_across_chunks():
+    lines = run(collect(catalog.iter_lines(chunks(b"\xef\xbb\xbfname\r\nfir", b"st\nsec", b"ond"))))
+    assert lines == ["name", "first", "second"]
+
+
+def test_ndjson_rows_report_errors_with_row_numbers():
+    body = b'{"name": "Apple"}\n\nnot json\n[1, 2]\n{"name": "Milk"}\n'
+    result = rows("ndjson", body)
+    assert [(n, row, error is not None) for n, row, error in result] == [
+        (1, {"name": "Apple"}, False),
+        (2, None, True),
+        (3, None, True),
+        (4, {"name": "Milk"}, False),
+    ]
+    assert result[2][2] == "expected a JSON object"
+
+
+def test_csv_rows_handle_quotes_and_bad_rows():
+    body = (
+        b"Name,Price,Description\n"
+        b'Apple,10,"crisp,\nred"\n'
+        b"Milk,20,fresh,extra\n"
+        b'Bread,30,"never closed\n'
+    )
+    assert rows("csv", body) == [
+        (1, {"name": "Apple", "price": "10", "description": "crisp,\nred"}, None),
+        (2, None, "expected 3 columns, got 4"),
+        (3, None, "unterminated quoted field"),
+    ]
+
+
+@pytest.mark.parametrize("row, error", [
+    ({"price": "1"}, "name is required"),
+    ({"name": "A"}, "price is required"),
+    ({"name": "A", "price": "-1"}, "price must be a non-negative number"),
+    ({"name": "A", "price": "abc"}, "price must be a number, got 'abc'"),
+    ({"name": "A", "price": "1", "stock": "2.5"}, "stock must be a whole number"),
+    ({"name": "A", "price": True}, "price must be a number"),
+    ({"name": "A", "price": "1", "seller_id": "someone-else"}, "seller_id does not match the import's seller"),
+])
+def test_invalid_rows_are_rejected(row, error):
+    with pytest.raises(catalog.RowError) as exc:
+        catalog.coerce_product(row, "ret1")
+    assert str(exc.value) == error
+
+
+def test_valid_row_is_coerced():
+    row = {"name": " Apple ", "price": "10.505", "stock": "3", "unit": "kg", "rating": "5", "seller_id": "ret1"}
+    assert catalog.coerce_product(row, "ret1") == {
+        "name": "Apple", "seller_id": "ret1", "unit": "kg", "price": 10.51, "stock": 3,
+    }
+
+
+def test_import_writes_good_rows_and_reports_bad_ones(server):
+    run(server.db.users.insert_many([
+        {"id": "ret1", "email": "ret1@example.com", "name": "Retailer", "role": "retailer"},
+        {"id": "ret2", "email": "ret2@example.com", "name": "Other", "role": "retailer"},
+    ]))
+    run(server.db.products.insert_many([
+        {"id": "mine", "name": "Old name", "price": 1.0, "stock": 1, "seller_id": "ret1"},
+        {"id": "theirs", "name": "Theirs", "price": 1.0, "stock": 1, "seller_id": "ret2"},
+    ]))
+    lines = [
+        {"id": "mine", "name": "New name", "price": 5, "stock": 2},
+        {"name": "Fresh", "price": 3},
+        {"name": "No price"},
+        {"id": "mine", "name": "Again", "price": 1},
+        {"id": "theirs", "name": "Hijack", "price": 1},
+    ]
+    body = "\n".join(json.dumps(line) for line in lines).encode()
+
+    response = TestClient(server.app).post("/api/products/import", params={"seller_id": "ret1", "format": "ndjson"}, content=body)
+    summary = response.json()
+
+    assert response.status_code == 200
+    assert (summary["rows"], summary["inserted"], summary["updated"], summary["failed"]) == (5, 1, 1, 3)
+    assert [(e["row"], e["error"]) for e in summary["errors"]] == [
+        (3, "price is required"),
+        (4, "duplicate id mine (first seen on row 1)"),
+        (5, "id belongs to another seller's product"),
+    ]
+    assert run(server.db.products.find_one({"id": "mine"}))["name"] == "New name"
+    assert run(server.db.products.find_one({"id": "theirs"}))["name"] == "Theirs"
+    assert run(server.db.seller_stats.find_one({"seller_id": "ret1"}))["products_count"] == 1
@@ -0,0 +1,66 @@
+from tests.conftest import run
+
+
+def seed_wholesaler(server, products):
+    products(seller_id="wh1", p1=5, p2=5)
+    products(seller_id="wh2", p3=5)
+    run(server.db.purchases.insert_many([
+        {"id": "o1", "wholesaler_id": "wh1", "total_amount": 100.0, "created_at": "2026-01-01T00:00:00+00:00"},
+        {"id": "o2", "wholesaler_id": "wh1", "total_amount": 50.0, "created_at": "2026-02-01T00:00:00+00:00"},
+    ]))
+
+
+def test_wholesaler_dashboard_counts_match_for_any_id_case(server, products):
+    seed_wholesaler(server, products)
+    expected = {"products_count": 2, "orders_count": 2, "total_revenue": 150.0}
+    for user_id in ("wh1", "WH1", " Wh1 "):
+        assert run(server.wholesaler_dashboard(user_id=user_id, start_date=None, end_date=None)) == expected
+
+
+def test_purchase_events_use_the_wholesalers_stored_id(server):
+    purchase = {"id": "o1", "retailer_id": "ret1", "wholesaler_id": "wh-a", "items": []}
+    topics = [topic for topic, _, _ in server.purchase_events(purchase, wholesaler_id="WH-A")]
+    assert topics == ["seller:ret1", "seller:WH-A"]
+    assert server.topic_allowed("seller:WH-A", "WH-A")
+
+
+def rollups(server):
+    docs = run(server.db.seller_stats.find({}, {"_id": 0}).sort("seller_id", 1).to_list(None))
+    return {d.pop("seller_id"): d for d in docs}
+
+
+def test_incremental_rollups_match_a_rebuild(server, products, users):
+    products(seller_id="ret1", apple=50, milk=50)
+    products(seller_id="ret2", price=4.5, bread=50)
+    users(cust1="customer")
+    run(server.rebuild_seller_stats())  # the fixture seeds products without counting them
+    for lines in ([("apple", 2)], [("apple", 1), ("bread", 3)], [("milk", 4), ("bread", 1)]):
+        payload = {"items": [{"product_id": p, "quantity": q} for p, q in lines], "delivery_address": "Somewhere"}
+        run(server.place_order("cust1", payload, auth_user=None))
+    run(server.delete_product("milk"))
+    incremental = rollups(server)
+
+    run(server.db.seller_stats.delete_many({}))
+    run(server.rebuild_seller_stats(batch_size=1))
+    assert rollups(server) == incremental
+    assert incremental["ret1"] == {"orders_count": 3, "revenue": 70.0, "products_count": 1}
+
+
+def test_retailer_dashboard_aggregates_live_without_a_rollup(server, products, users):
+    products(seller_id="ret1", apple=50, milk=50)
+    users(cust1="customer")
+    run(server.rebuild_seller_stats())
+    run(server.place_order("cust1", {"items": [{"product_id": "apple", "quantity": 2}], "delivery_address": "X"},
+                           auth_user=None))
+    expected = run(server.retailer_dashboard(user_id="ret1"))
+
+    run(server.db.seller_stats.delete_many({}))
+    assert run(server.retailer_dashboard(user_id="ret1")) == expected
+    assert (expected["products_count"], expected["orders_count"], expected["total_revenue"]) == (2, 1, 20.0)
+
+
+def test_moving_a_product_moves_its_count(server, products):
+    products(seller_id="ret1", apple=5)
+    run(server.bump_products_count("ret1", 1))
+    run(server.update_product("apple", {"seller_id": "ret2"}))
+    assert {sid: r["products_count"] for sid, r in rollups(server).items()} == {"ret1": 0, "ret2": 1}
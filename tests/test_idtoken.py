@@ -0,0 +1,158 @@
+import time
+
+import pytest
+
+from tests.conftest import run
+
+jwt = pytest.importorskip("jwt")
+rsa = pytest.importorskip("cryptography.hazmat.primitives.asymmetric.rsa")
+
+from idtoken import GoogleTokenVerifier, JWKSCache, cache_lifetime  # noqa: E402
+
+AUDIENCE = "client-123.apps.googleusercontent.com"
+ISSUER = "https://accounts.google.com"
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+class StubJWKS:
+    """Stands in for the certs endpoint: serves the public half of ``keys``."""
+
+    def __init__(self, max_age: float = 3600.0):
+        self.keys = {}
+        self.max_age = max_age
+        self.fetches = 0
+
+    def add_key(self, kid: str):
+        self.keys[kid] = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+        return self.keys[kid]
+
+    def __call__(self, url):
+        self.fetches += 1
+        jwks = []
+        for kid, private_key in self.keys.items():
+            jwk = jwt.algorithms.RSAAlgorithm.to_jwk(private_key.public_key(), as_dict=True)
+            jwks.append({**jwk, "kid": kid, "alg": "RS256", "use": "sig"})
+        return {"keys": jwks}, self.max_age
+
+
+def sign(private_key, kid: str, **overrides) -> str:
+    now = int(time.time())
+    claims = {
+        "iss": ISSUER,
+        "aud": AUDIENCE,
+        "sub": "1234567890",
+        "email": "user@example.com",
+        "iat": now,
+        "exp": now + 3600,
+        **overrides,
+    }
+    return jwt.encode(claims, private_key, algorithm="RS256", headers={"kid": kid})
+
+
+@pytest.fixture
+def google():
+    stub = StubJWKS()
+    clock = Clock()
+    cache = JWKSCache("http://jwks.test/certs", fetch=stub, clock=clock)
+    return stub, clock, cache, GoogleTokenVerifier(AUDIENCE, cache)
+
+
+def test_valid_token_verifies(google):
+    stub, _, _, verifier = google
+    key = stub.add_key("k1")
+    claims = run(verifier.verify(sign(key, "k1")))
+    assert claims["email"] == "user@example.com"
+    assert stub.fetches == 1
+
+
+@pytest.mark.parametrize("overrides", [
+    {"aud": "someone-else.apps.googleusercontent.com"},
+    {"iss": "https://evil.example.com"},
+    {"exp": int(time.time()) - 3600, "iat": int(time.time()) - 7200},
+])
+def test_bad_claims_are_rejected(google, overrides):
+    stub, _, _, verifier = google
+    key = stub.add_key("k1")
+    with pytest.raises(jwt.InvalidTokenError):
+        run(verifier.verify(sign(key, "k1", **overrides)))
+
+
+def test_token_signed_by_another_key_is_rejected(google):
+    stub, _, _, verifier = google
+    stub.add_key("k1")
+    impostor = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    with pytest.raises(jwt.InvalidSignatureError):
+        run(verifier.verify(sign(impostor, "k1")))
+
+
+def test_unknown_kid_refetches_once(google):
+    stub, clock, cache, verifier = google
+    old = stub.add_key("k1")
+
+    async def scenario():
+        await verifier.verify(sign(old, "k1"))
+        # Google rotates in a new key; tokens signed with it arrive later
+        new = stub.add_key("k2")
+        clock.now += cache.unknown_kid_cooldown
+        await verifier.verify(sign(new, "k2"))
+        await verifier.verify(sign(new, "k2"))
+
+    run(scenario())
+    assert stub.fetches == 2
+
+
+def test_unknown_kid_refetch_is_rate_limited(google):
+    stub, clock, cache, verifier = google
+    key = stub.add_key("k1")
+
+    async def scenario():
+        await verifier.verify(sign(key, "k1"))
+        clock.now += cache.unknown_kid_cooldown
+        for _ in range(3):
+            with pytest.raises(jwt.InvalidTokenError):
+                await verifier.verify(sign(key, "nope"))
+
+    run(scenario())
+    # One refetch for the first unknown kid, none for the repeats in the cooldown
+    assert stub.fetches == 2
+
+
+def test_keys_are_cached_for_max_age(google):
+    stub, clock, cache, verifier = google
+    stub.max_age = 600
+    key = stub.add_key("k1")
+    token = sign(key, "k1")
+
+    async def scenario():
+        await verifier.verify(token)
+        assert cache.stats()["expires_in"] == 600
+        clock.now += 500  # before the refresh-ahead window
+        await verifier.verify(token)
+        assert stub.fetches == 1
+        clock.now += 101  # expired
+        await verifier.verify(token)
+        assert stub.fetches == 2
+
+    run(scenario())
+
+
+def test_max_age_is_clamped_to_min_ttl():
+    stub = StubJWKS(max_age=0)
+    stub.add_key("k1")
+    clock = Clock()
+    cache = JWKSCache(fetch=stub, clock=clock, min_ttl=60)
+    run(cache.get_key("k1"))
+    assert cache.stats()["expires_in"] == 60
+
+
+def test_cache_lifetime_reads_cache_control():
+    assert cache_lifetime({"Cache-Control": "public, max-age=19800, must-revalidate", "Age": "800"}, 300) == 19000
+    assert cache_lifetime({"Cache-Control": "no-cache"}, 300) == 0
+    assert cache_lifetime({}, 300) == 300
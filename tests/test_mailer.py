@@ -0,0 +1,168 @@
+import asyncio
+import socket
+from email.message import EmailMessage
+
+import pytest
+
+from tests.conftest import run
+
+pytest.importorskip("aiosmtplib")
+controller_mod = pytest.importorskip("aiosmtpd.controller")
+
+from mailer import MailDispatcher  # noqa: E402
+
+
+class Handler:
+    """Collects delivered mail; ``busy[rcpt]`` is how many 451s that recipient gets first."""
+
+    def __init__(self):
+        self.received = []
+        self.busy = {}
+
+    async def handle_DATA(self, server, session, envelope):
+        for rcpt in envelope.rcpt_tos:
+            if self.busy.get(rcpt):
+                self.busy[rcpt] -= 1
+                return "451 Try again later"
+        self.received.extend(envelope.rcpt_tos)
+        return "250 OK"
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+@pytest.fixture
+def smtpd():
+    handler = Handler()
+    controller = controller_mod.Controller(handler, hostname="127.0.0.1", port=free_port())
+    controller.start()
+    yield handler, controller.port
+    controller.stop()
+
+
+def message(to: str) -> EmailMessage:
+    msg = EmailMessage()
+    msg["From"] = "noreply@example.com"
+    msg["To"] = to
+    msg["Subject"] = "Your code"
+    msg.set_content("123456")
+    return msg
+
+
+def dispatcher(port: int, **kwargs) -> MailDispatcher:
+    kwargs.setdefault("backoff", 0.01)
+    return MailDispatcher("127.0.0.1", port, start_tls=False, **kwargs)
+
+
+async def wait_until(predicate, timeout: float = 5.0):
+    deadline = asyncio.get_running_loop().time() + timeout
+    while not predicate():
+        if asyncio.get_running_loop().time() > deadline:
+            raise AssertionError("timed out")
+        await asyncio.sleep(0.01)
+
+
+def test_pooled_sends_arrive_over_reused_sessions(smtpd):
+    handler, port = smtpd
+    recipients = [f"user{i}@example.com" for i in range(10)]
+
+    async def scenario():
+        mailer = dispatcher(port, pool_size=2)
+        await mailer.start()
+        for to in recipients:
+            assert mailer.enqueue(to, message(to))
+        await mailer.stop()
+        return mailer.stats()
+
+    stats = run(scenario())
+    assert sorted(handler.received) == sorted(recipients)
+    assert stats["sent"] == 10
+    assert stats["connections_opened"] <= 2
+    assert stats["workers"] == 0 and stats["queue_depth"] == 0
+
+
+def test_transient_failure_is_retried(smtpd):
+    handler, port = smtpd
+    handler.busy["flaky@example.com"] = 1
+
+    async def scenario():
+        mailer = dispatcher(port, pool_size=1)
+        await mailer.start()
+        mailer.enqueue("flaky@example.com", message("flaky@example.com"))
+        await wait_until(lambda: mailer.stats()["sent"] == 1)
+        await mailer.stop()
+        return mailer.stats()
+
+    stats = run(scenario())
+    assert handler.received == ["flaky@example.com"]
+    assert stats["retried"] == 1 and stats["failed"] == 0
+
+
+def test_gives_up_after_max_retries(smtpd):
+    handler, port = smtpd
+    handler.busy["busy@example.com"] = 10
+    failures = []
+
+    async def scenario():
+        mailer = dispatcher(port, pool_size=1, max_retries=2)
+        await mailer.start()
+        mailer.enqueue("busy@example.com", message("busy@example.com"), on_failure=failures.append)
+        await wait_until(lambda: mailer.stats()["failed"] == 1)
+        await mailer.stop()
+        return mailer.stats()
+
+    stats = run(scenario())
+    assert stats["retried"] == 2 and stats["sent"] == 0
+    assert len(failures) == 1 and handler.received == []
+
+
+def test_rate_limit_counts_refusals():
+    mailer = MailDispatcher("127.0.0.1", 25, rate_limit=2, rate_window=60)
+    assert [mailer.allow("a@example.com") for _ in range(3)] == [True, True, False]
+    assert mailer.allow("A@Example.com") is False  # per address, case-insensitive
+    assert mailer.allow("b@example.com") is True
+    assert mailer.stats()["rate_limited"] == 2
+
+
+def test_full_queue_drops_and_counts(smtpd):
+    _, port = smtpd
+
+    async def scenario():
+        mailer = dispatcher(port, pool_size=1, queue_size=2)
+        await mailer.start()
+        # Nothing yields to the worker in between, so the queue stays full
+        accepted = [mailer.enqueue(f"u{i}@example.com", message(f"u{i}@example.com")) for i in range(5)]
+        await mailer.stop()
+        return accepted, mailer.stats()
+
+    accepted, stats = run(scenario())
+    assert accepted == [True, True, False, False, False]
+    assert stats["dropped"] == 3 and stats["sent"] == 2
+
+
+def test_enqueue_before_start_is_refused():
+    mailer = MailDispatcher("127.0.0.1", 25)
+    assert mailer.enqueue("a@example.com", message("a@example.com")) is False
+    assert not mailer.running
+
+
+def test_stop_is_clean_and_idempotent(smtpd):
+    _, port = smtpd
+
+    async def scenario():
+        mailer = dispatcher(port, pool_size=2)
+        await mailer.start()
+        mailer.enqueue("a@example.com", message("a@example.com"))
+        await mailer.stop()
+        assert not mailer.running
+        await mailer.stop()
+        # No worker or retry task is left behind on the loop
+        current = asyncio.current_task()
+        return [t for t in asyncio.all_tasks() if t is not current], mailer.stats()
+
+    leftover, stats = run(scenario())
+    assert leftover == []
+    assert stats["sent"] == 1 and stats["workers"] == 0
@@ -0,0 +1,71 @@
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from metrics import Counter, Histogram, MetricsMiddleware, Registry, stats_gauges  # noqa: E402
+
+
+def test_counter_and_gauge_exposition():
+    counter = Counter("jobs_total", "Jobs run", ("queue",))
+    counter.inc(("mail",))
+    counter.inc(("mail",), 2)
+    counter.inc(('a "quoted"\\queue',))
+    assert counter.render() == [
+        "# HELP jobs_total Jobs run",
+        "# TYPE jobs_total counter",
+        'jobs_total{queue="mail"} 3',
+        'jobs_total{queue="a \\"quoted\\"\\\\queue"} 1',
+    ]
+
+    gauges = stats_gauges("cache", {"products": {"hits": 4, "hit_rate": 0.5, "enabled": True}}, "cache")
+    assert [g.render() for g in gauges] == [
+        ["# HELP cache_hits cache hits", "# TYPE cache_hits gauge", 'cache_hits{cache="products"} 4'],
+        ["# HELP cache_hit_rate cache hit_rate", "# TYPE cache_hit_rate gauge", 'cache_hit_rate{cache="products"} 0.5'],
+    ]
+
+
+def test_histogram_buckets_are_cumulative():
+    histogram = Histogram("latency_seconds", "Latency", ("route",), buckets=(0.1, 1.0))
+    for value in (0.05, 0.1, 0.5, 3.0):
+        histogram.observe(("/x",), value)
+    assert histogram.render()[2:] == [
+        'latency_seconds_bucket{route="/x",le="0.1"} 2',
+        'latency_seconds_bucket{route="/x",le="1"} 3',
+        'latency_seconds_bucket{route="/x",le="+Inf"} 4',
+        'latency_seconds_sum{route="/x"} 3.65',
+        'latency_seconds_count{route="/x"} 4',
+    ]
+    assert histogram.snapshot() == {("/x",): (4, 3.65)}
+
+
+def test_middleware_labels_by_route_template():
+    registry = Registry()
+    app = FastAPI()
+    app.add_middleware(MetricsMiddleware, registry=registry)
+    seen = {}
+
+    @app.get("/orders/{uid}")
+    async def orders(uid: str):
+        # Scraped mid-request: this request is the one in flight
+        seen["during"] = registry.render()
+        return {"uid": uid}
+
+    client = TestClient(app)
+    assert client.get("/orders/u1").status_code == 200
+    assert client.get("/orders/u2").status_code == 200
+    assert client.get("/nowhere").status_code == 404
+    text = registry.render()
+
+    assert 'http_requests_in_flight{route="/orders/{uid}",method="GET"} 1' in seen["during"]
+    assert 'http_requests_in_flight{route="/orders/{uid}",method="GET"} 0' in text
+    assert 'http_requests_total{route="/orders/{uid}",method="GET",status="200"} 2' in text
+    assert 'http_requests_total{route="unmatched",method="GET",status="404"} 1' in text
+    assert 'http_request_duration_seconds_count{route="/orders/{uid}",method="GET"} 2' in text
+    assert "/orders/u1" not in text
+
+
+def test_metrics_endpoint_serves_prometheus_text(server):
+    response = TestClient(server.app).get("/api/metrics")
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain; version=0.0.4")
+    assert "# TYPE http_requests_total counter" in response.text
+    assert 'http_requests_in_flight{route="/api/metrics",method="GET"} 1' in response.text
@@ -0,0 +1,20 @@
+from fastapi.testclient import TestClient
+
+from tests.conftest import run
+
+
+def test_product_list_defaults_to_a_small_page(server):
+    run(server.db.products.insert_many([
+        {"id": f"p{i:04d}", "name": f"Item {i}", "price": 1.0, "stock": 1, "seller_id": "ret1"}
+        for i in range(120)
+    ]))
+    client = TestClient(server.app)
+
+    first = client.get("/api/products")
+    assert first.status_code == 200
+    assert len(first.json()) == server.PRODUCTS_PAGE_DEFAULT == 50
+    cursor = first.headers["X-Next-Cursor"]
+
+    rest = client.get("/api/products", params={"cursor": cursor, "limit": 1000})
+    assert [p["id"] for p in rest.json()] == [f"p{i:04d}" for i in range(50, 120)]
+    assert "X-Next-Cursor" not in rest.headers
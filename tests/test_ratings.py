@@ -0,0 +1,60 @@
+from tests.conftest import run
+
+FIELDS = {"_id": 0, "rating": 1, "review_count": 1, "rating_sum": 1, "rating_count": 1, "rating_hist": 1}
+
+
+def review(server, uid, rating, product_id="p1"):
+    return run(server.create_feedback(uid, {"product_id": product_id, "rating": rating}, auth_user=None))
+
+
+def aggregates(server, product_id="p1"):
+    return run(server.db.products.find_one({"id": product_id}, FIELDS))
+
+
+def test_new_and_edited_reviews_update_the_aggregates(server, products):
+    products(p1=5)
+    review(server, "user-a", 5)
+    review(server, "user-b", 3)
+    assert aggregates(server) == {
+        "rating": 4.0, "review_count": 2, "rating_sum": 8, "rating_count": 2,
+        "rating_hist": {"1": 0, "2": 0, "3": 1, "4": 0, "5": 1},
+    }
+
+    review(server, "user-b", 1)  # edit moves the review to another bucket
+    assert aggregates(server) == {
+        "rating": 3.0, "review_count": 2, "rating_sum": 6, "rating_count": 2,
+        "rating_hist": {"1": 1, "2": 0, "3": 0, "4": 0, "5": 1},
+    }
+
+
+def test_unchanged_rating_leaves_the_aggregates_alone(server, products):
+    products(p1=5)
+    review(server, "user-a", 4)
+    before = aggregates(server)
+    assert run(server.apply_rating_change("p1", 4, 4)) is None
+    assert aggregates(server) == before
+
+
+def test_editing_a_review_before_the_backfill_recomputes(server, products):
+    # Reviews written before products carried aggregates
+    products(p1=5)
+    run(server.db.feedback.insert_many([
+        {"id": "f1", "user_id": "user-a", "product_id": "p1", "rating": 5},
+        {"id": "f2", "user_id": "user-b", "product_id": "p1", "rating": 4},
+    ]))
+    review(server, "user-b", 2)
+    assert aggregates(server) == {
+        "rating": 3.5, "review_count": 2, "rating_sum": 7, "rating_count": 2,
+        "rating_hist": {"1": 0, "2": 1, "3": 0, "4": 0, "5": 1},
+    }
+
+
+def test_rebuild_agrees_with_incremental_updates(server, products):
+    products(p1=5, p2=5)
+    for uid, rating, pid in [("a", 5, "p1"), ("b", 2, "p1"), ("a", 3, "p2"), ("b", 4, "p1"), ("c", 1, "p2")]:
+        review(server, uid, rating, pid)
+    incremental = {pid: aggregates(server, pid) for pid in ("p1", "p2")}
+
+    run(server.db.products.update_many({}, {"$unset": {"rating_sum": "", "rating_count": "", "rating_hist": ""}}))
+    assert run(server.rebuild_rating_aggregates(batch_size=1)) == 2
+    assert {pid: aggregates(server, pid) for pid in ("p1", "p2")} == incremental
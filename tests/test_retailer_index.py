@@ -0,0 +1,71 @@
+import random
+
+from fastapi.testclient import TestClient
+
+from tests.conftest import run
+
+
+def test_nearest_prefers_exact_then_closest(server):
+    index = server.RetailerIndex.from_rows([("a", "110001"), ("b", "110005"), ("c", "110010"), ("d", "400001")])
+    assert index.nearest("110005") == "b"
+    assert index.nearest("110004") == "b"
+    assert index.nearest("110008") == "c"
+    assert index.nearest("999999") == "d"
+
+
+def test_k_nearest_orders_by_distance_with_exact_first(server):
+    index = server.RetailerIndex.from_rows([("a", "100"), ("b", "103"), ("c", "097"), ("d", "110"), ("e", "103")])
+    # "097" is an exact string match for nothing; numerically it sits between 97 and 100
+    assert index.k_nearest("103", 5) == ["b", "e", "a", "c", "d"]
+    assert index.k_nearest("101", 3) == ["a", "b", "e"]
+    assert index.k_nearest("101", 0) == []
+
+
+def test_non_numeric_pincodes_only_match_exactly(server):
+    index = server.RetailerIndex.from_rows([("a", "SW1A"), ("b", "110001")])
+    assert index.nearest("SW1A") == "a"
+    assert index.k_nearest("SW1A", 5) == ["a"]
+    assert index.k_nearest("110002", 5) == ["b"]
+    assert index.nearest("EC1") is None
+
+
+def test_add_and_remove_keep_the_index_consistent(server):
+    index = server.RetailerIndex.from_rows([("a", "100"), ("b", "200")])
+    index.add("a", "300")  # moved
+    index.add("c", "150")
+    index.remove("b")
+    index.add("d", None)  # no pincode: not indexed
+    assert len(index) == 2
+    assert index.pincode_of("a") == "300"
+    assert index.k_nearest("160", 5) == ["c", "a"]
+
+
+def test_bulk_load_matches_incremental_adds(server):
+    rnd = random.Random(7)
+    rows = [(f"r{i}", str(rnd.randint(100000, 100400))) for i in range(500)]
+    rows += [("r3", "100123"), ("x", "NOPE")]
+    bulk = server.RetailerIndex.from_rows(rows)
+    incremental = server.RetailerIndex()
+    for rid, pincode in rows:
+        incremental.add(rid, pincode)
+    for pincode in ("100000", "100123", "100399", "NOPE", "99"):
+        assert sorted(bulk.k_nearest(pincode, 20)) == sorted(incremental.k_nearest(pincode, 20))
+        assert sorted(bulk.exact(pincode)) == sorted(incremental.exact(pincode))
+
+
+def test_by_pincode_returns_only_exact_matches_when_there_are_any(server):
+    run(server.db.users.insert_many([
+        {"id": "r1", "email": "r1@example.com", "role": "retailer", "pincode": "110001", "password": "x"},
+        {"id": "r2", "email": "r2@example.com", "role": "retailer", "pincode": "110001", "password": "x"},
+        {"id": "r3", "email": "r3@example.com", "role": "retailer", "pincode": "110002", "password": "x"},
+        {"id": "r4", "email": "r4@example.com", "role": "retailer", "pincode": "110009", "password": "x"},
+    ]))
+    run(server.load_retailer_index())
+    client = TestClient(server.app)
+
+    exact = client.get("/api/retailers/by-pincode/110001").json()
+    assert sorted(r["id"] for r in exact) == ["r1", "r2"]
+    assert all("password" not in r for r in exact)
+
+    nearby = client.get("/api/retailers/by-pincode/110008").json()
+    assert [r["id"] for r in nearby][:2] == ["r4", "r3"]
@@ -0,0 +1,112 @@
+import pytest
+
+from tests.conftest import run
+
+pytest.importorskip("pymongo")
+
+import schema  # noqa: E402
+
+LEGACY_PRODUCTS = [
+    {"id": "p1", "name": "Apple", "price": "10.5", "stock": "3"},
+    {"id": "p2", "name": "Milk", "price": 20, "stock": 4.0, "rating": "4.5", "review_count": "2"},
+    {"id": "p3", "name": "Bread", "price": "oops"},
+]
+
+
+def strip_ids(docs):
+    return [{k: v for k, v in d.items() if k != "_id"} for d in docs]
+
+
+def products(server):
+    return strip_ids(run(server.db.products.find({}).sort("id", 1).to_list(None)))
+
+
+def test_normalize_product_coerces_numbers():
+    doc = {"price": "12.50", "stock": "7", "rating": None, "schema_version": 99}
+    assert schema.normalize_product(doc) == {"price": 12.5, "stock": 7, "rating": 0.0}
+
+
+def test_migrate_upgrades_outdated_documents(server):
+    run(server.db.products.insert_many([dict(d) for d in LEGACY_PRODUCTS]))
+    run(server.db.products.insert_one({"id": "p4", "name": "Tea", "price": 1.0, "stock": 1, "rating": 0.0,
+                                       "review_count": 0, "schema_version": 1}))
+
+    stats = run(schema.migrate(server.db, "products", batch_size=2))
+
+    assert (stats["outdated"], stats["scanned"], stats["upgraded"], stats["skipped"]) == (3, 3, 3, 0)
+    assert products(server)[:3] == [
+        {"id": "p1", "name": "Apple", "price": 10.5, "stock": 3, "rating": 0.0, "review_count": 0, "schema_version": 1},
+        {"id": "p2", "name": "Milk", "price": 20.0, "stock": 4, "rating": 4.5, "review_count": 2, "schema_version": 1},
+        {"id": "p3", "name": "Bread", "price": 0.0, "stock": 0, "rating": 0.0, "review_count": 0, "schema_version": 1},
+    ]
+    assert all(type(p["price"]) is float and type(p["stock"]) is int for p in products(server))
+
+
+def test_migrate_is_idempotent(server):
+    run(server.db.products.insert_many([dict(d) for d in LEGACY_PRODUCTS]))
+    run(schema.migrate(server.db, "products"))
+    after_first = products(server)
+
+    stats = run(schema.migrate(server.db, "products"))
+
+    assert (stats["outdated"], stats["scanned"], stats["upgraded"]) == (0, 0, 0)
+    assert products(server) == after_first
+
+
+def test_concurrent_write_is_left_for_the_next_run(server):
+    run(server.db.products.insert_one({"id": "p1", "name": "Apple", "price": "10"}))
+    doc = run(server.db.products.find_one({"id": "p1"}))
+    op = schema.upgrade_op("products", doc)
+    # Another writer changes the price after the migration read the document
+    run(server.db.products.update_one({"id": "p1"}, {"$set": {"price": "12"}}))
+
+    result = run(server.db.products.bulk_write([op]))
+    assert result.matched_count == 0
+    assert run(server.db.products.count_documents(schema.outdated("products"))) == 1
+
+    run(schema.migrate(server.db, "products"))
+    assert run(server.db.products.find_one({"id": "p1"}))["price"] == 12.0
+
+
+def test_migrate_upgrades_carts_and_orders(server):
+    run(server.db.cart.insert_one({"user_id": "u1", "items": [
+        {"product_id": 7, "quantity": "2"}, {"quantity": 1}, "junk",
+    ]}))
+    run(server.db.orders.insert_one({"id": "o1", "total_amount": "30", "items": [
+        {"product_id": "p1", "quantity": "3", "price": "10", "total": "30"},
+    ]}))
+
+    run(schema.migrate(server.db, "cart"))
+    run(schema.migrate(server.db, "orders"))
+
+    cart = run(server.db.cart.find_one({"user_id": "u1"}, {"_id": 0}))
+    assert cart == {"user_id": "u1", "items": [{"product_id": "7", "quantity": 2}], "schema_version": 1}
+    order = run(server.db.orders.find_one({"id": "o1"}, {"_id": 0}))
+    assert order["total_amount"] == 30.0 and order["schema_version"] == 1
+    assert order["items"] == [{"product_id": "p1", "quantity": 3, "price": 10.0, "total": 30.0}]
+
+
+def test_normalize_product_drops_and_logs_non_numbers(caplog):
+    doc = {"id": "p1", "price": "oops", "stock": "3", "rating": None}
+    with caplog.at_level("WARNING", logger="schema"):
+        assert schema.normalize_product(doc) == {"id": "p1", "stock": 3, "rating": 0.0}
+    assert "Dropping non-numeric product price 'oops' (id p1)" in caplog.text
+
+
+def test_update_product_upgrades_and_stamps_a_legacy_document(server):
+    run(server.db.products.insert_one({"id": "p1", "name": "Apple", "price": "10", "stock": "3"}))
+    doc = run(server.update_product("p1", {"name": "Green apple", "price": "oops"}))
+
+    assert doc == {"id": "p1", "name": "Green apple", "price": 10.0, "stock": 3, "rating": 0.0,
+                   "review_count": 0, "schema_version": 1}
+    assert run(server.db.products.count_documents(schema.outdated("products"))) == 0
+
+
+def test_expanded_cart_tolerates_unmigrated_lines(server):
+    run(server.db.products.insert_one({"id": "p1", "name": "Apple", "price": "2.5", "stock": 5}))
+    run(server.db.cart.insert_one({"user_id": "cust1", "items": [
+        {"product_id": "p1", "quantity": "2"}, {"product_id": "p1"}, "junk", {"quantity": 1},
+    ]}))
+    cart = run(server.get_cart("cust1", expand="products"))
+    assert [it["line_total"] for it in cart["items"]] == [5.0, 0.0]
+    assert cart["total_amount"] == 5.0
@@ -0,0 +1,71 @@
+from tests.conftest import run
+
+from search import InvertedIndex, tokenize  # noqa: E402
+
+
+def index(**docs):
+    idx = InvertedIndex()
+    for doc_id, (name, description) in docs.items():
+        idx.add(doc_id, {"name": name, "description": description})
+    return idx
+
+
+def test_tokenize_splits_on_non_alphanumerics():
+    assert tokenize("Full-Cream MILK, 1L") == ["full", "cream", "milk", "1l"]
+    assert tokenize(None) == []
+
+
+def test_terms_match_as_prefixes():
+    idx = index(p1=("Toned milk", ""), p2=("Milkshake", ""), p3=("Bread", "soft"))
+    assert sorted(idx.search("mil")) == ["p1", "p2"]
+    assert idx.search("so") == ["p3"]
+    assert idx.search("ilk") == []
+
+
+def test_every_term_must_match():
+    idx = index(p1=("Toned milk", "fresh"), p2=("Milk powder", ""), p3=("Fresh bread", ""))
+    assert idx.search("milk fresh") == ["p1"]
+    assert idx.search("milk cheese") == []
+    assert idx.search("  ,, ") == []
+
+
+def test_name_and_exact_matches_rank_first():
+    idx = index(
+        desc=("Cereal", "goes well with milk"),
+        prefix=("Milkshake", ""),
+        name=("Milk", ""),
+    )
+    # Exact name match, then prefix-only name match (3 * 0.5), then description
+    assert idx.search("milk") == ["name", "prefix", "desc"]
+    assert idx.search("milk", limit=2) == ["name", "prefix"]
+
+
+def test_ties_break_by_id():
+    idx = index(b=("Milk", ""), a=("Milk", ""))
+    assert idx.search("milk") == ["a", "b"]
+
+
+def test_remove_and_replace():
+    idx = index(p1=("Milk", ""), p2=("Milk chocolate", ""))
+    idx.remove("p2")
+    assert idx.search("choc") == [] and idx.search("milk") == ["p1"]
+    assert len(idx) == 1 and "chocolate" not in idx._vocab
+
+    idx.add("p1", {"name": "Butter"})  # re-adding replaces the old tokens
+    assert idx.search("milk") == [] and idx.search("butter") == ["p1"]
+    idx.remove("missing")
+
+
+def test_rebuild_picks_up_products_written_elsewhere(server, products, monkeypatch):
+    monkeypatch.setattr(server, "SEARCH_ENGINE", "memory")
+    monkeypatch.setattr(server, "search_index", server.search_index)  # restored after the swap
+    products(apple=1)
+    run(server.load_search_index())
+    before = server.search_index
+    # Written by another worker, so this worker's index was never told
+    run(server.db.products.insert_one({"id": "milk", "name": "Milk", "stock": 1, "price": 1.0}))
+    assert server.search_index.search("milk") == []
+
+    run(server.load_search_index())
+    assert server.search_index.search("milk") == ["milk"]
+    assert before.search("milk") == []  # swapped, not mutated under readers
@@ -0,0 +1,115 @@
+import asyncio
+
+import pytest
+
+from tests.conftest import run
+
+from startup import ReadinessGate, StartupReport  # noqa: E402
+
+
+class Flaky:
+    """Warm-up step failing its first ``failures`` attempts."""
+
+    def __init__(self, failures: int):
+        self.failures = failures
+        self.calls = 0
+
+    async def __call__(self):
+        self.calls += 1
+        if self.calls <= self.failures:
+            raise ConnectionError("mongo unavailable")
+
+
+async def ok():
+    return None
+
+
+async def call_gate(gate):
+    sent = []
+
+    async def receive():
+        return {"type": "http.request", "body": b""}
+
+    async def send(message):
+        sent.append(message)
+
+    await gate({"type": "http", "path": "/api/products"}, receive, send)
+    return sent[0]["status"]
+
+
+async def app(scope, receive, send):
+    await send({"type": "http.response.start", "status": 200, "headers": []})
+    await send({"type": "http.response.body", "body": b""})
+
+
+def test_failed_steps_are_retried_until_ready():
+    flaky = Flaky(failures=2)
+    report = StartupReport()
+
+    async def scenario():
+        report.begin()
+        await report.run({"indexes": flaky, "search_index": ok}, retry_delay=0.01)
+
+    run(scenario())
+    assert report.ready and report.state == "ready"
+    assert flaky.calls == 3
+    steps = report.as_dict()["steps"]
+    assert steps["indexes"]["status"] == "ok" and steps["indexes"]["attempts"] == 3
+    assert steps["search_index"]["attempts"] == 1
+
+
+def test_gate_answers_503_while_retrying_then_opens():
+    flaky = Flaky(failures=1)
+    report = StartupReport()
+    gate = ReadinessGate(app, report, timeout=0.01)
+
+    async def scenario():
+        report.begin()
+        warm_up = asyncio.create_task(report.run({"indexes": flaky}, retry_delay=0.2))
+        await asyncio.sleep(0.05)
+        during = (report.state, report.as_dict()["retry_in_s"], await call_gate(gate))
+        await warm_up
+        return during, await call_gate(gate)
+
+    during, after = run(scenario())
+    assert during == ("retrying", 0.2, 503)
+    assert after == 200
+
+
+def test_health_reports_readiness(server, monkeypatch):
+    report = StartupReport()
+    monkeypatch.setattr(server, "startup_report", report)
+
+    async def scenario():
+        statuses = [(await server.health_check())["status"]]
+        report.begin()
+        statuses.append((await server.health_check())["status"])
+        await report.step("indexes", Flaky(failures=1)())
+        statuses.append((await server.health_check())["status"])
+        await report.run({"indexes": ok})
+        health = await server.health_check()
+        statuses.append(health["status"])
+        return statuses, health
+
+    statuses, health = run(scenario())
+    assert statuses == ["healthy", "starting", "degraded", "healthy"]
+    assert health["ready"] is True and health["startup"]["state"] == "ready"
+
+
+def test_index_step_fails_while_a_required_index_is_missing(server, monkeypatch):
+    from indexes import create_indexes, missing_required
+
+    async def nothing_created(db):
+        return {}
+
+    async def scenario():
+        await server.db.products.drop_indexes()
+        missing = await missing_required(server.db)
+        monkeypatch.setattr(server, "create_indexes", nothing_created)
+        with pytest.raises(RuntimeError, match="products.id_1"):
+            await server.ensure_indexes()
+        monkeypatch.setattr(server, "create_indexes", create_indexes)
+        await server.ensure_indexes()
+        return missing
+
+    assert run(scenario()) == ["products.id_1"]
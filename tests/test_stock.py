@@ -0,0 +1,113 @@
+import asyncio
+
+import pytest
+
+from tests.conftest import run
+
+
+def stock_of(server):
+    docs = run(server.db.products.find({}, {"_id": 0, "id": 1, "stock": 1}).to_list(None))
+    return {d["id"]: d["stock"] for d in docs}
+
+
+def test_reserve_takes_every_line(server, products):
+    products(apple=5, milk=2)
+    assert run(server.reserve_stock({"apple": 3, "milk": 2})) is None
+    assert stock_of(server) == {"apple": 2, "milk": 0}
+
+
+def test_oversold_line_rolls_back_earlier_lines(server, products):
+    products(apple=5, milk=1, bread=4)
+    assert run(server.reserve_stock({"apple": 2, "milk": 3, "bread": 1})) == "milk"
+    assert stock_of(server) == {"apple": 5, "milk": 1, "bread": 4}
+
+
+def test_release_gives_stock_back(server, products):
+    products(apple=5)
+    run(server.reserve_stock({"apple": 4}))
+    run(server.release_stock({"apple": 4}))
+    assert stock_of(server) == {"apple": 5}
+
+
+def test_concurrent_reservations_never_oversell(server, products):
+    products(apple=3)
+
+    async def race():
+        return await asyncio.gather(*(server.reserve_stock({"apple": 1}) for _ in range(10)))
+
+    # mongomock runs each operation to completion, so this checks the guarded
+    # decrement's bookkeeping under interleaving rather than a real write race
+    results = run(race())
+    assert results.count(None) == 3
+    assert stock_of(server) == {"apple": 0}
+
+
+def test_place_order_for_the_last_unit_succeeds_once(server, products, users):
+    products(apple=1)
+    users(cust1="customer")
+    payload = {"items": [{"product_id": "apple", "quantity": 1}], "delivery_address": "Somewhere"}
+
+    async def race():
+        return await asyncio.gather(
+            *(server.place_order("cust1", dict(payload), auth_user=None) for _ in range(2)),
+            return_exceptions=True,
+        )
+
+    results = run(race())
+    errors = [r for r in results if isinstance(r, server.HTTPException)]
+    assert len(errors) == 1 and errors[0].status_code == 400
+    assert stock_of(server) == {"apple": 0}
+    assert run(server.db.orders.count_documents({})) == 1
+    assert run(server.db.seller_stats.find_one({"seller_id": "ret1"}))["orders_count"] == 1
+
+
+@pytest.fixture
+def purchase_request(server, products, users):
+    products(seller_id="wh1", apple=10)
+    users(ret1="retailer", wh1="wholesaler")
+    return server.WholesalePurchaseRequest(
+        retailer_id="ret1", wholesaler_id="wh1", items=[{"product_id": "apple", "quantity": 4}], total_amount=40.0,
+    )
+
+
+def test_purchase_moves_stock_and_records_it(server, purchase_request):
+    purchase = run(server.purchase_from_wholesaler(purchase_request, auth_user=None))
+
+    assert run(server.db.purchases.count_documents({"id": purchase["id"], "status": "completed"})) == 1
+    assert run(server.db.products.find_one({"id": "apple"}))["stock"] == 6
+    mirror = run(server.db.products.find_one({"seller_id": "ret1", "original_wh_product_id": "apple"}))
+    assert mirror["stock"] == 4
+
+
+def test_purchase_releases_stock_when_the_record_cannot_be_written(server, purchase_request, monkeypatch):
+    collection_cls = type(server.db.purchases)
+    insert_one = collection_cls.insert_one
+
+    def failing_insert(self, *args, **kwargs):
+        if self.name == "purchases":
+            raise RuntimeError("write failed")
+        return insert_one(self, *args, **kwargs)
+
+    monkeypatch.setattr(collection_cls, "insert_one", failing_insert)
+    with pytest.raises(server.HTTPException) as exc:
+        run(server.purchase_from_wholesaler(purchase_request, auth_user=None))
+
+    assert exc.value.status_code == 500
+    assert run(server.db.products.find_one({"id": "apple"}))["stock"] == 10
+    assert run(server.db.products.count_documents({"seller_id": "ret1"})) == 0
+
+
+def test_reserve_drops_stock_cached_while_it_was_writing(server, products, monkeypatch):
+    products(apple=5)
+    collection_cls = type(server.db.products)
+    bulk_write = collection_cls.bulk_write
+
+    async def bulk_write_after_a_read(self, *args, **kwargs):
+        # A product read lands between the first invalidation and the write
+        if self.name == "products":
+            await server.get_cached_product("apple")
+        return await bulk_write(self, *args, **kwargs)
+
+    monkeypatch.setattr(collection_cls, "bulk_write", bulk_write_after_a_read)
+    assert run(server.reserve_stock({"apple": 2})) is None
+    assert run(server.get_cached_product("apple"))["stock"] == 3
@@ -0,0 +1,48 @@
+import pytest
+from fastapi.testclient import TestClient
+
+from tests.conftest import run
+
+ERROR = {"type": "error", "detail": "expected a JSON object with a list of topic strings"}
+
+
+@pytest.fixture
+def client(server):
+    run(server.db.products.insert_one({"id": "p1", "name": "Apple", "price": 10.0, "stock": 5, "seller_id": "ret1"}))
+    return TestClient(server.app)
+
+
+@pytest.mark.parametrize("frame", [
+    {"text": '{"action": "subscribe", "topics": 5}'},
+    {"text": '{"action": "subscribe", "topics": [1, 2]}'},
+    {"text": "not json"},
+    {"text": "[]"},
+    {"bytes": b'{"action": "ping"}'},
+])
+def test_malformed_frames_get_an_error_and_keep_the_socket(client, frame):
+    with client.websocket_connect("/ws") as ws:
+        if "bytes" in frame:
+            ws.send_bytes(frame["bytes"])
+        else:
+            ws.send_text(frame["text"])
+        assert ws.receive_json() == ERROR
+        ws.send_json({"action": "ping"})
+        assert ws.receive_json() == {"type": "pong"}
+
+
+def test_subscriber_receives_product_updates(client):
+    with client.websocket_connect("/ws") as ws:
+        ws.send_json({"action": "subscribe", "topics": ["product:p1", "seller:ret1"]})
+        assert ws.receive_json() == {"type": "subscribed", "topics": ["product:p1"], "denied": ["seller:ret1"]}
+        assert client.put("/api/products/p1", json={"price": 12}).status_code == 200
+        event = ws.receive_json()
+        assert (event["topic"], event["type"], event["data"]["price"]) == ("product:p1", "product.updated", 12.0)
+
+
+def test_disconnect_releases_the_subscriber(client, server):
+    before = server.bus.stats()["connections"]
+    with client.websocket_connect("/ws") as ws:
+        ws.send_json({"action": "ping"})
+        assert ws.receive_json() == {"type": "pong"}
+        assert server.bus.stats()["connections"] == before + 1
+    assert server.bus.stats()["connections"] == before